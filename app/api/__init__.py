@@ -1,5 +1,8 @@
 # app/api/__init__.py
 # API路由包
+#
+# 写数据库的接口定义为同步函数，由 FastAPI 在线程池中执行：SQLite 高并发模式只有一个写连接，
+# 在事件循环中等待它会阻塞所有请求；需要 await 的接口（如流式上传）通过 run_db 执行数据库操作
 
 # FastAPI路由模块
-from app.api import auth, rooms, messages, upload
\ No newline at end of file
+from app.api import auth, rooms, messages, upload, metrics, debug
\ No newline at end of file
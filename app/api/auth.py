@@ -5,17 +5,21 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
+import logging
 import re
 
 from app.database import get_db
 from app.schemas.user import UserCreate, UserResponse, UserLogin, Token, UserUpdate, PasswordChange
 from app.models import User
-from app.core.deps import get_current_user
+from app.core.deps import get_current_user, get_read_user
+from app.core.replicas import set_session_owner
 from app.core.security import create_access_token, get_password_hash, verify_password
 from app.config import settings
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
 def validate_email(email):
     """验证邮箱格式"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -32,7 +36,7 @@ def validate_username(username):
     return True, ""
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """用户注册"""
     # 验证用户名格式
     is_valid, error_msg = validate_username(user_data.username)
@@ -78,7 +82,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """用户登录"""
     # 查找用户
     user = db.query(User).filter(User.username == form_data.username).first()
@@ -98,33 +102,30 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     
     # 更新在线状态
     user.is_online = True
+    set_session_owner(db, user.username)
     db.commit()
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_read_user)):
     """获取当前用户信息"""
     return current_user
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def logout(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """用户登出"""
     current_user.is_online = False
     db.commit()
     return {"message": "登出成功"}
 
 @router.put("/profile", response_model=UserResponse)
-async def update_profile(
+def update_profile(
     profile_data: UserUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """更新用户资料"""
-    # 添加调试日志
-    print(f"🔍 收到的更新数据: {profile_data.dict(exclude_unset=True)}")
-    print(f"👤 当前用户: {current_user.username} (ID: {current_user.id})")
-    
     # 如果要更新用户名，需要验证
     if profile_data.username and profile_data.username != current_user.username:
         # 验证用户名格式
@@ -167,21 +168,24 @@ async def update_profile(
             )
     
     # 更新用户信息
-    for field, value in profile_data.dict(exclude_unset=True).items():
+    updates = profile_data.dict(exclude_unset=True)
+    for field, value in updates.items():
         if hasattr(current_user, field):
-            print(f"✅ 更新字段 {field}: {getattr(current_user, field)} -> {value}")
             setattr(current_user, field, value)
         else:
-            print(f"⚠️  字段 {field} 不存在于User模型中")
+            logger.warning("字段 %s 不存在于User模型中", field)
     
     db.commit()
     db.refresh(current_user)
     
-    print(f"✅ 用户资料更新成功")
+    logger.debug(
+        "用户 %s 更新资料字段 %s", current_user.id, ", ".join(updates),
+        extra={"category": "update_profile", "user_id": current_user.id}
+    )
     return current_user
 
 @router.put("/change-password")
-async def change_password(
+def change_password(
     password_data: PasswordChange,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
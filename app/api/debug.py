@@ -0,0 +1,21 @@
+# app/api/debug.py
+# 调试API（仅管理员）
+
+from fastapi import APIRouter, Depends
+
+from app.models import User
+from app.core.deps import get_admin_user
+from app.core.profiler import get_recent_profiles
+from app.core.loop_monitor import loop_monitor
+
+router = APIRouter()
+
+@router.get("/sql")
+async def get_sql_profiles(current_user: User = Depends(get_admin_user)):
+    """最近的SQL分析报告（按时间倒序），含疑似 N+1 的重复语句"""
+    return {"profiles": get_recent_profiles()}
+
+@router.get("/loop")
+async def get_loop_lag(current_user: User = Depends(get_admin_user)):
+    """事件循环延迟分位数和最近的卡顿记录（含卡顿时事件循环线程的调用栈）"""
+    return loop_monitor.summary()
@@ -0,0 +1,43 @@
+# app/api/health.py
+# 健康检查API：存活检查用于容器重启策略，就绪检查用于负载均衡摘除过载节点（无需认证）；排空接口仅管理员
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse
+from typing import Optional
+
+from app.models import User
+from app.core.deps import get_admin_user
+from app.core.drain import drain_state, start_drain
+from app.core.health import check_readiness
+from app.socket.events import count_room_connections
+
+router = APIRouter()
+
+@router.get("/live")
+async def live():
+    """存活检查：进程和事件循环可以响应"""
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    """就绪检查：任一检查未通过时返回503"""
+    checks = await check_readiness(count_room_connections(None))
+    is_ready = all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        {"status": "ready" if is_ready else "unavailable", "checks": checks},
+        status_code=200 if is_ready else 503
+    )
+
+@router.get("/drain")
+async def get_drain_status(current_user: User = Depends(get_admin_user)):
+    """排空进度"""
+    return drain_state.summary()
+
+@router.post("/drain")
+async def drain(
+    window: Optional[float] = Query(None, ge=0, description="断开全部连接的时间窗口（秒），默认 DRAIN_WINDOW_SECONDS"),
+    current_user: User = Depends(get_admin_user)
+):
+    """开始排空（仅管理员，不可撤销）：拒绝新连接、就绪检查失败，并在时间窗口内分批断开现有连接"""
+    start_drain(window)
+    return drain_state.summary()
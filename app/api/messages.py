@@ -2,24 +2,33 @@
 # 消息管理API
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, func
-from typing import List
+from typing import List, Optional, Union
+from datetime import datetime, timezone
 
 from app.database import get_db
-from app.schemas.message import MessageCreate, MessageResponse, MessageUpdate, MessageList
-from app.models import Message, Room, User
-from app.core.deps import get_current_user
+from app.schemas.message import MessageCreate, MessageResponse, MessageUpdate, MessageList, CompactMessageResponse, CompactMessageList, UserCard, TombstoneList
+from app.models import Message, Room, User, FileReference, Attachment, MessageTombstone
+from app.core.deps import get_current_user, get_read_db, get_read_user
+from app.core.attachments import add_attachment
+from app.core.files import FileNotOwnedError, get_uploaded_file
+from app.core.archive import count_archived_messages, get_archived_messages
+from app.core.nonces import reserve_nonce, release_nonce, PENDING_DETAIL, PENDING_RETRY_AFTER
+from app.core.tombstones import add_tombstone, get_tombstone_horizon
+from app.core.metrics import MESSAGES
 
 router = APIRouter()
 
-@router.get("/{room_id}", response_model=MessageList)
+@router.get("/{room_id}", response_model=Union[MessageList, CompactMessageList])
 async def get_messages(
     room_id: int,
     page: int = Query(1, ge=1, description="页码"),
     per_page: int = Query(50, ge=1, le=100, description="每页消息数"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    compact: bool = Query(False, description="紧凑模式：消息只含作者ID，作者名片单独返回"),
+    before_id: Optional[int] = Query(None, ge=1, description="返回ID小于该值的消息（游标分页，指定后忽略页码）"),
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
 ):
     """获取房间消息列表"""
     # 检查房间是否存在
@@ -41,33 +50,111 @@ async def get_messages(
     query = db.query(Message).filter(
         Message.room_id == room_id,
         Message.is_deleted == False
-    ).order_by(desc(Message.timestamp))
+    )
     
     # 分页
-    total = query.count()
-    offset = (page - 1) * per_page
-    messages = query.offset(offset).limit(per_page).all()
+    hot_total = query.count()
+    if before_id is not None:
+        # 游标分页：消息ID按时间有序，直接定位到游标之前，避免 OFFSET 扫描
+        query = query.filter(Message.id < before_id)
+        offset = 0
+    else:
+        offset = (page - 1) * per_page
+    query = query.order_by(desc(Message.id))
+    if not compact:
+        # 完整模式一次性加载作者，避免逐条查询
+        query = query.options(joinedload(Message.author))
+    rows = query.offset(offset).limit(per_page + 1).all()
+    items = [message.to_dict(compact=compact) for message in rows]
+    
+    # 热表不足一页时继续读取归档分段（归档消息的ID均小于热表中的消息）
+    if len(items) <= per_page:
+        archive_offset = 0 if before_id is not None else max(0, offset - hot_total)
+        items.extend(get_archived_messages(db, room_id, before_id, archive_offset, per_page + 1 - len(items)))
+    total = hot_total + count_archived_messages(db, room_id)
+    
+    has_next = len(items) > per_page
+    items = items[:per_page]
+    next_before_id = items[-1]['id'] if has_next else None
     
     # 反转消息顺序（最新的在后面）
-    messages.reverse()
+    items.reverse()
+    
+    if compact:
+        author_ids = {item['user_id'] for item in items}
+        authors = db.query(User).filter(User.id.in_(author_ids)).all() if author_ids else []
+        return CompactMessageList(
+            messages=[CompactMessageResponse(**item) for item in items],
+            users={author.id: UserCard(**author.to_card()) for author in authors},
+            total=total,
+            page=page,
+            per_page=per_page,
+            has_next=has_next,
+            next_before_id=next_before_id,
+            has_prev=page > 1
+        )
+    
+    # 归档消息只保存作者ID，补充作者信息
+    archived_author_ids = {item['user_id'] for item in items if 'username' not in item}
+    if archived_author_ids:
+        authors = {author.id: author for author in db.query(User).filter(User.id.in_(archived_author_ids))}
+        for item in items:
+            if 'username' not in item:
+                author = authors.get(item['user_id'])
+                item['username'] = author.username if author else 'Unknown'
+                item['avatar_url'] = author.avatar_url if author else ''
     
     # 转换为响应格式
-    messages_response = []
-    for message in messages:
-        message_dict = message.to_dict()
-        messages_response.append(MessageResponse(**message_dict))
+    messages_response = [MessageResponse(**item) for item in items]
     
     return MessageList(
         messages=messages_response,
         total=total,
         page=page,
         per_page=per_page,
-        has_next=offset + per_page < total,
+        has_next=has_next,
+        next_before_id=next_before_id,
         has_prev=page > 1
     )
 
+@router.get("/{room_id}/tombstones", response_model=TombstoneList)
+async def get_tombstones(
+    room_id: int,
+    since: datetime = Query(..., description="返回该时间之后删除的消息（ISO 8601；不带时区的时间按 UTC 处理）"),
+    limit: int = Query(500, ge=1, le=1000, description="最多返回条数"),
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
+):
+    """增量同步已删除的消息"""
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="房间不存在"
+        )
+    
+    if room.is_private and not room.is_member(current_user, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此房间的消息"
+        )
+    
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if since < get_tombstone_horizon():
+        return TombstoneList(full_resync=True)
+    
+    rows = db.query(MessageTombstone).filter(
+        MessageTombstone.room_id == room_id,
+        MessageTombstone.deleted_at > since
+    ).order_by(MessageTombstone.deleted_at, MessageTombstone.id).limit(limit + 1).all()
+    return TombstoneList(
+        tombstones=[tombstone.to_dict() for tombstone in rows[:limit]],
+        has_more=len(rows) > limit
+    )
+
 @router.post("/", response_model=MessageResponse)
-async def create_message(
+def create_message(
     message_data: MessageCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -101,36 +188,57 @@ async def create_message(
             detail="消息内容不能超过1000个字符"
         )
     
-    # 处理文件消息
-    content = message_data.content
+    # 附件只能引用自己上传的文件（登记去重前校验，校验失败不占用nonce）
+    stored_file = None
     if message_data.message_type in ['file', 'image'] and message_data.file_url:
-        import json
-        file_info = {
-            'url': message_data.file_url,
-            'name': message_data.file_name,
-            'size': message_data.file_size,
-            'description': message_data.content
-        }
-        content = json.dumps(file_info, ensure_ascii=False)
-    
-    # 创建消息
+        try:
+            stored_file = get_uploaded_file(db, message_data.file_url, current_user.id)
+        except FileNotOwnedError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="附件文件不存在或不属于当前用户"
+            )
+    
+    # 创建消息（文件消息的内容为附件说明，文件信息存入附件表）
     db_message = Message(
-        content=content,
+        content=message_data.content,
         message_type=message_data.message_type,
         user_id=current_user.id,
+        author=current_user,
         room_id=message_data.room_id
     )
     
+    # 客户端重试：同一nonce已创建过消息时返回原消息，不再重复写入
+    existing_id = reserve_nonce(current_user.id, message_data.nonce, db_message.id)
+    if existing_id is not None:
+        original = db.query(Message).filter(Message.id == existing_id).first()
+        if not original:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=PENDING_DETAIL,
+                headers={"Retry-After": str(PENDING_RETRY_AFTER)}
+            )
+        return MessageResponse(**original.to_dict())
+    
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    if message_data.message_type in ['file', 'image'] and message_data.file_url:
+        add_attachment(db, db_message, message_data.file_url, message_data.file_name, message_data.file_size, stored_file)
     
-    # 返回消息响应
+    # ID和时间戳由应用生成，提交前即可序列化，提交后无需再刷新
     message_dict = db_message.to_dict()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        release_nonce(current_user.id, message_data.nonce)
+        raise
+    MESSAGES.inc(labels=("rest",))
+    
+    # 返回消息响应
     return MessageResponse(**message_dict)
 
 @router.put("/{message_id}", response_model=MessageResponse)
-async def update_message(
+def update_message(
     message_id: int,
     message_data: MessageUpdate,
     current_user: User = Depends(get_current_user),
@@ -184,7 +292,7 @@ async def update_message(
     return MessageResponse(**message_dict)
 
 @router.delete("/{message_id}")
-async def delete_message(
+def delete_message(
     message_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -225,9 +333,13 @@ async def delete_message(
             detail="无权限删除此消息"
         )
     
-    # 软删除消息
+    # 软删除消息（压缩任务延迟后物理删除），附件失去引用后由回收任务清理
+    if not message.is_deleted:
+        add_tombstone(db, message)
     message.is_deleted = True
     message.content = "[此消息已被删除]"
+    db.query(FileReference).filter(FileReference.message_id == message.id).delete(synchronize_session=False)
+    db.query(Attachment).filter(Attachment.message_id == message.id).delete(synchronize_session=False)
     
     db.commit()
     
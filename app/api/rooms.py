@@ -1,20 +1,23 @@
 # app/api/rooms.py
 # 房间管理API
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.database import get_db
 from app.schemas.room import RoomCreate, RoomResponse, RoomUpdate, RoomJoin, RoomList, RoomWithMembers
 from app.schemas.user import UserSimple
-from app.models import Room, User, RoomMembership
-from app.core.deps import get_current_user
+from app.schemas.message import AttachmentResponse, MediaList
+from app.models import Room, User, RoomMembership, FileReference, Attachment, MessageTombstone
+from app.core.attachments import ATTACHMENT_KINDS
+from app.core.archive import delete_room_archive, remove_segment_files
+from app.core.deps import get_current_user, get_read_db, get_read_user
 
 router = APIRouter()
 
 @router.get("/", response_model=RoomList)
-async def get_rooms(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_rooms(current_user: User = Depends(get_read_user), db: Session = Depends(get_read_db)):
     """获取房间列表"""
     # 获取用户已加入的房间
     user_rooms_query = db.query(Room).join(RoomMembership).filter(
@@ -46,7 +49,7 @@ async def get_rooms(current_user: User = Depends(get_current_user), db: Session
     )
 
 @router.post("/", response_model=RoomResponse)
-async def create_room(
+def create_room(
     room_data: RoomCreate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -89,8 +92,8 @@ async def create_room(
 @router.get("/{room_id}", response_model=RoomWithMembers)
 async def get_room(
     room_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
 ):
     """获取房间详情"""
     room = db.query(Room).filter(Room.id == room_id).first()
@@ -123,7 +126,7 @@ async def get_room(
     )
 
 @router.post("/{room_id}/join")
-async def join_room(
+def join_room(
     room_id: int,
     join_data: RoomJoin,
     current_user: User = Depends(get_current_user),
@@ -169,7 +172,7 @@ async def join_room(
     return {"message": "成功加入房间"}
 
 @router.post("/{room_id}/leave")
-async def leave_room(
+def leave_room(
     room_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -201,8 +204,51 @@ async def leave_room(
     
     return {"message": "成功离开房间"}
 
+@router.get("/{room_id}/media", response_model=MediaList)
+async def get_room_media(
+    room_id: int,
+    kind: str = Query("image", description="附件类型：image、video、audio、document、file"),
+    before_id: Optional[int] = Query(None, ge=1, description="返回ID小于该值的附件（游标）"),
+    limit: int = Query(50, ge=1, le=100, description="每页数量"),
+    current_user: User = Depends(get_read_user),
+    db: Session = Depends(get_read_db)
+):
+    """获取房间媒体库（按类型倒序分页）"""
+    if kind not in ATTACHMENT_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的附件类型"
+        )
+    
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="房间不存在"
+        )
+    
+    if room.is_private and not room.is_member(current_user, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此房间的媒体"
+        )
+    
+    # 命中 (room_id, kind, id) 索引，游标分页避免 OFFSET 扫描
+    query = db.query(Attachment).filter(
+        Attachment.room_id == room_id,
+        Attachment.kind == kind
+    )
+    if before_id is not None:
+        query = query.filter(Attachment.id < before_id)
+    items = query.order_by(Attachment.id.desc()).limit(limit).all()
+    
+    return MediaList(
+        items=[AttachmentResponse(**item.to_dict()) for item in items],
+        next_before_id=items[-1].id if len(items) == limit else None
+    )
+
 @router.put("/{room_id}", response_model=RoomResponse)
-async def update_room(
+def update_room(
     room_id: int,
     room_data: RoomUpdate,
     current_user: User = Depends(get_current_user),
@@ -243,7 +289,7 @@ async def update_room(
     return RoomResponse(**room.to_dict(db))
 
 @router.delete("/{room_id}")
-async def delete_room(
+def delete_room(
     room_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -263,8 +309,15 @@ async def delete_room(
             detail="只有房间创建者可以删除房间"
         )
     
+    # 删除房间附件引用，附件由回收任务在宽限期后清理
+    db.query(FileReference).filter(FileReference.room_id == room_id).delete(synchronize_session=False)
+    db.query(Attachment).filter(Attachment.room_id == room_id).delete(synchronize_session=False)
+    db.query(MessageTombstone).filter(MessageTombstone.room_id == room_id).delete(synchronize_session=False)
+    archive_paths = delete_room_archive(db, room_id)
+    
     # 删除房间（级联删除会自动删除相关的成员关系和消息）
     db.delete(room)
     db.commit()
+    remove_segment_files(archive_paths)
     
     return {"message": "房间删除成功"} 
\ No newline at end of file
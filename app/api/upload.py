@@ -1,19 +1,56 @@
 # 文件上传API
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 from sqlalchemy.orm import Session
-import os
+from datetime import datetime, timedelta
+from pathlib import Path
 import uuid
+from typing import Optional
 import aiofiles
-from pathlib import Path
 
-from app.database import get_db
-from app.models import User
+from app.database import get_db, run_db, release_connection
+from app.models import User, Room, UploadSession, StoredFile
+from app.schemas.upload import UploadSessionCreate, UploadSessionResponse, PresignedUploadCreate, PresignedUploadComplete
 from app.core.deps import get_current_user
+from app.core.security import create_upload_token, verify_upload_token
+from app.core.storage import get_storage
+from app.core.files import (
+    MultipartFileReader, receive_upload, commit_upload, release_file, commit_temp_file, register_file,
+    build_file_key, build_staging_key, stream_to_temp, set_avatar_reference, get_user_usage, get_room_usage, exceeds_quota,
+    FileTooLargeError, UploadFormError, FileNotOwnedError
+)
+from app.core.resumable import (
+    get_partial_path, get_chunk_path, get_expires_at, claim_offset, write_chunk, hash_partial_file
+)
+from app.core.images import schedule_derivatives
+from app.core.metrics import UPLOAD_BYTES
 from app.config import settings
 
 router = APIRouter()
 
+# 头像大小限制
+AVATAR_MAX_SIZE = 5 * 1024 * 1024  # 5MB
+
+# multipart 表单边界等额外开销的容差
+MULTIPART_OVERHEAD = 64 * 1024
+
+# 头像允许的图片格式
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
+
+# 表单上传接口直接流式读取请求体，手动声明表单结构供接口文档使用
+FILE_FORM_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}}
+        }}}
+    }
+}
+
 def get_file_extension(filename: str) -> str:
     """获取文件扩展名"""
     return filename.split('.')[-1].lower() if '.' in filename else ''
@@ -23,66 +60,123 @@ def is_allowed_file(filename: str) -> bool:
     extension = get_file_extension(filename)
     return extension in settings.ALLOWED_EXTENSIONS
 
-def generate_unique_filename(original_filename: str) -> str:
-    """生成唯一的文件名"""
-    extension = get_file_extension(original_filename)
-    unique_id = str(uuid.uuid4())
-    return f"{unique_id}.{extension}" if extension else unique_id
+def get_file_type_dir(extension: str) -> str:
+    """根据扩展名确定存储子目录"""
+    if extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
+        return "images"
+    elif extension in ['pdf', 'doc', 'docx', 'txt', 'md']:
+        return "documents"
+    elif extension in ['mp3', 'wav', 'ogg']:
+        return "audio"
+    elif extension in ['mp4', 'avi', 'mov', 'webm']:
+        return "video"
+    else:
+        return "files"
 
-@router.post("/avatar")
-async def upload_avatar(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """上传用户头像"""
-    # 检查文件类型
-    if not file.filename:
+def exceeds_content_length(request: Request, max_size: int) -> bool:
+    """根据Content-Length提前判断请求体是否必然超限"""
+    content_length = request.headers.get("content-length")
+    if not content_length or not content_length.isdigit():
+        return False
+    return int(content_length) > max_size + MULTIPART_OVERHEAD
+
+def check_image_filename(filename: str) -> None:
+    """检查头像文件名（读取文件内容前调用）"""
+    if not filename:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="请选择文件"
         )
     
     # 检查是否是图片文件
-    image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']
-    extension = get_file_extension(file.filename)
-    if extension not in image_extensions:
+    if get_file_extension(filename) not in IMAGE_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="只支持图片文件格式"
         )
-    
-    # 检查文件大小
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:  # 5MB
+
+def check_upload_filename(filename: str) -> None:
+    """检查聊天文件名（读取文件内容前调用）"""
+    if not filename:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="头像文件大小不能超过5MB"
+            detail="请选择文件"
         )
     
-    # 创建上传目录
-    upload_dir = Path(settings.UPLOAD_DIR) / "avatars"
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 生成唯一文件名
-    filename = generate_unique_filename(file.filename)
-    file_path = upload_dir / filename
-    
-    # 保存文件
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
+    if not is_allowed_file(filename):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的文件类型。支持的类型：{', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+
+async def receive_form_file(request: Request, db: Session, max_size: int, too_large: HTTPException, check_filename):
+    """流式接收表单中的 file 字段，返回 (文件名, 临时文件路径, SHA-256, 文件大小)
+
+    Content-Length 超限时在读取请求体前拒绝；接收期间不占用数据库连接。
+    """
+    if exceeds_content_length(request, max_size):
+        raise too_large
     
-    # 更新用户头像URL
-    avatar_url = f"/uploads/avatars/{filename}"
-    current_user.avatar_url = avatar_url
+    release_connection(db)
+    reader = MultipartFileReader(request, "file", check_filename)
+    try:
+        temp_path, digest, size = await receive_upload(reader, max_size)
+    except FileTooLargeError:
+        raise too_large
+    except UploadFormError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请选择文件"
+        )
+    return reader.filename, temp_path, digest, size
+
+async def check_received_quota(db: Session, user: User, temp_path: Path, size: int) -> None:
+    """按实际接收的大小检查存储配额，超出时删除临时文件"""
+    try:
+        await run_db(check_quota, db, user, size)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+def set_user_avatar(db: Session, user: User, stored: StoredFile) -> None:
+    """替换用户头像（在数据库线程中执行）"""
+    # 替换头像引用，旧头像失去引用后由回收任务清理
+    set_avatar_reference(db, user.id, stored)
+    user.avatar_url = stored.url
     db.commit()
     
     # 刷新用户对象以获取最新数据
-    db.refresh(current_user)
+    db.refresh(user)
+
+@router.post("/avatar", openapi_extra=FILE_FORM_BODY)
+async def upload_avatar(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """上传用户头像（multipart/form-data，文件字段名为 file）"""
+    user_id = current_user.id
+    
+    # 流式保存文件（边写边校验大小，按内容去重）
+    too_large = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="头像文件大小不能超过5MB"
+    )
+    filename, temp_path, digest, size = await receive_form_file(
+        request, db, AVATAR_MAX_SIZE, too_large, check_image_filename
+    )
+    await check_received_quota(db, current_user, temp_path, size)
+    stored = await commit_upload(db, temp_path, digest, size, "avatars", get_file_extension(filename), user_id)
+    await run_db(set_user_avatar, db, current_user, stored)
+    
+    # 后台生成多尺寸头像
+    avatar_derivatives = schedule_derivatives(stored.file_key)
+    avatar_url = current_user.avatar_url
     
     return {
         "message": "头像上传成功",
         "avatar_url": avatar_url,
+        "avatar_derivatives": avatar_derivatives,
         "user": {
             "id": current_user.id,
             "username": current_user.username,
@@ -103,75 +197,45 @@ async def upload_avatar(
         }
     }
 
-@router.post("/file")
+@router.post("/file", openapi_extra=FILE_FORM_BODY)
 async def upload_file(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    """上传聊天文件"""
-    # 检查文件
-    if not file.filename:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="请选择文件"
-        )
-    
-    # 检查文件类型
-    if not is_allowed_file(file.filename):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"不支持的文件类型。支持的类型：{', '.join(settings.ALLOWED_EXTENSIONS)}"
-        )
+    """上传聊天文件（multipart/form-data，文件字段名为 file）"""
+    user_id = current_user.id
     
-    # 检查文件大小
-    content = await file.read()
-    if len(content) > settings.MAX_FILE_SIZE:
-        max_size_mb = settings.MAX_FILE_SIZE / (1024 * 1024)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"文件大小不能超过{max_size_mb}MB"
-        )
+    # 流式保存文件（边写边校验大小，按内容去重）
+    max_size_mb = settings.MAX_FILE_SIZE / (1024 * 1024)
+    too_large = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"文件大小不能超过{max_size_mb}MB"
+    )
+    filename, temp_path, digest, size = await receive_form_file(
+        request, db, settings.MAX_FILE_SIZE, too_large, check_upload_filename
+    )
+    await check_received_quota(db, current_user, temp_path, size)
     
     # 确定文件类型目录
-    extension = get_file_extension(file.filename)
-    if extension in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp']:
-        file_type = "images"
-    elif extension in ['pdf', 'doc', 'docx', 'txt', 'md']:
-        file_type = "documents"
-    elif extension in ['mp3', 'wav', 'ogg']:
-        file_type = "audio"
-    elif extension in ['mp4', 'avi', 'mov', 'webm']:
-        file_type = "video"
-    else:
-        file_type = "files"
-    
-    # 创建上传目录
-    upload_dir = Path(settings.UPLOAD_DIR) / file_type
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 生成唯一文件名
-    filename = generate_unique_filename(file.filename)
-    file_path = upload_dir / filename
-    
-    # 保存文件
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(content)
-    
-    # 返回文件信息
-    file_url = f"/uploads/{file_type}/{filename}"
+    extension = get_file_extension(filename)
+    stored = await commit_upload(db, temp_path, digest, size, get_file_type_dir(extension), extension, user_id)
     
+    # 返回文件信息（图片附带缩略图URL，缩略图在后台生成）
     return {
         "message": "文件上传成功",
-        "file_url": file_url,
-        "file_name": file.filename,
-        "file_size": len(content),
-        "file_type": extension
+        "file_url": stored.url,
+        "file_name": filename,
+        "file_size": stored.size,
+        "file_type": extension,
+        "derivatives": schedule_derivatives(stored.file_key)
     }
 
 @router.delete("/file")
-async def delete_file(
+def delete_file(
     file_url: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """删除文件"""
     # 验证文件URL格式
@@ -181,6 +245,17 @@ async def delete_file(
             detail="无效的文件URL"
         )
     
+    # 内容寻址存储中的文件：释放当前用户的上传引用，归零时才删除物理文件
+    try:
+        if release_file(db, file_url, current_user.id) is not None:
+            return {"message": "文件删除成功"}
+    except FileNotOwnedError:
+        # 不区分“不存在”和“属于其他用户”，避免探测他人的文件
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="文件不存在"
+        )
+    
     # 构建文件路径
     file_path = Path(".") / file_url.lstrip("/")
     
@@ -199,4 +274,434 @@ async def delete_file(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="文件删除失败"
-        )
\ No newline at end of file
+        )
+
+def check_quota(db: Session, user: User, incoming_size: int = 0):
+    """检查用户存储配额"""
+    if exceeds_quota(db, user.id, incoming_size):
+        quota_mb = settings.USER_UPLOAD_QUOTA / (1024 * 1024)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"存储空间已超出配额（{quota_mb:.0f}MB）"
+        )
+
+def session_response(upload_session: UploadSession) -> UploadSessionResponse:
+    """构建上传会话响应"""
+    return UploadSessionResponse(
+        session_id=upload_session.id,
+        file_name=upload_session.file_name,
+        total_size=upload_session.total_size,
+        offset=upload_session.received_size,
+        chunk_size=settings.MAX_UPLOAD_PATCH_SIZE,
+        expires_at=get_expires_at(upload_session).isoformat()
+    )
+
+def offset_conflict(received_size: int) -> HTTPException:
+    """偏移量冲突错误，响应头返回服务器记录的偏移量"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="偏移量与服务器记录不一致",
+        headers={"Upload-Offset": str(received_size)}
+    )
+
+def get_owned_session(db: Session, session_id: str, user: User) -> UploadSession:
+    """获取当前用户的上传会话"""
+    upload_session = db.query(UploadSession).filter(
+        UploadSession.id == session_id,
+        UploadSession.user_id == user.id
+    ).first()
+    if not upload_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在或已过期"
+        )
+    return upload_session
+
+@router.post("/sessions", response_model=UploadSessionResponse)
+def create_upload_session(
+    session_data: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """创建可续传上传会话"""
+    if not is_allowed_file(session_data.file_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的文件类型。支持的类型：{', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+    
+    if session_data.file_size > settings.MAX_RESUMABLE_FILE_SIZE:
+        max_size_mb = settings.MAX_RESUMABLE_FILE_SIZE / (1024 * 1024)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"文件大小不能超过{max_size_mb}MB"
+        )
+    
+    check_quota(db, current_user, session_data.file_size)
+    
+    # 限制每个用户同时进行的上传会话数
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    active_sessions = db.query(UploadSession).filter(
+        UploadSession.user_id == current_user.id,
+        UploadSession.updated_at >= cutoff
+    ).count()
+    if active_sessions >= settings.MAX_UPLOAD_SESSIONS_PER_USER:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"同时进行的上传不能超过{settings.MAX_UPLOAD_SESSIONS_PER_USER}个"
+        )
+    
+    extension = get_file_extension(session_data.file_name)
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        file_name=session_data.file_name,
+        file_type=get_file_type_dir(extension),
+        extension=extension,
+        total_size=session_data.file_size,
+        received_size=0
+    )
+    get_partial_path(upload_session.id).touch()
+    db.add(upload_session)
+    db.commit()
+    db.refresh(upload_session)
+    
+    return session_response(upload_session)
+
+@router.get("/sessions/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """查询上传会话进度（断线后用于确定续传偏移量）"""
+    return session_response(get_owned_session(db, session_id, current_user))
+
+@router.patch("/sessions/{session_id}", response_model=UploadSessionResponse)
+async def upload_session_chunk(
+    session_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """上传一个分块，请求头 Upload-Offset 指定写入偏移量，请求体为原始字节"""
+    upload_session = get_owned_session(db, session_id, current_user)
+    
+    offset_header = request.headers.get("upload-offset")
+    if offset_header is None or not offset_header.isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="缺少有效的 Upload-Offset 请求头"
+        )
+    
+    if exceeds_content_length(request, settings.MAX_UPLOAD_PATCH_SIZE):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单个分块不能超过{settings.MAX_UPLOAD_PATCH_SIZE // (1024 * 1024)}MB"
+        )
+    
+    offset = int(offset_header)
+    if offset != upload_session.received_size:
+        raise offset_conflict(upload_session.received_size)
+    total_size = upload_session.total_size
+    
+    # 接收请求体期间不占用数据库连接
+    release_connection(db)
+    
+    # 分块先写入独立的临时文件，偏移量确认无误后再写入会话文件
+    limit = min(total_size - offset, settings.MAX_UPLOAD_PATCH_SIZE)
+    chunk_path = get_chunk_path(session_id)
+    written = 0
+    try:
+        async with aiofiles.open(chunk_path, 'wb') as f:
+            try:
+                async for chunk in request.stream():
+                    if written + len(chunk) > limit:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="分块超出文件声明的大小"
+                        )
+                    await f.write(chunk)
+                    written += len(chunk)
+            except ClientDisconnect:
+                # 已收到的字节仍然保存，客户端据此续传
+                pass
+        
+        # 条件更新推进进度：同一偏移量只有一个请求能成功（多进程下同样成立）
+        if not await run_db(claim_offset, db, session_id, offset, offset + written):
+            upload_session = await run_db(get_owned_session, db, session_id, current_user)
+            raise offset_conflict(upload_session.received_size)
+        try:
+            await run_in_threadpool(write_chunk, session_id, chunk_path, offset)
+        except BaseException:
+            # 写入失败时退回进度
+            await run_db(claim_offset, db, session_id, offset + written, offset)
+            raise
+        UPLOAD_BYTES.inc(written, ("resumable",))
+    finally:
+        chunk_path.unlink(missing_ok=True)
+    
+    upload_session = await run_db(get_owned_session, db, session_id, current_user)
+    return session_response(upload_session)
+
+def finish_upload_session(
+    db: Session, session_id: str, total_size: int, digest: str, file_type: str, extension: str, user_id: int
+) -> Optional[StoredFile]:
+    """删除已完成的会话并登记文件（在数据库线程中执行），会话已被并发请求处理时返回 None"""
+    deleted = db.query(UploadSession).filter(
+        UploadSession.id == session_id,
+        UploadSession.received_size == total_size
+    ).delete(synchronize_session=False)
+    if not deleted:
+        db.rollback()
+        return None
+    stored = commit_temp_file(
+        db, get_partial_path(session_id), digest, total_size,
+        file_type, extension, user_id
+    )
+    db.refresh(stored)
+    return stored
+
+@router.post("/sessions/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """完成上传：校验大小，计算哈希后登记到内容寻址存储"""
+    upload_session = get_owned_session(db, session_id, current_user)
+    if upload_session.received_size != upload_session.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件尚未上传完成",
+            headers={"Upload-Offset": str(upload_session.received_size)}
+        )
+    
+    user_id = current_user.id
+    total_size = upload_session.total_size
+    file_name = upload_session.file_name
+    file_type = upload_session.file_type
+    extension = upload_session.extension
+    release_connection(db)
+    
+    digest = await run_in_threadpool(hash_partial_file, session_id, total_size)
+    if digest is None:
+        # 临时文件短于记录的进度（分块写入中途失败），退回到实际长度由客户端续传
+        actual_size = get_partial_path(session_id).stat().st_size
+        await run_db(claim_offset, db, session_id, total_size, actual_size)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件尚未上传完成",
+            headers={"Upload-Offset": str(actual_size)}
+        )
+    
+    # 条件删除会话：并发的完成或取消请求中只有一个生效
+    stored = await run_db(
+        finish_upload_session, db, session_id, total_size, digest, file_type, extension, user_id
+    )
+    if stored is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在或已过期"
+        )
+    
+    return {
+        "message": "文件上传成功",
+        "file_url": stored.url,
+        "file_name": file_name,
+        "file_size": stored.size,
+        "file_type": extension,
+        "derivatives": schedule_derivatives(stored.file_key)
+    }
+
+@router.delete("/sessions/{session_id}")
+def abort_upload_session(
+    session_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """取消上传会话并删除临时文件"""
+    get_owned_session(db, session_id, current_user)
+    
+    # 先删除会话记录，正在进行的分块请求随后推进进度时会失败
+    db.query(UploadSession).filter(UploadSession.id == session_id).delete(synchronize_session=False)
+    db.commit()
+    get_partial_path(session_id).unlink(missing_ok=True)
+    
+    return {"message": "上传已取消"}
+
+@router.post("/presign")
+async def create_presigned_upload(
+    upload_data: PresignedUploadCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """申请客户端直传：返回预签名上传地址，文件字节不经过应用进程
+
+    客户端需预先计算文件的SHA-256，上传时由存储端（或直传接口）校验。
+    即使相同内容已存在也必须上传：只凭哈希值登记引用会让知道哈希的人获得他人文件。
+    """
+    if not is_allowed_file(upload_data.file_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"不支持的文件类型。支持的类型：{', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+    
+    if upload_data.file_size > settings.MAX_RESUMABLE_FILE_SIZE:
+        max_size_mb = settings.MAX_RESUMABLE_FILE_SIZE / (1024 * 1024)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"文件大小不能超过{max_size_mb}MB"
+        )
+    
+    check_quota(db, current_user, upload_data.file_size)
+    
+    extension = get_file_extension(upload_data.file_name)
+    key = build_file_key(get_file_type_dir(extension), upload_data.sha256, extension)
+    
+    # 上传到本次申请独有的暂存键，确认完成时再移动到内容寻址的存储键
+    staging_key = build_staging_key(extension)
+    expires_in = settings.PRESIGNED_URL_EXPIRE_SECONDS
+    token = create_upload_token({
+        "key": key,
+        "staging": staging_key,
+        "sha256": upload_data.sha256,
+        "size": upload_data.file_size,
+        "name": upload_data.file_name,
+        "uid": current_user.id
+    }, timedelta(seconds=expires_in))
+    
+    return {
+        "uploaded": False,
+        "upload": get_storage().presign_upload(
+            staging_key, upload_data.file_size, upload_data.sha256, f"/api/upload/direct/{token}"
+        ),
+        "token": token,
+        "expires_in": expires_in
+    }
+
+@router.put("/direct/{token}")
+async def direct_upload(
+    token: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """本地存储的直传接口，令牌本身即上传凭据"""
+    claims = verify_upload_token(token)
+    if not claims:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="上传令牌无效或已过期"
+        )
+    
+    storage = get_storage()
+    if storage.local_path(claims["staging"]) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="当前存储后端请使用预签名地址上传"
+        )
+    
+    try:
+        temp_path, digest, size = await stream_to_temp(request.stream(), claims["size"])
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件大小与申请不符"
+        )
+    UPLOAD_BYTES.inc(size, ("direct",))
+    
+    if digest != claims["sha256"] or size != claims["size"]:
+        temp_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件内容校验失败"
+        )
+    
+    storage.save_file(claims["staging"], temp_path)
+    
+    return {"message": "上传成功"}
+
+def promote_staged_object(staging_key: str, key: str) -> None:
+    """将校验过的暂存对象移动到正式存储键，内容已存在时删除暂存对象"""
+    storage = get_storage()
+    if storage.exists(key):
+        storage.delete(staging_key)
+    else:
+        storage.move(staging_key, key)
+
+@router.post("/presign/complete")
+async def complete_presigned_upload(
+    complete_data: PresignedUploadComplete,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """确认直传完成：校验对象已写入存储后登记文件"""
+    claims = verify_upload_token(complete_data.token)
+    if not claims or claims.get("uid") != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="上传令牌无效或已过期"
+        )
+    
+    # 暂存对象只能经由本次申请的签名上传写入，内容已由存储端按SHA-256校验
+    key = claims["key"]
+    staging_key = claims["staging"]
+    storage = get_storage()
+    size = await run_in_threadpool(storage.get_size, staging_key)
+    if size != claims["size"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件尚未上传完成"
+        )
+    
+    def register() -> StoredFile:
+        promote_staged_object(staging_key, key)
+        stored = register_file(db, key, claims["sha256"], size, current_user.id)
+        db.refresh(stored)
+        return stored
+    
+    # 登记需要写连接，在数据库线程中执行；派生图任务需在事件循环中提交，因此接口保持异步
+    stored = await run_db(register)
+    extension = get_file_extension(claims["name"])
+    
+    return {
+        "message": "文件上传成功",
+        "file_url": stored.url,
+        "file_name": claims["name"],
+        "file_size": stored.size,
+        "file_type": extension,
+        "derivatives": schedule_derivatives(stored.file_key)
+    }
+
+@router.get("/usage")
+async def get_storage_usage(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取当前用户的存储占用和配额"""
+    return {
+        "used": get_user_usage(db, current_user.id),
+        "quota": settings.USER_UPLOAD_QUOTA
+    }
+
+@router.get("/usage/rooms/{room_id}")
+async def get_room_storage_usage(
+    room_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取房间附件的存储占用"""
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="房间不存在"
+        )
+    
+    if room.is_private and not room.is_member(current_user, db):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权限访问此房间"
+        )
+    
+    return {"room_id": room_id, "used": get_room_usage(db, room_id)}
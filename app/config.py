@@ -1,7 +1,6 @@
 import os
-from typing import List
+from typing import Dict, List, Set
 from pydantic_settings import BaseSettings
-from pathlib import Path
 
 class Settings(BaseSettings):
     """应用配置"""
@@ -11,32 +10,104 @@ class Settings(BaseSettings):
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    # 可信反向代理地址（逗号分隔，支持网段，* 表示全部），只采信这些地址转发的 X-Forwarded-For；留空不信任任何代理
+    FORWARDED_ALLOW_IPS: str = os.getenv("FORWARDED_ALLOW_IPS", "")
     
     # 数据库配置
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./instance/chatroom.db")
     
-    def model_post_init(self, __context):
-        """模型初始化后处理，确保必要的目录存在"""
-        # 确保数据库目录存在（仅对SQLite数据库）
-        if "sqlite" in self.DATABASE_URL and ":///" in self.DATABASE_URL:
-            # 提取数据库文件路径
-            db_path = self.DATABASE_URL.split("///", 1)[1]
-            if db_path.startswith("./"):
-                db_path = db_path[2:]  # 移除 "./" 前缀
-            
-            # 获取数据库文件的目录
-            db_dir = Path(db_path).parent
-            
-            # 创建目录（如果不存在）
-            db_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 确保日志目录存在
-        log_dir = Path(self.LOG_FILE).parent
-        log_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 确保上传目录存在
-        upload_dir = Path(self.UPLOAD_DIR)
-        upload_dir.mkdir(parents=True, exist_ok=True)
+    # SQLite 高并发模式：WAL、调优的 PRAGMA、单一写连接串行化写入、读连接池
+    SQLITE_PERFORMANCE_MODE: bool = os.getenv("SQLITE_PERFORMANCE_MODE", "True").lower() == "true"
+    SQLITE_READ_POOL_SIZE: int = 8  # 读连接数
+    SQLITE_BUSY_TIMEOUT: int = 5000  # 等待数据库锁的时间（毫秒）
+    SQLITE_BUSY_RETRIES: int = 3  # 获取写锁超时后的重试次数
+    SQLITE_WRITE_POOL_TIMEOUT: float = float(os.getenv("SQLITE_WRITE_POOL_TIMEOUT", "5"))  # 等待写连接的超时（秒），超时返回503
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024  # 每个连接的页缓存（KB）
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 内存映射读取大小（字节）
+    
+    # 连接池配置（PostgreSQL等服务端数据库）
+    WORKERS: int = int(os.getenv("WORKERS", "1"))  # 应用进程数，用于分配数据库连接预算
+    DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))  # Socket.IO 事件的数据库线程数
+    THREADPOOL_SIZE: int = int(os.getenv("THREADPOOL_SIZE", "40"))  # 同步接口（def 路由）的线程数，每个线程最多占用一个数据库连接
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", "90"))  # 所有进程合计可用的连接数（PostgreSQL 默认 max_connections=100，预留管理连接）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "0"))  # 每进程常驻连接数，0 表示按线程数和进程数自动计算
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))  # 高峰时允许额外创建的连接数
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # 等待空闲连接的超时（秒）
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 连接最长使用时间（秒），避免被服务端或代理断开
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"  # 取出连接前检测是否可用
+    DB_QUERY_CACHE_SIZE: int = 1000  # SQLAlchemy 编译语句缓存条目数
+    DB_PREPARE_THRESHOLD: int = int(os.getenv("DB_PREPARE_THRESHOLD", "5"))  # psycopg 3：同一语句执行多少次后改用服务端预编译，0 表示禁用
+    DB_POOL_STATS_INTERVAL: int = 60  # 连接池统计日志间隔（秒），0 表示禁用
+    
+    # 只读副本：逗号分隔的数据库URL，历史消息和列表类只读接口的查询分发到副本
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    REPLICA_STICKY_SECONDS: float = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))  # 用户写入后该时间内的读取仍走主库，保证读到自己的写入
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))  # 复制延迟超过该值的副本暂停使用
+    REPLICA_CHECK_INTERVAL: int = 10  # 副本健康和延迟检查间隔（秒）
+    
+    # 消息冷归档：超过保留期的消息按 (房间, 月份) 移入压缩的只读分段文件，热表及其索引大小保持稳定
+    MESSAGE_HOT_RETENTION_DAYS: int = int(os.getenv("MESSAGE_HOT_RETENTION_DAYS", "0"))  # 热表保留天数，0 表示不归档
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "./instance/archive")  # 分段文件目录（不对外提供静态访问）
+    ARCHIVE_INTERVAL: int = 6 * 60 * 60  # 归档任务间隔（秒）
+    ARCHIVE_SEGMENT_CACHE_SIZE: int = 32  # 内存中缓存的已解压分段数
+    
+    # 已删除消息压缩：软删除的消息延迟后从 messages 表物理删除，墓碑表保留 (ID, 房间, 删除时间) 供客户端增量同步
+    TOMBSTONE_COMPACTION_DELAY: int = 24 * 60 * 60  # 软删除的消息在消息表中保留的时间（秒）
+    TOMBSTONE_COMPACTION_INTERVAL: int = 60 * 60  # 压缩任务间隔（秒）
+    TOMBSTONE_COMPACTION_BATCH_SIZE: int = 500  # 每个事务删除的消息数，避免长时间持有锁
+    TOMBSTONE_RETENTION_DAYS: int = 30  # 墓碑保留天数，更早的增量同步请求需要客户端全量刷新
+    
+    # 监控指标（Prometheus 格式，GET /metrics）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")  # 设置后抓取请求需携带 Authorization: Bearer <token>
+    
+    # 管理员用户名（逗号分隔），可访问调试接口、按请求开启SQL分析
+    ADMIN_USERNAMES: str = os.getenv("ADMIN_USERNAMES", "")
+    
+    # SQL 分析：管理员请求携带 X-Profile-SQL: 1 时统计该请求的查询数、耗时和重复语句
+    SQL_PROFILING: bool = os.getenv("SQL_PROFILING", "False").lower() == "true"  # 对所有请求和Socket.IO事件开启
+    SQL_SLOW_QUERY_MS: float = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))  # 慢查询日志阈值（毫秒），0 表示不记录
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # 同一语句在一个请求中执行达到该次数视为可能的 N+1 查询
+    
+    # 事件循环监控：采样调度延迟，卡顿超过阈值时记录占用事件循环的调用栈（GET /api/debug/loop）
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "True").lower() == "true"
+    LOOP_LAG_SAMPLE_INTERVAL: float = 0.1  # 采样间隔（秒）
+    LOOP_STALL_THRESHOLD_MS: float = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))  # 卡顿阈值（毫秒）
+    
+    # 就绪检查（GET /api/health/ready）：超过以下任一限制时返回503，并拒绝新的 Socket.IO 连接
+    MAX_SOCKET_CONNECTIONS: int = int(os.getenv("MAX_SOCKET_CONNECTIONS", "0"))  # 每进程 Socket.IO 连接容量，0 表示不限制
+    READY_MAX_POOL_SATURATION: float = float(os.getenv("READY_MAX_POOL_SATURATION", "0.95"))  # 连接池占用率上限
+    READY_MAX_LOOP_LAG_MS: float = float(os.getenv("READY_MAX_LOOP_LAG_MS", "500"))  # 最近一秒事件循环延迟上限（毫秒）
+    HEALTH_CHECK_TIMEOUT: float = 2.0  # 数据库和消息代理连通性检查超时（秒）
+    
+    # 排空模式（滚动部署）：收到 SIGUSR1 或管理员请求后拒绝新连接、就绪检查失败，并在时间窗口内分批断开现有连接
+    DRAIN_WINDOW_SECONDS: float = float(os.getenv("DRAIN_WINDOW_SECONDS", "30"))  # 断开全部连接的时间窗口
+    DRAIN_RECONNECT_JITTER_SECONDS: float = float(os.getenv("DRAIN_RECONNECT_JITTER_SECONDS", "5"))  # 客户端重连前随机等待的上限
+    DRAIN_FLUSH_TIMEOUT: float = 10.0  # 断开后等待未完成数据库写入的最长时间（秒）
+    
+    # 消息ID生成：工作节点ID（0-31），多进程/多实例部署时每个进程需各不相同
+    # -1 表示自动分配：配置了 BROKER_URL 时从 Redis 租用空闲ID，使用本地 SQLite 单进程运行时按进程号分配
+    WORKER_ID: int = int(os.getenv("WORKER_ID", "-1"))
+    WORKER_ID_LEASE_TTL: int = 30  # 工作节点ID租约有效期（秒），进程异常退出后该ID在此时间后可被复用
+    
+    # 消息代理（Redis），多进程/多实例部署时用于共享状态和 Socket.IO 跨进程广播，如 redis://localhost:6379/0
+    BROKER_URL: str = os.getenv("BROKER_URL", "")
+    
+    # 多进程启动器（python run.py --production）为每个工作进程设置，单进程运行时保持默认值
+    WORKER_INDEX: int = int(os.getenv("WORKER_INDEX", "-1"))  # 工作进程序号，全局维护任务只在0号进程运行
+    SKIP_INIT: bool = os.getenv("SKIP_INIT", "False").lower() == "true"  # 启动时跳过建表和建目录（已由启动器或 run.py --init 完成）
+    
+    # 消息发送去重：客户端重试时按 (用户, nonce) 返回原消息
+    MESSAGE_NONCE_TTL: int = 10 * 60  # 去重记录保留时间（秒）
+    MESSAGE_NONCE_MAX_ENTRIES: int = 100000  # 进程内去重索引的最大记录数
+    
+    # 紧凑模式名片缓存：记录每个房间最近发言的作者，加入房间时预先下发其名片，其余名片由客户端按需获取
+    ROOM_CARD_CACHE_SIZE: int = int(os.getenv("ROOM_CARD_CACHE_SIZE", "200"))  # 每个房间记录的作者数
+    ROOM_CARD_CACHE_ROOMS: int = int(os.getenv("ROOM_CARD_CACHE_ROOMS", "1000"))  # 每进程记录的房间数
+    
+    @property
+    def admin_usernames(self) -> Set[str]:
+        return {name.strip() for name in self.ADMIN_USERNAMES.split(",") if name.strip()}
     
     # JWT配置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
@@ -46,6 +117,30 @@ class Settings(BaseSettings):
     # 文件上传配置
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024  # 流式上传分块大小（64KB）
+    
+    # 文件存储后端配置：local（本地目录）或 s3（S3兼容对象存储，需要 boto3）
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "chatroom-uploads")
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "")  # MinIO等兼容服务的地址
+    S3_REGION: str = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID: str = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    S3_ADDRESSING_STYLE: str = os.getenv("S3_ADDRESSING_STYLE", "auto")  # MinIO通常需要 path
+    PRESIGNED_URL_EXPIRE_SECONDS: int = 15 * 60  # 预签名URL有效期（秒）
+    
+    # 上传文件回收与配额配置
+    UPLOAD_GC_INTERVAL: int = 60 * 60  # 孤立文件回收间隔（秒），0表示禁用
+    UPLOAD_GC_GRACE_PERIOD: int = 24 * 60 * 60  # 上传后多久仍未被引用视为孤立（秒）
+    UPLOAD_GC_BATCH_SIZE: int = 500
+    USER_UPLOAD_QUOTA: int = 1024 * 1024 * 1024  # 每用户存储配额1GB，0表示不限制
+    
+    # 可续传上传配置
+    MAX_RESUMABLE_FILE_SIZE: int = 512 * 1024 * 1024  # 512MB
+    MAX_UPLOAD_PATCH_SIZE: int = 16 * 1024 * 1024  # 单次PATCH最大16MB
+    MAX_UPLOAD_SESSIONS_PER_USER: int = 3
+    UPLOAD_SESSION_TTL: int = 24 * 60 * 60  # 会话无活动24小时后过期（秒）
+    UPLOAD_SESSION_CLEANUP_INTERVAL: int = 10 * 60  # 过期会话清理间隔（秒）
     ALLOWED_EXTENSIONS: List[str] = [
         "jpg", "jpeg", "png", "gif", "bmp", "webp",  # 图片
         "pdf", "doc", "docx", "txt", "md",  # 文档
@@ -53,9 +148,34 @@ class Settings(BaseSettings):
         "mp4", "avi", "mov", "webm"  # 视频
     ]
     
+    # 图片派生图配置（需要安装 Pillow）
+    AVATAR_DERIVATIVE_SIZES: List[int] = [64, 128, 256]  # 头像尺寸（最长边像素）
+    IMAGE_DERIVATIVE_SIZES: List[int] = [320, 1280]  # 聊天图片缩略图尺寸
+    IMAGE_DERIVATIVE_FORMAT: str = "webp"  # webp 或 jpeg
+    IMAGE_DERIVATIVE_QUALITY: int = 80
+    IMAGE_WORKERS: int = 2  # 图片处理进程数
+    
     # 日志配置
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-    LOG_FILE: str = os.getenv("LOG_FILE", "logs/app.log")
+    LOG_FILE: str = os.getenv("LOG_FILE", "logs/app.log")  # 留空则只输出到控制台
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # json（每行一条结构化记录）或 text
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))  # 单个日志文件上限，超过后轮转
+    LOG_BACKUP_COUNT: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))  # 保留的轮转文件数
+    LOG_QUEUE_SIZE: int = 10000  # 日志队列容量，写入跟不上时丢弃新记录而不阻塞事件循环
+    # 按类别采样 INFO 及以下级别的日志，格式：类别=比例，逗号分隔；未列出的类别全部记录
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "send_message=0.01")
+    ACCESS_LOG: bool = os.getenv("ACCESS_LOG", "True").lower() == "true"  # HTTP 访问日志（类别 access）
+    SOCKETIO_LOGGER: bool = os.getenv("SOCKETIO_LOGGER", "False").lower() == "true"  # Socket.IO 协议层日志（调试用）
+    ENGINEIO_LOGGER: bool = os.getenv("ENGINEIO_LOGGER", "False").lower() == "true"
+    
+    @property
+    def log_sample_rates(self) -> Dict[str, float]:
+        rates = {}
+        for item in self.LOG_SAMPLE_RATES.split(","):
+            category, _, rate = item.partition("=")
+            if category.strip() and rate.strip():
+                rates[category.strip()] = float(rate)
+        return rates
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,219 @@
+# app/core/archive.py
+# 消息冷归档：超过热数据保留期的消息按 (房间, 月份) 写入 gzip 压缩的 JSON Lines 只读分段文件，
+# 并从 messages 表删除；历史消息接口在热表数据不足一页时透明地继续读取分段
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, desc, func, or_
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Message, MessageArchiveSegment
+from app.core.ids import LEGACY_ID_LIMIT, datetime_to_id
+from app.core.tasks import periodic_task
+
+logger = logging.getLogger(__name__)
+
+
+def get_archive_root() -> Path:
+    return Path(settings.ARCHIVE_DIR)
+
+
+def month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(dt: datetime) -> datetime:
+    return month_start(month_start(dt) + timedelta(days=32))
+
+
+def get_archive_cutoff(retention_days: int, now: Optional[datetime] = None) -> datetime:
+    """归档边界：早于 (当前时间 - 保留天数) 所在月份的消息整月归档"""
+    now = now or datetime.utcnow()
+    return month_start(now - timedelta(days=retention_days))
+
+
+def archivable_filter(cutoff: datetime):
+    """早于归档边界的消息：Snowflake ID 按ID比较（走主键索引），旧版本自增ID按时间戳比较"""
+    return or_(
+        and_(Message.id >= LEGACY_ID_LIMIT, Message.id < datetime_to_id(cutoff)),
+        and_(Message.id < LEGACY_ID_LIMIT, Message.timestamp < cutoff),
+    )
+
+
+def find_archive_range(db, room_id: int, cutoff: datetime) -> Optional[Tuple[datetime, int, tuple]]:
+    """房间中最早一个待归档月份，返回 (月份起点, 首条消息ID, 该月消息的过滤条件)，没有时返回None
+
+    旧版本自增ID不含时间信息且均小于 Snowflake ID，先按时间戳逐月归档；
+    旧消息全部归档后再按ID范围归档 Snowflake 消息。
+    """
+    legacy = db.query(Message).filter(
+        Message.room_id == room_id,
+        Message.id < LEGACY_ID_LIMIT,
+        Message.timestamp < cutoff
+    ).order_by(Message.timestamp, Message.id).first()
+    if legacy is not None:
+        start = month_start(legacy.timestamp)
+        end = min(cutoff, next_month(start))
+        return start, legacy.id, (
+            Message.room_id == room_id,
+            Message.id < LEGACY_ID_LIMIT,
+            Message.timestamp >= start,
+            Message.timestamp < end,
+        )
+
+    cutoff_id = datetime_to_id(cutoff)
+    first = db.query(Message).filter(
+        Message.room_id == room_id,
+        Message.id >= LEGACY_ID_LIMIT,
+        Message.id < cutoff_id
+    ).order_by(Message.id).first()
+    if first is None:
+        return None
+    start = month_start(first.timestamp)
+    end_id = min(cutoff_id, datetime_to_id(next_month(start)))
+    return start, first.id, (Message.room_id == room_id, Message.id >= first.id, Message.id < end_id)
+
+
+def write_segment(path: Path, messages: List[dict]) -> None:
+    """写入分段文件（先写临时文件再重命名，避免读到不完整的分段）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for message in messages:
+            f.write(json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+    os.replace(tmp_path, path)
+    os.chmod(path, 0o444)
+
+
+@lru_cache(maxsize=settings.ARCHIVE_SEGMENT_CACHE_SIZE)
+def load_segment(path: str) -> Tuple[dict, ...]:
+    """读取分段中的消息（按ID升序）；分段只读，解压结果可以缓存"""
+    with gzip.open(get_archive_root() / path, "rt", encoding="utf-8") as f:
+        return tuple(json.loads(line) for line in f if line.strip())
+
+
+def archive_room_month(db, room_id: int, cutoff: datetime) -> int:
+    """归档房间中最早一个月（不超过归档边界）的消息，返回移出热表的行数，0 表示没有可归档的消息"""
+    archive_range = find_archive_range(db, room_id, cutoff)
+    if archive_range is None:
+        return 0
+    start, first_id, in_range = archive_range
+
+    # 已删除的消息不再展示，直接丢弃
+    messages = [
+        message.to_dict(compact=True)
+        for message in db.query(Message).filter(*in_range, Message.is_deleted == False).order_by(Message.id)
+    ]
+    relative_path = f"{room_id}/{start:%Y-%m}-{first_id}.jsonl.gz"
+    path = get_archive_root() / relative_path
+    if messages:
+        write_segment(path, messages)
+        db.add(MessageArchiveSegment(
+            room_id=room_id,
+            month=f"{start:%Y-%m}",
+            min_message_id=messages[0]["id"],
+            max_message_id=messages[-1]["id"],
+            message_count=len(messages),
+            path=relative_path
+        ))
+
+    try:
+        # 附件行和文件引用原样保留（message_id 仍指向归档消息），
+        # 媒体库继续列出归档消息的附件，文件也不会被当作孤立文件回收
+        removed = db.query(Message).filter(*in_range).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        if messages:
+            path.unlink(missing_ok=True)
+        raise
+
+    logger.info("房间 %s 的 %s 消息已归档: %d 条（移出热表 %d 行）", room_id, f"{start:%Y-%m}", len(messages), removed)
+    return removed
+
+
+def archive_messages(retention_days: Optional[int] = None) -> int:
+    """归档所有房间中超过保留期的消息，返回移出热表的行数"""
+    retention_days = settings.MESSAGE_HOT_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    cutoff = get_archive_cutoff(retention_days)
+    removed = 0
+    db = SessionLocal()
+    try:
+        room_ids = [row[0] for row in db.query(Message.room_id).filter(archivable_filter(cutoff)).distinct()]
+        for room_id in room_ids:
+            while True:
+                count = archive_room_month(db, room_id, cutoff)
+                if not count:
+                    break
+                removed += count
+    finally:
+        db.close()
+    return removed
+
+
+@periodic_task("message_archive", settings.ARCHIVE_INTERVAL if settings.MESSAGE_HOT_RETENTION_DAYS > 0 else 0, singleton=True)
+def run_archive_task():
+    """定期归档超过保留期的消息"""
+    archive_messages()
+
+
+def count_archived_messages(db, room_id: int) -> int:
+    return db.query(func.coalesce(func.sum(MessageArchiveSegment.message_count), 0)).filter(
+        MessageArchiveSegment.room_id == room_id
+    ).scalar()
+
+
+def get_archived_messages(db, room_id: int, before_id: Optional[int], offset: int, limit: int) -> List[dict]:
+    """从归档分段中按ID倒序读取消息（紧凑格式），分段内的消息ID均小于热表中的消息"""
+    query = db.query(MessageArchiveSegment).filter(
+        MessageArchiveSegment.room_id == room_id
+    ).order_by(desc(MessageArchiveSegment.max_message_id))
+    if before_id is not None:
+        query = query.filter(MessageArchiveSegment.min_message_id < before_id)
+
+    result = []
+    for segment in query:
+        # 偏移量覆盖整个分段时按记录的条数跳过，无需解压
+        if offset and (before_id is None or segment.max_message_id < before_id) and offset >= segment.message_count:
+            offset -= segment.message_count
+            continue
+        messages = load_segment(segment.path)
+        if before_id is not None:
+            messages = [message for message in messages if message["id"] < before_id]
+        candidates = list(reversed(messages))[offset:]
+        offset = 0
+        result.extend(candidates[:limit - len(result)])
+        if len(result) >= limit:
+            break
+    return result
+
+
+def delete_room_archive(db, room_id: int) -> List[str]:
+    """删除房间的归档分段记录，返回需要在事务提交后删除的文件路径"""
+    segments = db.query(MessageArchiveSegment).filter(MessageArchiveSegment.room_id == room_id).all()
+    paths = [segment.path for segment in segments]
+    for segment in segments:
+        db.delete(segment)
+    return paths
+
+
+def remove_segment_files(paths: List[str]) -> None:
+    root = get_archive_root()
+    for path in paths:
+        try:
+            (root / path).unlink(missing_ok=True)
+        except OSError:
+            logger.exception("删除归档分段失败: %s", path)
+    if paths:
+        load_segment.cache_clear()
@@ -0,0 +1,124 @@
+# app/core/attachments.py
+# 消息附件：结构化附件记录、图片尺寸探测、旧JSON内容迁移
+
+import json
+import mimetypes
+import os
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Attachment, Message, StoredFile
+from app.core.files import url_to_key, add_message_reference
+from app.core.storage import get_storage
+
+# 上传子目录与附件类型对应关系
+KIND_BY_SUBDIR = {
+    "images": "image",
+    "video": "video",
+    "audio": "audio",
+    "documents": "document",
+    "files": "file",
+}
+
+ATTACHMENT_KINDS = ("image", "video", "audio", "document", "file")
+
+
+def get_attachment_kind(file_url: str, message_type: str) -> str:
+    """根据存储目录确定附件类型，外部URL按消息类型处理"""
+    key = url_to_key(file_url)
+    if key and "/" in key:
+        kind = KIND_BY_SUBDIR.get(key.split("/", 1)[0])
+        if kind:
+            return kind
+    return "image" if message_type == "image" else "file"
+
+
+def probe_image_size(file_url: str) -> Tuple[Optional[int], Optional[int]]:
+    """读取本地图片头获取宽高，Pillow 未安装或非本地存储时返回 (None, None)"""
+    key = url_to_key(file_url)
+    path = get_storage().local_path(key) if key else None
+    if path is None or not os.path.exists(path):
+        return None, None
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None
+    try:
+        # Image.open 只解析文件头，不解码像素
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def build_attachment(message: Message, file_url: str, file_name: Optional[str], file_size: Optional[int]) -> Attachment:
+    """根据文件信息构建附件记录"""
+    kind = get_attachment_kind(file_url, message.message_type)
+    width, height = probe_image_size(file_url) if kind == "image" else (None, None)
+    return Attachment(
+        message_id=message.id,
+        room_id=message.room_id,
+        user_id=message.user_id,
+        kind=kind,
+        url=file_url,
+        name=file_name or "",
+        size=file_size or 0,
+        mime_type=mimetypes.guess_type(file_name or file_url)[0] or "",
+        width=width,
+        height=height
+    )
+
+
+def add_attachment(db: Session, message: Message, file_url: str, file_name: Optional[str], file_size: Optional[int],
+                   stored_file: Optional[StoredFile]) -> Attachment:
+    """为文件消息登记附件及文件引用（调用方负责提交事务）
+
+    stored_file 为 get_uploaded_file 校验过的发送者上传文件，附件大小以存储记录为准；
+    外部URL（stored_file 为None）使用客户端提供的大小。
+    """
+    size = stored_file.size if stored_file is not None else file_size
+    attachment = build_attachment(message, file_url, file_name, size)
+    message.attachments.append(attachment)
+    if stored_file is not None:
+        add_message_reference(db, message, stored_file)
+    return attachment
+
+
+def parse_legacy_content(content: str) -> Optional[dict]:
+    """解析旧版本写入消息内容的JSON文件信息，格式不符时返回None"""
+    try:
+        info = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(info, dict) or not info.get("url"):
+        return None
+    return info
+
+
+def migrate_legacy_attachments(db: Session, batch_size: int = 500, after_id: int = 0) -> Tuple[int, int]:
+    """迁移一批旧JSON内容的文件消息为附件记录
+
+    按消息ID顺序扫描，返回 (已迁移数量, 本批最后的消息ID)；最后ID为0表示已全部扫描完。
+    已有附件的消息会跳过，可重复执行。
+    """
+    messages = db.query(Message).filter(
+        Message.id > after_id,
+        Message.message_type.in_(["file", "image"]),
+        Message.is_deleted == False
+    ).order_by(Message.id).limit(batch_size).all()
+    if not messages:
+        return 0, 0
+
+    migrated = 0
+    for message in messages:
+        if message.attachments:
+            continue
+        info = parse_legacy_content(message.content)
+        if info is None:
+            continue
+        message.attachments.append(build_attachment(message, info["url"], info.get("name"), info.get("size")))
+        message.content = info.get("description") or ""
+        migrated += 1
+    db.commit()
+    return migrated, messages[-1].id
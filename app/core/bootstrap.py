@@ -0,0 +1,27 @@
+# app/core/bootstrap.py
+# 一次性初始化：创建数据库目录、数据库表和上传目录
+# 在应用启动阶段执行（不在导入时），多进程部署时由启动器执行一次，也可用 python run.py --init 单独执行
+
+from pathlib import Path
+
+from app.config import settings
+
+# 上传目录下按文件类型划分的子目录
+UPLOAD_SUBDIRS = ("avatars", "images", "documents", "audio", "video", "files")
+
+
+def initialize() -> None:
+    """创建数据库表和上传目录（可重复执行）"""
+    from app.database import engine, Base, DATABASE_URL, is_sqlite_file
+    import app.models  # noqa: F401 注册所有模型
+
+    # SQLite 数据库文件所在目录需在首次连接前存在
+    if is_sqlite_file(DATABASE_URL):
+        Path(DATABASE_URL.split(":///", 1)[1]).parent.mkdir(parents=True, exist_ok=True)
+
+    Base.metadata.create_all(bind=engine)
+
+    upload_dir = Path(settings.UPLOAD_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    for subdir in UPLOAD_SUBDIRS:
+        (upload_dir / subdir).mkdir(exist_ok=True)
@@ -3,7 +3,9 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import User
+from app.core.replicas import open_read_session, set_session_owner
 from app.core.security import verify_token
+from app.config import settings
 
 # OAuth2密码承载方案
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
@@ -27,8 +29,44 @@ async def get_current_user(
     if user is None:
         raise credentials_exception
     
+    # 该请求中的写入提交后，此用户的后续读取暂时走主库
+    set_session_owner(db, username)
     return user
 
+def get_read_db(token: str = Depends(oauth2_scheme)):
+    """只读接口的数据库会话：查询可能走只读副本（用户刚写入过时走主库）"""
+    db = open_read_session(verify_token(token))
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_read_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_read_db)
+) -> User:
+    """获取当前用户（只读接口使用，与 get_read_db 共用会话）"""
+    username = verify_token(token)
+    user = db.query(User).filter(User.username == username).first() if username else None
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无法验证凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+async def get_admin_user(
+    current_user: User = Depends(get_current_user)
+) -> User:
+    """获取当前管理员用户（ADMIN_USERNAMES 中配置的用户）"""
+    if current_user.username not in settings.admin_usernames:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要管理员权限"
+        )
+    return current_user
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -42,4 +80,5 @@ def get_user_from_token(token: str, db: Session) -> User:
         return None
     
     user = db.query(User).filter(User.username == username).first()
+    set_session_owner(db, username)
     return user 
\ No newline at end of file
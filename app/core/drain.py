@@ -0,0 +1,106 @@
+# app/core/drain.py
+# 排空模式：滚动部署前停止接受新连接、就绪检查失败，在时间窗口内分批断开现有连接，
+# 并给每个客户端一个随机的重连等待时间，避免所有客户端同时重连到其余节点
+#
+# 触发方式：向进程发送 SIGUSR1，或管理员调用 POST /api/health/drain。排空不可撤销，完成后等待进程被替换。
+
+import asyncio
+import logging
+import math
+import random
+import signal
+import time
+from datetime import datetime
+from typing import Optional
+
+from app.config import settings
+from app.database import get_db_in_flight
+
+logger = logging.getLogger(__name__)
+
+# 分批断开的最小间隔（秒），也是等待数据库写入完成的轮询间隔
+DRAIN_TICK = 0.1
+
+
+class DrainState:
+    """排空进度"""
+
+    def __init__(self):
+        self.draining = False
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.window = 0.0
+        self.total = 0
+        self.disconnected = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def summary(self) -> dict:
+        return {
+            "draining": self.draining,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "window_seconds": self.window,
+            "total": self.total,
+            "disconnected": self.disconnected,
+        }
+
+
+drain_state = DrainState()
+
+
+def start_drain(window: Optional[float] = None) -> bool:
+    """开始排空（需在事件循环中调用），已在排空时返回False"""
+    if drain_state.draining:
+        return False
+    drain_state.draining = True
+    drain_state.started_at = datetime.utcnow()
+    drain_state.window = settings.DRAIN_WINDOW_SECONDS if window is None else window
+    drain_state.task = asyncio.get_running_loop().create_task(_drain(drain_state.window), name="drain")
+    return True
+
+
+async def _drain(window: float) -> None:
+    from app.socket.events import sio
+
+    sids = [sid for sid, _ in sio.manager.get_participants("/", None)]
+    random.shuffle(sids)
+    drain_state.total = len(sids)
+    logger.warning("开始排空：%.0f 秒内断开 %d 个连接", window, len(sids))
+
+    # 每批断开的连接数及批间隔，使断开均匀分布在整个时间窗口内
+    ticks = max(1, int(window / DRAIN_TICK))
+    batch_size = max(1, math.ceil(len(sids) / ticks))
+    pause = window * batch_size / len(sids) if sids else 0.0
+    jitter_ms = int(settings.DRAIN_RECONNECT_JITTER_SECONDS * 1000)
+    try:
+        for start in range(0, len(sids), batch_size):
+            batch_started = time.monotonic()
+            for sid in sids[start:start + batch_size]:
+                try:
+                    # 重连提示：客户端等待随机时间后重连（由负载均衡分配到其他节点）
+                    await sio.emit("server_draining", {"reconnect_after_ms": random.randint(0, jitter_ms)}, to=sid)
+                    await sio.disconnect(sid)
+                except Exception:
+                    logger.exception("排空时断开连接 %s 失败", sid)
+                drain_state.disconnected += 1
+            await asyncio.sleep(max(0.0, pause - (time.monotonic() - batch_started)))
+
+        # 等待断开处理中的离线状态更新及其他未完成的数据库写入
+        deadline = time.monotonic() + settings.DRAIN_FLUSH_TIMEOUT
+        while get_db_in_flight() and time.monotonic() < deadline:
+            await asyncio.sleep(DRAIN_TICK)
+        if get_db_in_flight():
+            logger.warning("排空完成时仍有 %d 个数据库操作未完成", get_db_in_flight())
+    finally:
+        drain_state.finished_at = datetime.utcnow()
+        logger.warning("排空完成：已断开 %d/%d 个连接", drain_state.disconnected, drain_state.total)
+
+
+def install_drain_signal_handler() -> None:
+    """收到 SIGUSR1 时开始排空（Windows 不支持该信号）"""
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, start_drain)
+    except (NotImplementedError, RuntimeError):
+        logger.warning("无法注册 SIGUSR1 排空信号处理器")
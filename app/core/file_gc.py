@@ -0,0 +1,97 @@
+# app/core/file_gc.py
+# 孤立上传文件回收：基于文件引用索引，而不是扫描消息内容
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, and_
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import StoredFile, FileReference
+from app.core.tasks import periodic_task
+from app.core.files import delete_from_storage, TEMP_SUBDIR, STAGING_PREFIX
+from app.core.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# 上传令牌过期后再等待的时间（秒），避免与令牌过期前一刻发起的完成确认竞争
+STAGING_GC_MARGIN = 60 * 60
+
+
+def find_orphans(db, cutoff: datetime, limit: int):
+    """查找孤立文件：没有消息/头像引用，且宽限期内没有被上传过"""
+    content_ref = exists().where(and_(
+        FileReference.stored_file_id == StoredFile.id,
+        FileReference.kind.in_(("message", "avatar"))
+    ))
+    recent_ref = exists().where(and_(
+        FileReference.stored_file_id == StoredFile.id,
+        FileReference.created_at >= cutoff
+    ))
+    return db.query(StoredFile).filter(
+        StoredFile.created_at < cutoff,
+        ~content_ref,
+        ~recent_ref
+    ).order_by(StoredFile.id).limit(limit).all()
+
+
+def delete_stored_file(db, stored_file: StoredFile) -> int:
+    """删除存储中的文件及其派生图，返回释放的字节数（调用方负责提交事务）"""
+    delete_from_storage(stored_file.file_key)
+
+    db.query(FileReference).filter(
+        FileReference.stored_file_id == stored_file.id
+    ).delete(synchronize_session=False)
+    db.delete(stored_file)
+    return stored_file.size
+
+
+@periodic_task("upload_gc", settings.UPLOAD_GC_INTERVAL, singleton=True)
+def collect_orphaned_files() -> int:
+    """分批删除孤立文件及过期的直传暂存对象，返回删除的文件数"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_GC_GRACE_PERIOD)
+    deleted = 0
+    freed = 0
+    db = SessionLocal()
+    try:
+        while True:
+            orphans = find_orphans(db, cutoff, settings.UPLOAD_GC_BATCH_SIZE)
+            if not orphans:
+                break
+            for stored_file in orphans:
+                try:
+                    freed += delete_stored_file(db, stored_file)
+                    deleted += 1
+                except Exception:
+                    logger.exception("删除孤立文件失败: %s", stored_file.file_key)
+                    db.rollback()
+                    return deleted
+            db.commit()
+    finally:
+        db.close()
+
+    if deleted:
+        logger.info("已回收 %d 个孤立文件，释放 %d 字节", deleted, freed)
+    return deleted + collect_stale_staging()
+
+
+def collect_stale_staging() -> int:
+    """删除上传令牌已过期的直传暂存对象（客户端放弃的直传），返回删除的对象数
+
+    暂存对象没有数据库记录，只能按存储键前缀列出后按修改时间判断。
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.PRESIGNED_URL_EXPIRE_SECONDS + STAGING_GC_MARGIN)
+    storage = get_storage()
+    deleted = 0
+    try:
+        for key, modified in storage.list_objects(f"{TEMP_SUBDIR}/{STAGING_PREFIX}"):
+            if modified < cutoff:
+                storage.delete(key)
+                deleted += 1
+    except Exception:
+        logger.exception("清理直传暂存对象失败")
+
+    if deleted:
+        logger.info("已清理 %d 个过期的直传暂存对象", deleted)
+    return deleted
@@ -0,0 +1,359 @@
+# app/core/files.py
+# 内容寻址文件存储：流式写盘、SHA-256去重、引用计数
+
+import hashlib
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiofiles
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.config import settings
+from app.database import run_db
+from app.models import StoredFile, FileReference
+from app.core.storage import get_storage
+from app.core.images import get_all_derivative_keys
+from app.core.metrics import UPLOAD_BYTES
+
+
+# 上传临时目录（相对于上传根目录），直传的暂存对象也放在这里
+TEMP_SUBDIR = ".partial"
+# 直传暂存对象的文件名前缀，客户端放弃的暂存对象由回收任务按前缀清理
+STAGING_PREFIX = "direct-"
+
+
+class FileTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+
+class UploadFormError(Exception):
+    """上传表单格式错误或缺少文件字段"""
+
+
+class FileNotOwnedError(Exception):
+    """用户没有该文件的上传引用，不能释放"""
+
+
+def get_temp_dir() -> Path:
+    """获取上传临时目录（位于上传目录内，本地存储时可原子移动到最终位置）"""
+    temp_dir = Path(settings.UPLOAD_DIR) / TEMP_SUBDIR
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    return temp_dir
+
+
+def build_file_key(subdir: str, digest: str, extension: str) -> str:
+    """根据内容哈希生成存储键（相对于上传根目录）"""
+    filename = f"{digest}.{extension}" if extension else digest
+    return f"{subdir}/{filename}"
+
+
+def build_staging_key(extension: str) -> str:
+    """生成直传暂存对象的存储键（每次申请唯一，确认完成并校验后才移动到内容寻址的存储键）"""
+    filename = f"{STAGING_PREFIX}{uuid.uuid4().hex}"
+    return f"{TEMP_SUBDIR}/{filename}.{extension}" if extension else f"{TEMP_SUBDIR}/{filename}"
+
+
+def url_to_key(url: str) -> Optional[str]:
+    """访问URL转换为存储键，非上传URL返回None"""
+    if not url or not url.startswith("/uploads/"):
+        return None
+    key = url[len("/uploads/"):]
+    if not key or ".." in key.split("/"):
+        return None
+    return key
+
+
+class MultipartFileReader:
+    """从 multipart/form-data 请求体中流式读取一个文件字段
+
+    不使用 Starlette 的表单解析（它会先把整个文件缓冲到临时文件，大小检查只能在之后进行），
+    文件字节边接收边交给 stream_to_temp，只写盘一次，超限时立即中止。
+    读到文件字段的头部后调用 check_filename，可抛出异常在接收文件内容前拒绝请求。
+    """
+
+    def __init__(self, request: Request, field_name: str, check_filename: Optional[Callable[[str], None]] = None):
+        self.request = request
+        self.field_name = field_name.encode()
+        self.check_filename = check_filename
+        self.filename: Optional[str] = None
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+        self._done = False
+        self._pending: List[bytes] = []
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        # 只读取第一个同名文件字段，其余字段忽略
+        if not self._done and options.get(b"name") == self.field_name and b"filename" in options:
+            self._in_file = True
+            self.filename = options[b"filename"].decode("utf-8", errors="replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._pending.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self._done = True
+
+    async def iter_file(self) -> AsyncIterator[bytes]:
+        """逐块产出文件字段的内容"""
+        content_type, options = parse_options_header(self.request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise UploadFormError()
+        parser = MultipartParser(options[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+        checked = False
+        try:
+            async for chunk in self.request.stream():
+                parser.write(chunk)
+                if self.filename is not None and not checked:
+                    checked = True
+                    if self.check_filename:
+                        self.check_filename(self.filename)
+                for data in self._pending:
+                    yield data
+                self._pending.clear()
+            parser.finalize()
+        except FormParserError:
+            raise UploadFormError()
+        if not self._done:
+            raise UploadFormError()
+
+
+async def stream_to_temp(chunks: AsyncIterator[bytes], max_size: int) -> Tuple[Path, str, int]:
+    """将数据块写入临时文件，同时计算哈希
+
+    内存占用固定为一个分块大小，超过限制立即中止并删除临时文件。
+    返回 (临时文件路径, SHA-256, 文件大小)。
+    """
+    temp_path = get_temp_dir() / f"{uuid.uuid4().hex}.part"
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError()
+                hasher.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return temp_path, hasher.hexdigest(), size
+
+
+def commit_temp_file(db: Session, temp_path: Path, digest: str, size: int, subdir: str, extension: str, user_id: int) -> StoredFile:
+    """将临时文件登记到内容寻址存储
+
+    相同内容已存在时丢弃临时文件并增加引用计数，否则保存到存储后端。
+    """
+    key = build_file_key(subdir, digest, extension)
+    storage = get_storage()
+
+    record = db.query(StoredFile).filter(StoredFile.file_key == key).first()
+    if record and storage.exists(key):
+        temp_path.unlink(missing_ok=True)
+    else:
+        storage.save_file(key, temp_path)
+
+    return register_file(db, key, digest, size, user_id, record)
+
+
+def register_file(db: Session, key: str, digest: str, size: int, user_id: int, record: Optional[StoredFile] = None) -> StoredFile:
+    """登记已存在于存储后端的文件：已有记录时增加引用计数，否则新建记录
+
+    同时记录一条上传引用，用于按用户统计占用和孤立文件回收的宽限期判断。
+    """
+    if record is None:
+        record = db.query(StoredFile).filter(StoredFile.file_key == key).first()
+
+    if record is None:
+        record = StoredFile(file_key=key, sha256=digest, size=size, ref_count=1)
+        try:
+            # 在保存点中插入，冲突时只回滚本次插入，不影响调用方事务中的其他修改
+            with db.begin_nested():
+                db.add(record)
+        except IntegrityError:
+            # 并发上传了相同内容，另一请求已先登记该文件
+            record = db.query(StoredFile).filter(StoredFile.file_key == key).one()
+            record.ref_count = StoredFile.ref_count + 1
+    else:
+        # 在数据库中自增，并发登记同一文件时不会丢失计数
+        record.ref_count = StoredFile.ref_count + 1
+
+    db.add(FileReference(stored_file_id=record.id, kind="upload", user_id=user_id))
+    db.commit()
+    return record
+
+
+async def receive_upload(reader: MultipartFileReader, max_size: int) -> Tuple[Path, str, int]:
+    """流式接收表单中的上传文件到临时文件，返回 (临时文件路径, SHA-256, 文件大小)"""
+    temp_path, digest, size = await stream_to_temp(reader.iter_file(), max_size)
+    UPLOAD_BYTES.inc(size, ("form",))
+    return temp_path, digest, size
+
+
+async def commit_upload(db: Session, temp_path: Path, digest: str, size: int, subdir: str, extension: str, user_id: int) -> StoredFile:
+    """在数据库线程中登记临时文件，失败时删除临时文件"""
+    def commit() -> StoredFile:
+        stored = commit_temp_file(db, temp_path, digest, size, subdir, extension, user_id)
+        # 在数据库线程中加载属性，调用方在事件循环中访问时无需再查询
+        db.refresh(stored)
+        return stored
+
+    try:
+        return await run_db(commit)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+
+def release_file(db: Session, url: str, user_id: int) -> Optional[bool]:
+    """释放用户的一次上传引用，引用计数归零且没有消息/头像引用时删除文件
+
+    返回None表示该URL不在内容寻址存储中，True表示物理文件已删除。
+    仍被消息或头像引用的文件保留，由孤立文件回收任务在引用消失后处理。
+    用户没有上传过该文件时抛出 FileNotOwnedError，不修改引用计数。
+    """
+    key = url_to_key(url)
+    if key is None:
+        return None
+
+    record = db.query(StoredFile).filter(StoredFile.file_key == key).first()
+    if not record:
+        return None
+
+    upload_ref = db.query(FileReference).filter(
+        FileReference.stored_file_id == record.id,
+        FileReference.kind == "upload",
+        FileReference.user_id == user_id
+    ).first()
+    if upload_ref is None:
+        raise FileNotOwnedError()
+    db.delete(upload_ref)
+
+    record.ref_count = StoredFile.ref_count - 1
+    db.flush()
+    removed = False
+    if record.ref_count <= 0 and not has_content_references(db, record.id):
+        delete_from_storage(key)
+        db.delete(record)
+        removed = True
+
+    db.commit()
+    return removed
+
+
+def delete_from_storage(key: str) -> None:
+    """从存储后端删除文件及其派生图"""
+    storage = get_storage()
+    storage.delete(key)
+    for derivative_key in get_all_derivative_keys(key):
+        storage.delete(derivative_key)
+
+
+def has_content_references(db: Session, stored_file_id: int) -> bool:
+    """文件是否仍被消息或头像引用"""
+    return db.query(FileReference.id).filter(
+        FileReference.stored_file_id == stored_file_id,
+        FileReference.kind.in_(("message", "avatar"))
+    ).first() is not None
+
+
+def get_uploaded_file(db: Session, url: str, user_id: int) -> Optional[StoredFile]:
+    """用户上传过的内容寻址文件
+
+    URL不在上传目录时返回None；文件不存在或用户没有该文件的上传引用时抛出 FileNotOwnedError，
+    避免凭URL引用他人的文件。
+    """
+    key = url_to_key(url)
+    if key is None:
+        return None
+    record = db.query(StoredFile).join(FileReference, FileReference.stored_file_id == StoredFile.id).filter(
+        StoredFile.file_key == key,
+        FileReference.kind == "upload",
+        FileReference.user_id == user_id
+    ).first()
+    if record is None:
+        raise FileNotOwnedError()
+    return record
+
+
+def add_message_reference(db: Session, message, stored_file: StoredFile) -> None:
+    """为文件消息登记附件引用（调用方负责提交事务）"""
+    db.add(FileReference(
+        stored_file_id=stored_file.id,
+        kind="message",
+        user_id=message.user_id,
+        room_id=message.room_id,
+        message_id=message.id
+    ))
+
+
+def set_avatar_reference(db: Session, user_id: int, stored_file: StoredFile) -> None:
+    """替换用户的头像引用，旧头像失去引用后由回收任务清理（调用方负责提交事务）"""
+    db.query(FileReference).filter(
+        FileReference.user_id == user_id,
+        FileReference.kind == "avatar"
+    ).delete(synchronize_session=False)
+    db.add(FileReference(stored_file_id=stored_file.id, kind="avatar", user_id=user_id))
+
+
+def get_user_usage(db: Session, user_id: int) -> int:
+    """用户占用的存储空间（字节），同一文件只计一次"""
+    referenced = db.query(FileReference.stored_file_id).filter(FileReference.user_id == user_id)
+    total = db.query(func.coalesce(func.sum(StoredFile.size), 0)).filter(StoredFile.id.in_(referenced)).scalar()
+    return int(total or 0)
+
+
+def get_room_usage(db: Session, room_id: int) -> int:
+    """房间内消息附件占用的存储空间（字节），同一文件只计一次"""
+    referenced = db.query(FileReference.stored_file_id).filter(FileReference.room_id == room_id)
+    total = db.query(func.coalesce(func.sum(StoredFile.size), 0)).filter(StoredFile.id.in_(referenced)).scalar()
+    return int(total or 0)
+
+
+def exceeds_quota(db: Session, user_id: int, incoming_size: int = 0) -> bool:
+    """用户上传配额检查，USER_UPLOAD_QUOTA 为0表示不限制"""
+    if settings.USER_UPLOAD_QUOTA <= 0:
+        return False
+    return get_user_usage(db, user_id) + incoming_size > settings.USER_UPLOAD_QUOTA
@@ -0,0 +1,68 @@
+# app/core/health.py
+# 健康检查：存活检查只确认进程可响应；就绪检查综合排空状态、数据库连通性、连接池占用、事件循环延迟、消息代理和连接数容量
+
+import asyncio
+from typing import Dict, List
+
+from app.config import settings
+from app.core.drain import drain_state
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import Counter
+from app.core.nonces import get_nonce_store
+from app.database import engine, get_pool_status, run_db
+
+SHED_CONNECTIONS = Counter("chatroom_socket_connections_shed", "过载时拒绝的 Socket.IO 连接数", ("reason",))
+
+
+def check_saturation(socket_connections: int) -> Dict[str, dict]:
+    """开销很低的负载检查（每个新连接都会调用）：排空状态、连接数容量、连接池占用率和事件循环延迟"""
+    checks = {"drain": {"ok": not drain_state.draining}}
+    capacity = settings.MAX_SOCKET_CONNECTIONS
+    checks["sockets"] = {
+        "ok": not capacity or socket_connections < capacity,
+        "connections": socket_connections,
+        "capacity": capacity or None,
+    }
+    for name, status in get_pool_status().items():
+        pool_capacity = status["size"] + max(0, status["max_overflow"])
+        checks[f"db_pool_{name}"] = {
+            # SQLite 单一写连接按设计串行化所有写入，占满属正常情况
+            "ok": pool_capacity <= 1 or status["saturation"] < settings.READY_MAX_POOL_SATURATION,
+            "in_use": status["in_use"],
+            "capacity": pool_capacity,
+        }
+    lag_ms = loop_monitor.recent_lag() * 1000
+    checks["event_loop"] = {"ok": lag_ms < settings.READY_MAX_LOOP_LAG_MS, "lag_ms": round(lag_ms, 1)}
+    return checks
+
+
+def get_overload_reasons(socket_connections: int) -> List[str]:
+    """未通过的负载检查名称，为空表示可以接受新连接"""
+    return [name for name, check in check_saturation(socket_connections).items() if not check["ok"]]
+
+
+def ping_database() -> None:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+
+
+async def run_check(func, use_db_executor: bool) -> dict:
+    """在线程中执行同步连通性检查，超时或出错视为未通过"""
+    try:
+        call = run_db(func) if use_db_executor else asyncio.to_thread(func)
+        await asyncio.wait_for(call, settings.HEALTH_CHECK_TIMEOUT)
+        return {"ok": True}
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": "timeout"}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+async def check_readiness(socket_connections: int) -> Dict[str, dict]:
+    """完整的就绪检查"""
+    checks = check_saturation(socket_connections)
+    # 数据库检查经由数据库线程池执行，线程池排满时同样会超时
+    checks["database"] = await run_check(ping_database, use_db_executor=True)
+    if settings.BROKER_URL:
+        checks["broker"] = await run_check(get_nonce_store().ping, use_db_executor=False)
+    return checks
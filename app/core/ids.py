@@ -0,0 +1,198 @@
+# app/core/ids.py
+# 应用生成的时间有序ID（Snowflake风格），无需等待数据库自增即可得到消息ID
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 位布局：41位毫秒时间戳 + 5位工作节点 + 7位序列号 = 53位，
+# 不超过 JavaScript Number 的安全整数范围（2^53），前端可直接作为数字处理
+TIMESTAMP_BITS = 41
+WORKER_BITS = 5
+SEQUENCE_BITS = 7
+
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+WORKER_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = SEQUENCE_BITS + WORKER_BITS
+
+# 自定义纪元：2024-01-01 00:00:00 UTC，41位毫秒可用约69年
+EPOCH_MS = 1704067200000
+
+# 旧版本数据库自增生成的消息ID均小于该值；Snowflake ID 在纪元后约17分钟即超过该值，
+# 因此小于该值的ID不含时间信息，不能按ID推算生成时间
+LEGACY_ID_LIMIT = 1 << 32
+
+# 工作节点ID租约的 Redis 键
+WORKER_LEASE_KEY = "chatroom:worker-id:{}"
+
+# 租约仍属于本进程时续期/释放（比较与修改须原子执行，避免误改其他进程刚占用的租约）
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SnowflakeGenerator:
+    """线程安全的ID生成器，同一毫秒内序列号用尽时等待下一毫秒"""
+
+    def __init__(self, worker_id: int):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id 必须在 0-{MAX_WORKER_ID} 之间")
+        self.worker_id = worker_id
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _current_ms(self) -> int:
+        return int(time.time() * 1000) - EPOCH_MS
+
+    def next_id(self) -> int:
+        with self._lock:
+            now = self._current_ms()
+            # 时钟回拨时沿用上次的时间戳，保证ID单调递增
+            if now < self._last_ms:
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = self._current_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << TIMESTAMP_SHIFT) | (self.worker_id << WORKER_SHIFT) | self._sequence
+
+
+class WorkerIdLease:
+    """通过消息代理（Redis）占用工作节点ID
+
+    SET NX 保证同一ID同时只被一个进程持有，后台线程定期续期；
+    进程退出时释放，异常退出时租约在TTL后过期，ID可被新进程复用。
+    """
+
+    def __init__(self, url: str, ttl: int):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("自动分配工作节点ID需要安装 redis：uv sync --extra redis")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.token = uuid.uuid4().hex
+        self.worker_id: Optional[int] = None
+        self.lost = False
+        self._stop = threading.Event()
+
+    def acquire(self) -> int:
+        """占用一个空闲的工作节点ID"""
+        for worker_id in range(MAX_WORKER_ID + 1):
+            if self.client.set(WORKER_LEASE_KEY.format(worker_id), self.token, nx=True, ex=self.ttl):
+                self.worker_id = worker_id
+                threading.Thread(target=self._renew_loop, name="worker-id-lease", daemon=True).start()
+                logger.info("已占用工作节点ID %d", worker_id)
+                return worker_id
+        raise RuntimeError(f"没有空闲的工作节点ID（0-{MAX_WORKER_ID} 均已被占用）")
+
+    def _renew_loop(self) -> None:
+        key = WORKER_LEASE_KEY.format(self.worker_id)
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not self.client.eval(RENEW_LEASE_SCRIPT, 1, key, self.token, self.ttl):
+                    # 租约已过期（如长时间无法连接Redis），该ID可能已被其他进程占用，下次生成ID前重新申请
+                    logger.error("工作节点ID %d 的租约已失效，将重新申请", self.worker_id)
+                    self.lost = True
+                    return
+            except Exception as e:
+                logger.warning("工作节点ID租约续期失败: %s", e)
+
+    def release(self) -> None:
+        """停止续期并释放租约"""
+        self._stop.set()
+        if self.worker_id is None or self.lost:
+            return
+        try:
+            self.client.eval(RELEASE_LEASE_SCRIPT, 1, WORKER_LEASE_KEY.format(self.worker_id), self.token)
+        except Exception as e:
+            logger.warning("释放工作节点ID租约失败: %s", e)
+
+
+_lease: Optional[WorkerIdLease] = None
+
+
+def get_worker_id() -> int:
+    """工作节点ID：优先使用配置；配置了 BROKER_URL 时从 Redis 租用；使用本地 SQLite 单进程运行时按进程号分配
+
+    进程号只在单个进程内可用：多个进程或容器的进程号低位可能相同（容器内通常都是 1），
+    共用服务端数据库时会生成重复的消息主键，因此只允许本地 SQLite 使用进程号。
+    """
+    global _lease
+    if settings.WORKER_ID >= 0:
+        return settings.WORKER_ID
+    if settings.BROKER_URL:
+        _lease = WorkerIdLease(settings.BROKER_URL, settings.WORKER_ID_LEASE_TTL)
+        return _lease.acquire()
+    if settings.WORKERS > 1:
+        raise RuntimeError("多进程部署需要为每个进程设置不同的 WORKER_ID，或配置 BROKER_URL 自动分配")
+    if not settings.DATABASE_URL.startswith("sqlite"):
+        raise RuntimeError("使用服务端数据库时需要设置 WORKER_ID，或配置 BROKER_URL 自动分配（多个实例的进程号可能相同）")
+    return os.getpid() & MAX_WORKER_ID
+
+
+_generator = None
+
+
+def get_generator() -> SnowflakeGenerator:
+    """获取本进程的ID生成器（按进程懒加载，fork 出的子进程会重新分配工作节点ID）"""
+    global _generator
+    if _generator is None or _generator.pid != os.getpid() or (_lease is not None and _lease.lost):
+        _generator = SnowflakeGenerator(get_worker_id())
+    return _generator
+
+
+def release_worker_id() -> None:
+    """释放工作节点ID租约（应用关闭时调用）"""
+    global _generator, _lease
+    if _lease is not None:
+        _lease.release()
+        _lease = None
+    _generator = None
+
+
+def generate_id() -> int:
+    """生成新的时间有序ID"""
+    return get_generator().next_id()
+
+
+def id_to_datetime(snowflake_id: int) -> datetime:
+    """从ID中解析生成时间（UTC，不含时区信息，与模型中的时间字段一致）"""
+    ms = (snowflake_id >> TIMESTAMP_SHIFT) + EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def datetime_to_id(dt: datetime) -> int:
+    """该时间（UTC）对应的最小ID，id < datetime_to_id(t) 即生成于 t 之前"""
+    ms = int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000) - EPOCH_MS
+    return max(0, ms) << TIMESTAMP_SHIFT
+
+
+def is_legacy_id(message_id: int) -> bool:
+    """是否为旧版本自增生成的ID（不含时间信息）"""
+    return message_id < LEGACY_ID_LIMIT
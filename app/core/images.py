@@ -0,0 +1,164 @@
+# app/core/images.py
+# 图片派生图（缩略图、多尺寸头像）生成：在进程池中执行，不占用请求路径
+
+import asyncio
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 派生图文件名：<原文件名去扩展名>_<尺寸>.<格式>
+DERIVATIVE_PATTERN = re.compile(r'^(?P<stem>[0-9a-f]{64})_(?P<size>\d+)\.(?:webp|jpg)$')
+DERIVATIVE_EXTENSIONS = ("webp", "jpg")
+
+# 图片处理进程池（懒加载）
+_executor: Optional[ProcessPoolExecutor] = None
+
+# 正在生成中的源文件，避免重复提交
+_pending: set = set()
+
+
+def get_derivative_sizes(subdir: str) -> List[int]:
+    """获取子目录对应的派生尺寸"""
+    if subdir == "avatars":
+        return settings.AVATAR_DERIVATIVE_SIZES
+    if subdir == "images":
+        return settings.IMAGE_DERIVATIVE_SIZES
+    return []
+
+
+def get_derivative_key(file_key: str, size: int, extension: Optional[str] = None) -> str:
+    """根据原图存储键生成派生图存储键"""
+    path = Path(file_key)
+    if extension is None:
+        extension = "jpg" if settings.IMAGE_DERIVATIVE_FORMAT == "jpeg" else "webp"
+    return str(path.parent / f"{path.stem}_{size}.{extension}")
+
+
+def get_all_derivative_keys(file_key: str) -> List[str]:
+    """原图可能存在的全部派生图存储键（包括切换 IMAGE_DERIVATIVE_FORMAT 前生成的），删除原图时一并删除"""
+    subdir = file_key.split("/", 1)[0]
+    return [
+        get_derivative_key(file_key, size, extension)
+        for size in get_derivative_sizes(subdir)
+        for extension in DERIVATIVE_EXTENSIONS
+    ]
+
+
+def get_derivative_urls(file_key: str) -> Dict[str, str]:
+    """获取原图所有派生图的URL（生成完成前访问会回退到原图）"""
+    subdir = file_key.split("/", 1)[0]
+    return {
+        str(size): f"/uploads/{get_derivative_key(file_key, size)}"
+        for size in get_derivative_sizes(subdir)
+    }
+
+
+def find_original(directory: Path, derivative_name: str) -> Optional[Path]:
+    """根据派生图文件名查找原图，用于派生图尚未生成时的回退"""
+    match = DERIVATIVE_PATTERN.match(derivative_name)
+    if not match:
+        return None
+    for candidate in directory.glob(f"{match.group('stem')}.*"):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def generate_derivatives(source_path: str, targets: Dict[int, str], image_format: str, quality: int) -> List[str]:
+    """生成派生图（在工作进程中执行）
+
+    targets 为 {尺寸: 目标路径}，已存在的目标会被跳过。
+    先写临时文件再原子替换，避免读到写了一半的图片。
+    """
+    from PIL import Image, ImageOps
+
+    created = []
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+
+        for size, target in sorted(targets.items(), reverse=True):
+            target_path = Path(target)
+            if target_path.exists():
+                continue
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            temp_path = target_path.with_name(f".{target_path.name}.tmp")
+            resized.save(temp_path, format=image_format.upper(), quality=quality)
+            temp_path.replace(target_path)
+            created.append(target)
+    return created
+
+
+def is_available() -> bool:
+    """Pillow 是否可用（可选依赖）"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """懒加载图片处理进程池"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_executor():
+    """关闭图片处理进程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def schedule_derivatives(file_key: str) -> Dict[str, str]:
+    """提交派生图生成任务并立即返回派生图URL
+
+    生成在进程池中异步完成；Pillow 未安装、非本地存储或该目录无需派生图时返回空字典。
+    """
+    from app.core.storage import get_storage
+
+    subdir = file_key.split("/", 1)[0]
+    sizes = get_derivative_sizes(subdir)
+    storage = get_storage()
+    source_path = storage.local_path(file_key)
+    # 派生图需要读取原图，目前仅支持本地存储
+    if not sizes or source_path is None or not is_available():
+        return {}
+
+    targets = {size: str(storage.local_path(get_derivative_key(file_key, size))) for size in sizes}
+    if file_key not in _pending and not all(Path(t).exists() for t in targets.values()):
+        _pending.add(file_key)
+        future = asyncio.get_running_loop().run_in_executor(
+            get_executor(), generate_derivatives,
+            str(source_path), targets,
+            settings.IMAGE_DERIVATIVE_FORMAT, settings.IMAGE_DERIVATIVE_QUALITY
+        )
+
+        def on_done(fut):
+            _pending.discard(file_key)
+            if fut.cancelled():
+                return
+            if fut.exception():
+                logger.warning("派生图生成失败 %s: %s", file_key, fut.exception())
+
+        future.add_done_callback(on_done)
+
+    return get_derivative_urls(file_key)
@@ -0,0 +1,194 @@
+# app/core/logs.py
+# 日志管道：业务代码只把记录放入有界队列，格式化和写文件在后台线程完成；JSON 结构化输出、按类别采样、按大小轮转
+#
+# 类别通过 extra={"category": ...} 指定（如 send_message、access），采样比例见 LOG_SAMPLE_RATES，
+# 只对 INFO 及以下级别采样，警告和错误总是记录。
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+from starlette.requests import Request
+
+from app.config import settings
+from app.core.metrics import Counter
+from app.utils import get_client_ip
+
+access_logger = logging.getLogger("chatroom.access")
+
+LOG_RECORDS_DROPPED = Counter("chatroom_log_records_dropped", "日志队列已满时丢弃的记录数")
+
+# LogRecord 的标准属性，其余属性视为 extra 字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON，extra 字段原样保留"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = record.stack_info
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """文本格式，extra 字段以 key=value 追加在消息后"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        extras = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        return f"{text} {extras}" if extras else text
+
+
+class SamplingFilter(logging.Filter):
+    """按 category 采样 INFO 及以下级别的记录"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rates.get(getattr(record, "category", None))
+        return rate is None or random.random() < rate
+
+
+class AsyncQueueHandler(QueueHandler):
+    """非阻塞入队：队列已满时丢弃记录并计数"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用线程合并参数并渲染异常（参数对象可能在之后被修改），保留 extra 字段交给后台线程格式化
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def get_log_file() -> Optional[Path]:
+    """日志文件路径；多进程运行时每个工作进程写各自的文件，避免多个进程同时轮转同一文件"""
+    if not settings.LOG_FILE:
+        return None
+    path = Path(settings.LOG_FILE)
+    if settings.WORKER_INDEX >= 0:
+        path = path.with_name(f"{path.stem}.worker{settings.WORKER_INDEX}{path.suffix}")
+    return path
+
+
+def setup_logging() -> None:
+    """配置根日志器（重复调用无效果）"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter()
+    handlers = []
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(formatter)
+    handlers.append(console)
+    log_file = get_log_file()
+    if log_file:
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _queue_handler = AsyncQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(settings.log_sample_rates))
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """写出队列中剩余的记录并停止后台线程（之后的记录不再入队，避免堆积在无人消费的队列中）"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+class AccessLogMiddleware:
+    """HTTP 访问日志（类别 access）：方法、路径、状态码、耗时和客户端地址"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if access_logger.isEnabledFor(logging.INFO):
+                duration_ms = (time.perf_counter() - start) * 1000
+                access_logger.info(
+                    "%s %s %d %.1fms", scope["method"], scope["path"], status_code[0], duration_ms,
+                    extra={
+                        "category": "access",
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code[0],
+                        "duration_ms": round(duration_ms, 1),
+                        "client_ip": get_client_ip(Request(scope)),
+                    }
+                )
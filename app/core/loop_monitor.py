@@ -0,0 +1,159 @@
+# app/core/loop_monitor.py
+# 事件循环延迟监控：定时采样调度延迟；看门狗线程在事件循环卡顿超过阈值时抓取占用循环的调用栈
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional
+
+from app.config import settings
+from app.core.metrics import Counter, GaugeFunc, Histogram
+
+logger = logging.getLogger(__name__)
+
+# 保留的延迟样本数（用于计算分位数）和卡顿记录数
+LAG_WINDOW = 1200
+RECENT_STALLS = 20
+
+# 卡顿调用栈保留的帧数（最内层）
+STACK_LIMIT = 30
+
+LOOP_LAG = Histogram(
+    "chatroom_event_loop_lag_seconds", "事件循环调度延迟",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_STALLS = Counter("chatroom_event_loop_stalls", "事件循环卡顿次数（超过阈值）")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+class LoopMonitor:
+    """事件循环延迟监控"""
+
+    def __init__(self, interval: float, stall_threshold: float):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.samples: Deque[float] = deque(maxlen=LAG_WINDOW)
+        self.stalls: Deque[dict] = deque(maxlen=RECENT_STALLS)
+        self._lock = threading.Lock()
+        self._heartbeat = time.monotonic()
+        self._pending_stall: Optional[dict] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample(), name="loop_monitor")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("事件循环监控已启动，卡顿阈值 %.0fms", self.stall_threshold * 1000)
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _sample(self) -> None:
+        """按固定间隔睡眠，实际唤醒时间与预期的差值即调度延迟"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._heartbeat = time.monotonic()
+            self.samples.append(lag)
+            LOOP_LAG.observe(lag)
+            if lag >= self.stall_threshold:
+                LOOP_STALLS.inc()
+                with self._lock:
+                    # 看门狗已抓取调用栈时补充实际卡顿时长
+                    if self._pending_stall is not None:
+                        self._pending_stall["duration_ms"] = round(lag * 1000, 1)
+                        self._pending_stall = None
+
+    def _watch(self) -> None:
+        """看门狗线程：心跳超时说明事件循环被占用，抓取事件循环线程的当前调用栈"""
+        check_interval = max(0.01, self.stall_threshold / 4)
+        while not self._stop.wait(check_interval):
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            if stalled < self.stall_threshold:
+                continue
+            with self._lock:
+                if self._pending_stall is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.format_stack(frame, limit=STACK_LIMIT) if frame is not None else []
+                stall = {
+                    "detected_at": datetime.utcnow().isoformat(),
+                    "duration_ms": None,
+                    "stack": [line.rstrip() for line in stack],
+                }
+                self._pending_stall = stall
+                self.stalls.append(stall)
+            logger.warning(
+                "事件循环已阻塞 %.0fms，占用循环的调用栈:\n%s", stalled * 1000, "".join(stack)
+            )
+
+    def recent_lag(self, seconds: float = 1.0) -> float:
+        """最近一段时间内的最大调度延迟（秒）；事件循环正被阻塞时按心跳超时计算"""
+        if self._task is None:
+            return 0.0
+        count = max(1, int(seconds / self.interval))
+        recent = list(self.samples)[-count:]
+        stalled = time.monotonic() - self._heartbeat - self.interval
+        return max(recent + [stalled, 0.0])
+
+    def summary(self) -> dict:
+        values = sorted(self.samples)
+        return {
+            "enabled": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "samples": len(values),
+            "lag_ms": {
+                "p50": round(percentile(values, 50) * 1000, 3),
+                "p90": round(percentile(values, 90) * 1000, 3),
+                "p99": round(percentile(values, 99) * 1000, 3),
+                "max": round((values[-1] if values else 0.0) * 1000, 3),
+            },
+            "stalls": list(reversed(self.stalls)),
+        }
+
+    def quantiles(self):
+        values = sorted(self.samples)
+        return [
+            (("0.5",), percentile(values, 50)),
+            (("0.99",), percentile(values, 99)),
+            (("1",), values[-1] if values else 0.0),
+        ]
+
+
+loop_monitor = LoopMonitor(settings.LOOP_LAG_SAMPLE_INTERVAL, settings.LOOP_STALL_THRESHOLD_MS / 1000)
+
+GaugeFunc(
+    "chatroom_event_loop_lag_quantile_seconds", "最近采样窗口内的事件循环延迟分位数",
+    loop_monitor.quantiles, ("quantile",)
+)
@@ -0,0 +1,255 @@
+# app/core/metrics.py
+# Prometheus 指标：进程内注册表，/metrics 以文本格式导出
+#
+# 热路径只做元组查找和数值累加，标签值在导出时才格式化，可以在生产环境常开。
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+# 延迟类指标的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["Metric"] = []
+
+
+def format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """指标基类，创建即注册"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence, float]]:
+        """(指标名后缀, 标签名, 标签值, 数值)"""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: tuple = ()) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield "_total", self.labelnames, labels, value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各分桶计数（非累计，末位为 +Inf）, 总和, 次数]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield "_bucket", names, labels + (format_value(bound),), cumulative
+            yield "_sum", self.labelnames, labels, total
+            yield "_count", self.labelnames, labels, count
+
+
+class GaugeFunc(Metric):
+    """导出时调用函数取值的仪表，函数返回 [(标签值元组, 数值), ...]"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, func: Callable[[], Iterable[Tuple[tuple, float]]], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.func = func
+
+    def samples(self):
+        for labels, value in self.func():
+            yield "", self.labelnames, labels, value
+
+
+class CounterFunc(GaugeFunc):
+    """导出时取值的累计计数（如连接池统计中的累计值）"""
+
+    type = "counter"
+
+    def samples(self):
+        for labels, value in self.func():
+            yield "_total", self.labelnames, labels, value
+
+
+def render_metrics() -> str:
+    """按 Prometheus 文本格式导出所有指标"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+HTTP_REQUEST_DURATION = Histogram(
+    "chatroom_http_request_duration_seconds", "HTTP 请求耗时（按处理函数）", ("method", "endpoint", "status")
+)
+
+# Socket.IO
+SOCKET_EVENT_DURATION = Histogram(
+    "chatroom_socket_event_duration_seconds", "Socket.IO 事件处理耗时", ("event",)
+)
+ROOM_FANOUT = Histogram(
+    "chatroom_room_fanout_size", "新消息广播的接收连接数",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+MESSAGES = Counter("chatroom_messages", "发送成功的消息数", ("transport",))
+UPLOAD_BYTES = Counter("chatroom_upload_bytes", "接收的上传字节数", ("method",))
+
+# 数据库
+DB_QUERY_DURATION = Histogram("chatroom_db_query_duration_seconds", "单条 SQL 执行耗时")
+DB_QUERIES_PER_REQUEST = Histogram(
+    "chatroom_db_queries_per_request", "每个 HTTP 请求/Socket.IO 事件执行的 SQL 数", ("kind",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "chatroom_db_time_per_request_seconds", "每个 HTTP 请求/Socket.IO 事件的 SQL 总耗时", ("kind",)
+)
+
+
+class DbStats:
+    """当前请求/事件的数据库统计"""
+
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# 当前请求的数据库统计（数据库线程池中的任务通过复制上下文共享同一对象）
+current_db_stats: ContextVar[Optional[DbStats]] = ContextVar("current_db_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERY_DURATION.observe(elapsed)
+    stats = current_db_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += elapsed
+
+
+def register_query_metrics(engine) -> None:
+    """为应用的数据库引擎注册 SQL 耗时统计（不影响其他库或测试创建的引擎）"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def observe_db_stats(kind: str, stats: DbStats) -> None:
+    DB_QUERIES_PER_REQUEST.observe(stats.queries, (kind,))
+    DB_TIME_PER_REQUEST.observe(stats.seconds, (kind,))
+
+
+# 处理函数 -> 标签值（每个处理函数只格式化一次）
+_endpoint_labels: Dict[object, str] = {}
+
+
+def get_endpoint_label(scope) -> str:
+    """路由匹配到的处理函数名，路径参数不会产生新的标签值"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "<unmatched>"
+    label = _endpoint_labels.get(endpoint)
+    if label is None:
+        name = getattr(endpoint, "__qualname__", None) or type(endpoint).__name__
+        label = _endpoint_labels[endpoint] = f"{getattr(endpoint, '__module__', '')}.{name}".lstrip(".")
+    return label
+
+
+class MetricsMiddleware:
+    """记录 HTTP 请求耗时（按处理函数聚合）和数据库统计"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = [500]
+        stats = DbStats()
+        token = current_db_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_db_stats.reset(token)
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                (scope["method"], get_endpoint_label(scope), status_code[0])
+            )
+            observe_db_stats("http", stats)
@@ -0,0 +1,138 @@
+# app/core/nonces.py
+# 消息发送去重：按 (用户, 客户端nonce) 记录已创建的消息ID，重试时返回原消息
+
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 重试到达时原消息仍在写入：REST 与 Socket.IO 均提示客户端等待后重试
+PENDING_RETRY_AFTER = 1
+PENDING_DETAIL = "消息正在发送中，请稍后重试"
+
+
+class NonceStore(ABC):
+    """去重索引接口"""
+
+    name = "base"
+
+    @abstractmethod
+    def reserve(self, user_id: int, nonce: str, message_id: int) -> Optional[int]:
+        """登记 nonce 对应的消息ID；已存在时不覆盖并返回原消息ID，登记成功返回None"""
+
+    @abstractmethod
+    def release(self, user_id: int, nonce: str) -> None:
+        """消息写入失败时撤销登记，允许客户端重试"""
+
+    def ping(self) -> None:
+        """检查后端连通性，不可用时抛出异常"""
+
+
+class MemoryNonceStore(NonceStore):
+    """进程内去重索引：按插入顺序淘汰，超过TTL或容量上限的记录被丢弃"""
+
+    name = "memory"
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Tuple[int, str], Tuple[int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        # 记录按插入顺序排列，过期时间单调递增，从头部淘汰即可
+        while self._entries:
+            _, (_, expires_at) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def reserve(self, user_id: int, nonce: str, message_id: int) -> Optional[int]:
+        key = (user_id, nonce)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            existing = self._entries.get(key)
+            if existing is not None:
+                return existing[0]
+            self._entries[key] = (message_id, now + self.ttl)
+            self._evict(now)
+            return None
+
+    def release(self, user_id: int, nonce: str) -> None:
+        with self._lock:
+            self._entries.pop((user_id, nonce), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisNonceStore(NonceStore):
+    """通过消息代理（Redis）共享的去重索引，多进程/多实例部署时使用
+
+    使用同步客户端，只能在线程中调用（同步路由、run_db），不能直接在事件循环中调用。
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl: int):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("使用Redis去重需要安装 redis：uv sync --extra redis")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, user_id: int, nonce: str) -> str:
+        return f"chatroom:nonce:{user_id}:{nonce}"
+
+    def reserve(self, user_id: int, nonce: str, message_id: int) -> Optional[int]:
+        key = self._key(user_id, nonce)
+        # SET NX 保证并发重试中只有一个请求登记成功
+        if self.client.set(key, message_id, nx=True, ex=self.ttl):
+            return None
+        existing = self.client.get(key)
+        return int(existing) if existing is not None else None
+
+    def release(self, user_id: int, nonce: str) -> None:
+        self.client.delete(self._key(user_id, nonce))
+
+    def ping(self) -> None:
+        self.client.ping()
+
+
+_store: Optional[NonceStore] = None
+
+
+def get_nonce_store() -> NonceStore:
+    """获取去重索引（单例）：配置了 BROKER_URL 时使用Redis，否则使用进程内索引"""
+    global _store
+    if _store is None:
+        if settings.BROKER_URL:
+            _store = RedisNonceStore(settings.BROKER_URL, settings.MESSAGE_NONCE_TTL)
+        else:
+            _store = MemoryNonceStore(settings.MESSAGE_NONCE_TTL, settings.MESSAGE_NONCE_MAX_ENTRIES)
+        logger.info("消息去重索引: %s", _store.name)
+    return _store
+
+
+def reserve_nonce(user_id: int, nonce: Optional[str], message_id: int) -> Optional[int]:
+    """登记消息nonce，重复发送时返回原消息ID；未提供nonce时不做去重"""
+    if not nonce:
+        return None
+    existing_id = get_nonce_store().reserve(user_id, nonce, message_id)
+    if existing_id is not None:
+        logger.info("用户 %s 重复发送消息 nonce=%s，返回原消息 %s", user_id, nonce, existing_id)
+    return existing_id
+
+
+def release_nonce(user_id: int, nonce: Optional[str]) -> None:
+    """撤销nonce登记"""
+    if nonce:
+        get_nonce_store().release(user_id, nonce)
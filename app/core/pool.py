@@ -0,0 +1,126 @@
+# app/core/pool.py
+# 数据库连接池：按进程数推导池大小，统计获取连接的等待时间和占用率
+
+import threading
+import time
+from typing import Tuple
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from app.config import settings
+
+# 异步接口在事件循环中的只读查询及后台任务预留的连接数
+EVENT_LOOP_CONNECTIONS = 4
+
+# 获取连接等待超过该时间（秒）计为慢获取
+SLOW_CHECKOUT_SECONDS = 0.1
+
+
+def get_pool_settings() -> Tuple[int, int]:
+    """计算每个进程的 (pool_size, max_overflow)
+
+    DB_POOL_SIZE 为0时，常驻连接数为可能同时访问数据库的线程数之和：Socket.IO 的数据库线程
+    （DB_EXECUTOR_WORKERS）、同步接口的线程池（THREADPOOL_SIZE）和事件循环预留连接，
+    并保证所有进程的连接总数不超过 DB_MAX_CONNECTIONS；超出预算的线程排队等待连接。
+    """
+    budget = max(1, settings.DB_MAX_CONNECTIONS // max(1, settings.WORKERS))
+    if settings.DB_POOL_SIZE > 0:
+        return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    pool_size = min(get_connection_demand(), budget)
+    max_overflow = max(0, min(settings.DB_MAX_OVERFLOW, budget - pool_size))
+    return pool_size, max_overflow
+
+
+def get_connection_demand() -> int:
+    """每个进程可能同时占用的数据库连接数"""
+    return settings.DB_EXECUTOR_WORKERS + settings.THREADPOOL_SIZE + EVENT_LOOP_CONNECTIONS
+
+
+def configure_threadpool() -> None:
+    """将同步接口的线程池（AnyIO 默认40个线程）设为 THREADPOOL_SIZE，与连接池大小的计算保持一致
+
+    需要在事件循环中调用（启动阶段）。
+    """
+    import anyio.to_thread
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+
+
+class PoolStats:
+    """连接池统计（累计值，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.peak_in_use = 0
+
+    def record_checkout(self, wait: float, in_use: int) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            if wait >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+            self.peak_in_use = max(self.peak_in_use, in_use)
+
+    def record_timeout(self, wait: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+    def reset_peaks(self) -> None:
+        """重置区间峰值（每次输出统计后调用）"""
+        with self._lock:
+            self.wait_seconds_max = 0.0
+            self.peak_in_use = 0
+
+
+class TimedQueuePool(QueuePool):
+    """记录获取连接等待时间和占用峰值的连接池"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        self.stats.record_checkout(time.perf_counter() - start, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # 连接池重建（如 engine.dispose()）时保留累计统计
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def capacity(self) -> int:
+        return self.size() + max(0, self._max_overflow)
+
+    def status_dict(self) -> dict:
+        """当前状态及累计统计"""
+        stats = self.stats
+        capacity = self.capacity()
+        in_use = self.checkedout()
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "in_use": in_use,
+            "idle": self.checkedin(),
+            "saturation": in_use / capacity if capacity else 0.0,
+            "peak_saturation": stats.peak_in_use / capacity if capacity else 0.0,
+            "checkouts": stats.checkouts,
+            "wait_seconds_total": stats.wait_seconds_total,
+            "wait_seconds_max": stats.wait_seconds_max,
+            "slow_checkouts": stats.slow_checkouts,
+            "timeouts": stats.timeouts,
+        }
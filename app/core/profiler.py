@@ -0,0 +1,178 @@
+# app/core/profiler.py
+# SQL 分析：按 HTTP 请求/Socket.IO 事件统计查询数、数据库耗时和重复语句，识别 N+1 查询并记录慢查询
+
+import logging
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import event
+
+from app.config import settings
+from app.core.security import verify_token
+
+logger = logging.getLogger(__name__)
+
+# 管理员通过该请求头为单个请求开启分析
+PROFILE_HEADER = b"x-profile-sql"
+
+# 保留最近的分析报告数
+RECENT_PROFILES = 50
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\([^)]*\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\([^)]*\)s|:\w+|\$\d+))*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """语句指纹：合并空白、IN 列表和数字字面量，参数不同的同一语句得到相同指纹"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _IN_LIST.sub("(?)", statement)
+    return _NUMBER.sub("N", statement)
+
+
+class QueryProfile:
+    """单个请求/事件的 SQL 统计"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = datetime.utcnow()
+        self.queries = 0
+        self.seconds = 0.0
+        # 原始语句 -> [执行次数, 总耗时]；生成报告时再计算指纹
+        self.statements: Dict[str, list] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.seconds += elapsed
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def repeated(self) -> List[dict]:
+        """按指纹汇总，执行次数超过阈值的语句视为可能的 N+1 查询"""
+        groups: Dict[str, list] = {}
+        for statement, (count, seconds) in self.statements.items():
+            group = groups.setdefault(fingerprint(statement), [0, 0.0])
+            group[0] += count
+            group[1] += seconds
+        return sorted(
+            (
+                {"fingerprint": key, "count": count, "seconds": round(seconds, 6)}
+                for key, (count, seconds) in groups.items()
+                if count >= settings.SQL_N_PLUS_ONE_THRESHOLD
+            ),
+            key=lambda item: item["count"],
+            reverse=True
+        )
+
+    def report(self) -> dict:
+        return {
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "queries": self.queries,
+            "db_ms": round(self.seconds * 1000, 3),
+            "distinct_statements": len(self.statements),
+            "n_plus_one": self.repeated(),
+        }
+
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+
+_recent: Deque[dict] = deque(maxlen=RECENT_PROFILES)
+
+
+def get_recent_profiles() -> List[dict]:
+    return list(reversed(_recent))
+
+
+def finish_profile(profile: QueryProfile) -> dict:
+    """结束分析：保存报告，发现重复语句时输出警告"""
+    report = profile.report()
+    _recent.append(report)
+    if report["n_plus_one"]:
+        worst = report["n_plus_one"][0]
+        logger.warning(
+            "%s 可能存在 N+1 查询：同一语句执行 %d 次（共 %d 条SQL，%.1fms）: %s",
+            profile.label, worst["count"], profile.queries, profile.seconds * 1000, worst["fingerprint"][:300]
+        )
+    else:
+        logger.info("%s 共执行 %d 条SQL，数据库耗时 %.1fms", profile.label, profile.queries, profile.seconds * 1000)
+    return report
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("profile_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed)
+    if settings.SQL_SLOW_QUERY_MS and elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        logger.warning(
+            "慢查询 %.1fms%s: %s",
+            elapsed * 1000, f"（{profile.label}）" if profile else "", _WHITESPACE.sub(" ", statement)[:500]
+        )
+
+
+def register_query_profiler(engine) -> None:
+    """为应用的数据库引擎注册 SQL 分析和慢查询日志"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def is_admin_username(username: Optional[str]) -> bool:
+    return bool(username) and username in settings.admin_usernames
+
+
+def wants_profile(headers) -> bool:
+    """请求是否需要分析：全局开启，或管理员携带 X-Profile-SQL 请求头"""
+    if settings.SQL_PROFILING:
+        return True
+    values = dict(headers)
+    if values.get(PROFILE_HEADER, b"").lower() not in (b"1", b"true"):
+        return False
+    authorization = values.get(b"authorization", b"").decode("latin-1")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    return is_admin_username(verify_token(authorization[7:]))
+
+
+class SqlProfilerMiddleware:
+    """按请求分析 SQL；分析结果写入日志，并通过 X-SQL-Queries / X-SQL-Time-Ms 响应头返回"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(f"{scope['method']} {scope['path']}")
+        token = current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-sql-queries", str(profile.queries).encode()))
+                headers.append((b"x-sql-time-ms", f"{profile.seconds * 1000:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            finish_profile(profile)
@@ -0,0 +1,251 @@
+# app/core/replicas.py
+# 只读副本路由：只读查询分发到副本库；用户写入后短时间内粘滞主库（读己之写，多进程时经Redis共享）；副本故障或延迟过大时回退主库
+
+import itertools
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.core.tasks import periodic_task
+from app.database import SessionLocal, create_server_engine, create_sqlite_read_engine, is_sqlite_file
+
+logger = logging.getLogger(__name__)
+
+# 会话标记：会话所属用户（粘滞键）及本事务是否发生写入
+SESSION_OWNER_KEY = "replica_owner"
+SESSION_WROTE_KEY = "replica_wrote"
+
+# PostgreSQL 备库的复制延迟（秒）；WAL 已全部回放时为0，避免主库空闲时误判
+POSTGRES_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    """只读副本及其健康状态"""
+
+    def __init__(self, url: str):
+        self.name = make_url(url).render_as_string(hide_password=True)
+        if is_sqlite_file(url):
+            self.engine = create_sqlite_read_engine(url)
+        else:
+            self.engine = create_server_engine(url)
+        self.session_factory = sessionmaker(bind=self.engine, autocommit=False, autoflush=False)
+        self.healthy = True
+        self.lag = 0.0
+        self.last_error: Optional[str] = None
+        event.listen(self.engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        # 查询出现连接错误时立即停用，等下次健康检查恢复
+        if context.is_disconnect and self.healthy:
+            self.mark_unhealthy("连接断开")
+
+    def mark_unhealthy(self, reason: str) -> None:
+        if self.healthy:
+            logger.warning("只读副本 %s 停用: %s", self.name, reason)
+        self.healthy = False
+        self.last_error = reason
+
+    def check(self) -> None:
+        """检测连通性和复制延迟"""
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "postgresql":
+                    self.lag = float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except Exception as e:
+            self.mark_unhealthy(str(e).splitlines()[0] if str(e) else type(e).__name__)
+            return
+
+        if self.lag > settings.REPLICA_MAX_LAG_SECONDS:
+            self.mark_unhealthy(f"复制延迟 {self.lag:.1f}s")
+            return
+        if not self.healthy:
+            logger.info("只读副本 %s 恢复使用", self.name)
+        self.healthy = True
+        self.last_error = None
+
+    def status_dict(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag": self.lag, "last_error": self.last_error}
+
+
+class StickyStore(ABC):
+    """粘滞窗口存储接口：记录用户最近写入，窗口内该用户的读取走主库"""
+
+    name = "base"
+
+    @abstractmethod
+    def mark(self, key: str, seconds: float) -> None:
+        """开启（或延长）用户的粘滞窗口"""
+
+    @abstractmethod
+    def is_sticky(self, key: str) -> bool:
+        """用户是否处于粘滞窗口内"""
+
+
+class MemoryStickyStore(StickyStore):
+    """进程内粘滞窗口，只适用于单进程部署"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._sticky: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, key: str, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._sticky[key] = now + seconds
+            if len(self._sticky) > 10000:
+                self._sticky = {k: v for k, v in self._sticky.items() if v > now}
+
+    def is_sticky(self, key: str) -> bool:
+        expires_at = self._sticky.get(key)
+        return expires_at is not None and expires_at > time.monotonic()
+
+
+class RedisStickyStore(StickyStore):
+    """通过消息代理（Redis）共享的粘滞窗口：写入发生在一个进程、随后的读取落在另一个进程时同样生效"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("多进程部署只读副本需要安装 redis：uv sync --extra redis")
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, key: str) -> str:
+        return f"chatroom:sticky:{key}"
+
+    def mark(self, key: str, seconds: float) -> None:
+        try:
+            self.client.set(self._key(key), 1, px=max(1, int(seconds * 1000)))
+        except Exception as e:
+            logger.warning("记录粘滞窗口失败: %s", e)
+
+    def is_sticky(self, key: str) -> bool:
+        try:
+            return bool(self.client.exists(self._key(key)))
+        except Exception as e:
+            # 无法确认时按粘滞处理，宁可多读主库也不读到旧数据
+            logger.warning("查询粘滞窗口失败，使用主库: %s", e)
+            return True
+
+
+class ReplicaRouter:
+    """选择只读查询使用的副本"""
+
+    def __init__(self, urls: List[str], sticky_seconds: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.sticky_seconds = sticky_seconds
+        self._counter = itertools.count()
+        self._sticky_store: Optional[StickyStore] = None
+
+    @property
+    def sticky_store(self) -> StickyStore:
+        """粘滞窗口存储（懒加载）：配置了 BROKER_URL 时存入Redis，多进程间共享"""
+        if self._sticky_store is None:
+            self._sticky_store = RedisStickyStore(settings.BROKER_URL) if settings.BROKER_URL else MemoryStickyStore()
+        return self._sticky_store
+
+    def mark_write(self, key: str) -> None:
+        """记录用户写入，粘滞窗口内该用户的读取走主库"""
+        self.sticky_store.mark(key, self.sticky_seconds)
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        return self.sticky_store.is_sticky(key)
+
+    def choose(self, key: Optional[str]) -> Optional[Replica]:
+        """轮询选择健康的副本；无可用副本或处于粘滞窗口时返回None（使用主库）"""
+        if not self.replicas or self.is_sticky(key):
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def check(self) -> None:
+        for replica in self.replicas:
+            replica.check()
+
+
+router = ReplicaRouter(
+    [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()],
+    settings.REPLICA_STICKY_SECONDS
+)
+
+
+def set_session_owner(db: Session, key: Optional[str]) -> None:
+    """标记会话所属用户，该会话提交写入后对此用户启用粘滞"""
+    if key is not None:
+        db.info[SESSION_OWNER_KEY] = key
+
+
+def open_read_session(key: Optional[str] = None) -> Session:
+    """打开只读会话：有可用副本时连接副本，否则使用主库"""
+    replica = router.choose(key)
+    if replica is None:
+        db = SessionLocal()
+        set_session_owner(db, key)
+        return db
+    return replica.session_factory()
+
+
+def get_replica_status() -> List[dict]:
+    return [replica.status_dict() for replica in router.replicas]
+
+
+@periodic_task("replica_health", settings.REPLICA_CHECK_INTERVAL if router.replicas else 0)
+def check_replicas():
+    """定期检查副本健康和复制延迟"""
+    router.check()
+
+
+def mark_session_wrote(session, flush_context):
+    session.info[SESSION_WROTE_KEY] = True
+
+
+def mark_bulk_wrote(orm_execute_state):
+    # query.update()/delete() 等批量语句不经过 flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info[SESSION_WROTE_KEY] = True
+
+
+def mark_owner_write(session):
+    if session.info.pop(SESSION_WROTE_KEY, False) and SESSION_OWNER_KEY in session.info:
+        router.mark_write(session.info[SESSION_OWNER_KEY])
+
+
+def clear_session_wrote(session):
+    session.info.pop(SESSION_WROTE_KEY, None)
+
+
+# 会话事件 -> 处理函数：提交了写入的会话为其所属用户开启粘滞窗口
+SESSION_LISTENERS = (
+    ("after_flush", mark_session_wrote),
+    ("do_orm_execute", mark_bulk_wrote),
+    ("after_commit", mark_owner_write),
+    ("after_rollback", clear_session_wrote),
+)
+
+
+if router.replicas:
+    logger.info("只读副本: %s", ", ".join(replica.name for replica in router.replicas))
+    for identifier, listener in SESSION_LISTENERS:
+        event.listen(Session, identifier, listener)
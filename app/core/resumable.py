@@ -0,0 +1,108 @@
+# app/core/resumable.py
+# 可续传分块上传：临时文件管理与过期会话清理
+
+import hashlib
+import logging
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import UploadSession
+from app.core.tasks import periodic_task
+from app.core.files import get_temp_dir
+
+logger = logging.getLogger(__name__)
+
+
+def get_partial_path(session_id: str) -> Path:
+    """获取会话对应的临时文件路径"""
+    return get_temp_dir() / session_id
+
+
+def get_chunk_path(session_id: str) -> Path:
+    """为一次分块请求分配独立的临时文件（并发请求互不干扰，未被采纳的分块直接丢弃）"""
+    return get_temp_dir() / f"{session_id}.{uuid.uuid4().hex}"
+
+
+def claim_offset(db: Session, session_id: str, offset: int, received_size: int) -> bool:
+    """将会话进度从 offset 推进到 received_size，进度已被其他请求推进时返回 False
+
+    条件更新在数据库中原子执行，多进程部署时同样只有一个请求能写入同一偏移量。
+    """
+    updated = db.query(UploadSession).filter(
+        UploadSession.id == session_id,
+        UploadSession.received_size == offset
+    ).update({UploadSession.received_size: received_size}, synchronize_session=False)
+    db.commit()
+    return updated == 1
+
+
+def write_chunk(session_id: str, chunk_path: Path, offset: int) -> None:
+    """将已采纳的分块写入会话临时文件的指定偏移量，并删除分块文件"""
+    try:
+        with open(get_partial_path(session_id), 'r+b') as dst, open(chunk_path, 'rb') as src:
+            dst.seek(offset)
+            shutil.copyfileobj(src, dst, settings.UPLOAD_CHUNK_SIZE)
+    finally:
+        chunk_path.unlink(missing_ok=True)
+
+
+def hash_partial_file(session_id: str, total_size: int) -> Optional[str]:
+    """截掉中断写入残留的多余字节后计算会话临时文件的SHA-256，文件不完整时返回 None"""
+    path = get_partial_path(session_id)
+    with open(path, 'r+b') as f:
+        if f.seek(0, 2) < total_size:
+            return None
+        f.truncate(total_size)
+    return hash_file(path)
+
+
+def get_expires_at(upload_session: UploadSession) -> datetime:
+    """会话过期时间（以最后一次活动时间计算）"""
+    last_active = upload_session.updated_at or upload_session.created_at or datetime.utcnow()
+    return last_active + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+
+def hash_file(path: Path) -> str:
+    """分块计算文件SHA-256"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@periodic_task("upload_session_cleanup", settings.UPLOAD_SESSION_CLEANUP_INTERVAL, singleton=True)
+def cleanup_stale_sessions() -> int:
+    """删除过期的上传会话及其临时文件，返回清理的会话数"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    db = SessionLocal()
+    try:
+        stale_sessions = db.query(UploadSession).filter(UploadSession.updated_at < cutoff).all()
+        for upload_session in stale_sessions:
+            get_partial_path(upload_session.id).unlink(missing_ok=True)
+            db.delete(upload_session)
+        db.commit()
+
+        # 清理没有对应会话记录的残留临时文件（包括异常中断的单次上传）
+        known_ids = {row[0] for row in db.query(UploadSession.id).all()}
+        cutoff_ts = time.time() - settings.UPLOAD_SESSION_TTL
+        for path in get_temp_dir().iterdir():
+            if path.name not in known_ids and path.stat().st_mtime < cutoff_ts:
+                path.unlink(missing_ok=True)
+    finally:
+        db.close()
+
+    if stale_sessions:
+        logger.info("已清理 %d 个过期上传会话", len(stale_sessions))
+    return len(stale_sessions)
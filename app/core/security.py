@@ -1,22 +1,29 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from app.config import settings
 
-# 密码上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib 和 jose 导入较慢，首次使用时再导入以加快启动
+_pwd_context = None
+
+def get_pwd_context():
+    """密码上下文（懒加载）"""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """获取密码哈希"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -29,6 +36,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 def verify_token(token: str) -> Optional[str]:
     """验证令牌并返回用户名"""
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
@@ -36,4 +44,22 @@ def verify_token(token: str) -> Optional[str]:
             return None
         return username
     except JWTError:
-        return None 
\ No newline at end of file
+        return None 
+
+def create_upload_token(claims: dict, expires_delta: timedelta) -> str:
+    """创建直传上传令牌（不含 sub，不能当作访问令牌使用）"""
+    from jose import jwt
+    to_encode = {k: v for k, v in claims.items() if k != "sub"}
+    to_encode.update({"purpose": "upload", "exp": datetime.utcnow() + expires_delta})
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def verify_upload_token(token: str) -> Optional[dict]:
+    """验证直传上传令牌并返回其中的声明"""
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("purpose") != "upload":
+        return None
+    return payload
@@ -0,0 +1,169 @@
+# app/core/static.py
+# 静态文件服务：前端资源清单、预压缩变体、长期缓存与条件请求
+
+import logging
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from app.core.images import find_original
+
+logger = logging.getLogger(__name__)
+
+# 内容永不变化的资源：一年强缓存
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# index.html 等入口文件：每次都需要重新验证
+REVALIDATE_CACHE = "no-cache"
+
+# 其他前端根目录文件（favicon、manifest.json等）
+DEFAULT_CACHE = "public, max-age=3600"
+
+# 上传文件名：SHA-256（含派生图后缀）或旧版UUID，内容与文件名一一对应
+IMMUTABLE_UPLOAD_NAME = re.compile(
+    r'^(?:[0-9a-f]{64}(?:_\d+)?|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.[a-z0-9]+$'
+)
+
+# 预压缩变体：Content-Encoding -> 文件后缀，按优先级排列
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def is_not_modified(response_headers, request_headers: Headers) -> bool:
+    """根据 If-None-Match 判断是否可以返回304"""
+    if_none_match = request_headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = response_headers.get("etag")
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def accepted_encodings(request_headers: Headers) -> set:
+    """解析 Accept-Encoding 中可接受的编码（忽略 q=0）"""
+    encodings = set()
+    for item in request_headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.lower())
+    return encodings
+
+
+@dataclass
+class Asset:
+    """前端构建产物中的单个文件"""
+    path: Path
+    stat_result: os.stat_result
+    media_type: str
+    cache_control: str
+    variants: Dict[str, tuple] = field(default_factory=dict)  # 编码 -> (路径, stat)
+
+
+class AssetManifest:
+    """前端构建目录的内存清单
+
+    启动时扫描一次，之后每个请求只做字典查找，不再触发 exists()/stat() 系统调用。
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.assets: Dict[str, Asset] = {}
+
+    def load(self) -> "AssetManifest":
+        """扫描构建目录生成清单"""
+        assets = {}
+        if self.directory.is_dir():
+            for path in self.directory.rglob("*"):
+                if not path.is_file() or path.suffix in (".br", ".gz"):
+                    continue
+                relative = path.relative_to(self.directory).as_posix()
+                asset = Asset(
+                    path=path,
+                    stat_result=path.stat(),
+                    media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                    cache_control=self.get_cache_control(relative)
+                )
+                for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+                    variant = path.with_name(path.name + suffix)
+                    if variant.is_file():
+                        asset.variants[encoding] = (variant, variant.stat())
+                assets[relative] = asset
+        self.assets = assets
+        logger.info("前端资源清单已加载：%d 个文件", len(assets))
+        return self
+
+    @staticmethod
+    def get_cache_control(relative: str) -> str:
+        """Vite 构建的 assets/ 目录文件名带内容哈希，可永久缓存"""
+        if relative.startswith("assets/"):
+            return IMMUTABLE_CACHE
+        if relative.endswith(".html"):
+            return REVALIDATE_CACHE
+        return DEFAULT_CACHE
+
+    def get(self, relative: str) -> Optional[Asset]:
+        return self.assets.get(relative)
+
+    def response(self, asset: Asset, request_headers: Headers):
+        """构建资源响应：优先返回客户端支持的预压缩变体，支持条件请求和Range请求"""
+        path, stat_result = asset.path, asset.stat_result
+        headers = {"cache-control": asset.cache_control}
+        if asset.variants:
+            headers["vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers)
+            for encoding, _ in PRECOMPRESSED_ENCODINGS:
+                if encoding in accepted and encoding in asset.variants:
+                    path, stat_result = asset.variants[encoding]
+                    headers["content-encoding"] = encoding
+                    break
+
+        response = FileResponse(path, headers=headers, media_type=asset.media_type, stat_result=stat_result)
+        if is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class UploadStaticFiles(StaticFiles):
+    """上传文件服务
+
+    - 内容寻址/UUID 命名的文件永不变化，返回 immutable 长期缓存头
+    - 派生图尚未生成时回退到原图
+    - 拒绝访问以点开头的路径（未完成的上传、临时文件）
+    """
+
+    async def get_response(self, path: str, scope: Scope):
+        if any(part.startswith(".") for part in Path(path).parts):
+            raise HTTPException(status_code=404)
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as exc:
+            if exc.status_code != 404:
+                raise
+            original = self.find_derivative_fallback(path)
+            if original is None:
+                raise
+            # 回退内容不能被当作派生图长期缓存
+            return FileResponse(original, headers={"Cache-Control": "no-cache"})
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if IMMUTABLE_UPLOAD_NAME.match(os.path.basename(full_path)):
+            response.headers["cache-control"] = IMMUTABLE_CACHE
+        return response
+
+    def find_derivative_fallback(self, path: str):
+        """派生图路径对应的原图，不存在时返回None"""
+        relative = Path(path)
+        if ".." in relative.parts:
+            return None
+        return find_original(Path(self.directory) / relative.parent, relative.name)
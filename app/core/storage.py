@@ -0,0 +1,236 @@
+# app/core/storage.py
+# 可插拔文件存储后端：本地文件系统 / S3兼容对象存储（AWS S3、MinIO等）
+
+import base64
+import logging
+from abc import ABC, abstractmethod
+import mimetypes
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 存储键由内容哈希决定，对象内容永不变化
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class StorageBackend(ABC):
+    """存储后端接口
+
+    存储键（key）是相对路径，如 images/<sha256>.png；
+    对外URL统一为 /uploads/<key>，与具体后端无关，便于切换后端而不改动数据库中的URL。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def save_file(self, key: str, source_path: Path) -> None:
+        """将本地临时文件保存到存储（调用后临时文件不再可用）"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """对象是否存在"""
+
+    @abstractmethod
+    def get_size(self, key: str) -> Optional[int]:
+        """对象大小，不存在时返回None"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除对象（不存在时忽略）"""
+
+    @abstractmethod
+    def move(self, source_key: str, key: str) -> None:
+        """将对象移动到新的存储键（目标已存在时覆盖）"""
+
+    @abstractmethod
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, datetime]]:
+        """列出存储键以 prefix 开头的对象及其最后修改时间（UTC）"""
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """对象在本地文件系统中的路径，远程存储返回None"""
+        return None
+
+    @abstractmethod
+    def presign_upload(self, key: str, size: int, sha256: str, direct_url: str) -> Dict:
+        """生成客户端直传的预签名上传信息 {url, method, headers}
+
+        direct_url 为应用自身的直传地址，供不支持预签名的后端使用。
+        """
+
+    @abstractmethod
+    def presign_download(self, key: str) -> str:
+        """生成客户端直接下载的URL"""
+
+
+class LocalStorage(StorageBackend):
+    """本地文件系统存储，文件由应用的 /uploads 挂载点提供"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    def save_file(self, key: str, source_path: Path) -> None:
+        target = self.local_path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source_path, target)
+
+    def exists(self, key: str) -> bool:
+        return self.local_path(key).is_file()
+
+    def get_size(self, key: str) -> Optional[int]:
+        try:
+            return self.local_path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        self.local_path(key).unlink(missing_ok=True)
+
+    def move(self, source_key: str, key: str) -> None:
+        target = self.local_path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.local_path(source_key), target)
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, datetime]]:
+        directory, _, name_prefix = prefix.rpartition("/")
+        parent = self.root / directory
+        if not parent.is_dir():
+            return
+        for path in parent.glob(f"{name_prefix}*"):
+            try:
+                modified = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).replace(tzinfo=None)
+            except FileNotFoundError:
+                continue
+            if path.is_file():
+                yield path.relative_to(self.root).as_posix(), modified
+
+    def presign_upload(self, key: str, size: int, sha256: str, direct_url: str) -> Dict:
+        # 本地存储没有独立的对象服务，直传地址指向应用自身的签名上传接口
+        return {"url": direct_url, "method": "PUT", "headers": {}}
+
+    def presign_download(self, key: str) -> str:
+        return f"/uploads/{key}"
+
+
+class S3Storage(StorageBackend):
+    """S3兼容对象存储（需要安装 boto3）
+
+    设置 S3_ENDPOINT_URL 即可对接 MinIO 等本地兼容服务。
+    """
+
+    name = "s3"
+
+    def __init__(self):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("使用S3存储需要安装 boto3：uv sync --extra s3")
+
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            config=Config(signature_version="s3v4", s3={"addressing_style": settings.S3_ADDRESSING_STYLE})
+        )
+
+    def save_file(self, key: str, source_path: Path) -> None:
+        extra_args = {"CacheControl": IMMUTABLE_CACHE_CONTROL}
+        content_type = mimetypes.guess_type(key)[0]
+        if content_type:
+            extra_args["ContentType"] = content_type
+        try:
+            self.client.upload_file(str(source_path), self.bucket, key, ExtraArgs=extra_args)
+        finally:
+            Path(source_path).unlink(missing_ok=True)
+
+    def exists(self, key: str) -> bool:
+        return self.get_size(key) is not None
+
+    def get_size(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def move(self, source_key: str, key: str) -> None:
+        # 对象存储没有重命名操作：服务端复制（保留元数据）后删除源对象
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key}
+        )
+        self.delete(source_key)
+
+    def list_objects(self, prefix: str) -> Iterator[Tuple[str, datetime]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                # boto3 返回带时区的时间，统一为 UTC naive 与数据库时间比较
+                yield item["Key"], item["LastModified"].astimezone(timezone.utc).replace(tzinfo=None)
+
+    def presign_upload(self, key: str, size: int, sha256: str, direct_url: str) -> Dict:
+        # 预签名中包含SHA-256校验和，对象存储会拒绝内容不符的上传
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        params = {
+            "Bucket": self.bucket,
+            "Key": key,
+            "ContentLength": size,
+            "ChecksumSHA256": checksum,
+            "CacheControl": IMMUTABLE_CACHE_CONTROL,
+        }
+        content_type = mimetypes.guess_type(key)[0]
+        if content_type:
+            params["ContentType"] = content_type
+
+        url = self.client.generate_presigned_url(
+            "put_object", Params=params, ExpiresIn=settings.PRESIGNED_URL_EXPIRE_SECONDS
+        )
+        headers = {
+            "x-amz-checksum-sha256": checksum,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        }
+        if content_type:
+            headers["Content-Type"] = content_type
+        return {"url": url, "method": "PUT", "headers": headers}
+
+    def presign_download(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.PRESIGNED_URL_EXPIRE_SECONDS
+        )
+
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """获取当前配置的存储后端（单例）"""
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage()
+        elif settings.STORAGE_BACKEND == "local":
+            _storage = LocalStorage(settings.UPLOAD_DIR)
+        else:
+            raise RuntimeError(f"未知的存储后端: {settings.STORAGE_BACKEND}")
+        logger.info("文件存储后端: %s", _storage.name)
+    return _storage
@@ -0,0 +1,60 @@
+# app/core/tasks.py
+# 周期性后台任务
+
+import asyncio
+import logging
+from typing import Callable, Dict, List
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 已注册的周期任务：名称 -> (间隔秒数, 同步函数, 是否只在一个进程运行)
+_registry: Dict[str, tuple] = {}
+
+# 运行中的asyncio任务
+_running: List[asyncio.Task] = []
+
+
+def periodic_task(name: str, interval: float, singleton: bool = False):
+    """注册周期任务的装饰器，任务函数为同步函数，在线程池中执行
+
+    singleton 为 True 的全局维护任务（清理、归档等）在多进程部署时只在0号工作进程运行。
+    """
+    def decorator(func: Callable[[], None]):
+        _registry[name] = (interval, func, singleton)
+        return func
+    return decorator
+
+
+async def _run_forever(name: str, interval: float, func: Callable[[], None]):
+    """按固定间隔循环执行任务，单次失败不影响后续执行"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(func)
+        except Exception:
+            logger.exception("后台任务 %s 执行失败", name)
+
+
+def start_background_tasks():
+    """启动所有已注册的周期任务"""
+    if _running:
+        return
+    loop = asyncio.get_running_loop()
+    for name, (interval, func, singleton) in _registry.items():
+        if singleton and settings.WORKER_INDEX > 0:
+            continue
+        if interval and interval > 0:
+            _running.append(loop.create_task(_run_forever(name, interval, func), name=name))
+            logger.info("后台任务 %s 已启动，间隔 %ss", name, interval)
+
+
+async def stop_background_tasks():
+    """停止所有周期任务"""
+    for task in _running:
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+    _running.clear()
@@ -0,0 +1,112 @@
+# app/core/tombstones.py
+# 已删除消息压缩：软删除的消息在延迟后分批物理删除，删除事件保留在墓碑表中供增量同步
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Message, MessageTombstone, Attachment, FileReference
+from app.core.tasks import periodic_task
+
+logger = logging.getLogger(__name__)
+
+
+def add_tombstone(db, message: Message) -> None:
+    """记录消息删除（与软删除在同一事务中提交）"""
+    db.add(MessageTombstone(id=message.id, room_id=message.room_id, deleted_at=datetime.utcnow()))
+
+
+def get_tombstone_horizon() -> datetime:
+    """墓碑保留期起点，早于该时间的删除事件已不可查"""
+    return datetime.utcnow() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+
+
+def backfill_tombstones(batch_size: Optional[int] = None) -> int:
+    """为旧版本软删除（没有墓碑）的消息补建墓碑，返回补建数量"""
+    batch_size = batch_size or settings.TOMBSTONE_COMPACTION_BATCH_SIZE
+    created = 0
+    after_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            messages = db.query(Message).filter(
+                Message.is_deleted == True,
+                Message.id > after_id
+            ).order_by(Message.id).limit(batch_size).all()
+            if not messages:
+                break
+            after_id = messages[-1].id
+            existing = {
+                row[0] for row in db.query(MessageTombstone.id).filter(
+                    MessageTombstone.id.in_([message.id for message in messages])
+                )
+            }
+            for message in messages:
+                if message.id not in existing:
+                    db.add(MessageTombstone(
+                        id=message.id,
+                        room_id=message.room_id,
+                        deleted_at=message.edited_at or message.timestamp or datetime.utcnow()
+                    ))
+                    created += 1
+            db.commit()
+    finally:
+        db.close()
+    return created
+
+
+def compact_tombstones(delay: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+    """物理删除软删除超过延迟时间的消息，并清理过期墓碑；返回删除的消息数
+
+    每批在独立的短事务中提交，不会长时间持有锁阻塞消息写入。
+    """
+    delay = settings.TOMBSTONE_COMPACTION_DELAY if delay is None else delay
+    batch_size = batch_size or settings.TOMBSTONE_COMPACTION_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(seconds=delay)
+    removed = 0
+    pruned = 0
+    db = SessionLocal()
+    try:
+        while True:
+            message_ids = [
+                row[0] for row in db.query(Message.id).join(
+                    MessageTombstone, MessageTombstone.id == Message.id
+                ).filter(
+                    MessageTombstone.deleted_at < cutoff,
+                    Message.is_deleted == True
+                ).order_by(MessageTombstone.deleted_at).limit(batch_size)
+            ]
+            if not message_ids:
+                break
+            db.query(FileReference).filter(FileReference.message_id.in_(message_ids)).delete(synchronize_session=False)
+            db.query(Attachment).filter(Attachment.message_id.in_(message_ids)).delete(synchronize_session=False)
+            removed += db.query(Message).filter(Message.id.in_(message_ids)).delete(synchronize_session=False)
+            db.commit()
+
+        horizon = get_tombstone_horizon()
+        while True:
+            tombstone_ids = [
+                row[0] for row in db.query(MessageTombstone.id).filter(
+                    MessageTombstone.deleted_at < horizon
+                ).limit(batch_size)
+            ]
+            if not tombstone_ids:
+                break
+            pruned += db.query(MessageTombstone).filter(
+                MessageTombstone.id.in_(tombstone_ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+    finally:
+        db.close()
+
+    if removed or pruned:
+        logger.info("已压缩 %d 条已删除消息，清理 %d 条过期墓碑", removed, pruned)
+    return removed
+
+
+@periodic_task("tombstone_compaction", settings.TOMBSTONE_COMPACTION_INTERVAL, singleton=True)
+def run_compaction_task():
+    """定期压缩已删除消息"""
+    compact_tombstones()
@@ -0,0 +1,48 @@
+# app/core/user_cards.py
+# 紧凑模式名片缓存：按房间记录最近发言的作者，容量有限，按最近使用淘汰
+
+import threading
+from collections import OrderedDict
+from typing import List
+
+
+class RecentAuthors:
+    """每个房间最近发言的作者ID（进程内，房间数和每个房间的作者数都有上限）
+
+    只用于决定何时向房间推送名片、加入房间时预先下发哪些名片；
+    被淘汰或由其他进程推送过的名片，客户端通过 get_user_cards 按需获取，重复推送也无副作用。
+    """
+
+    def __init__(self, max_rooms: int, max_users_per_room: int):
+        self.max_rooms = max_rooms
+        self.max_users_per_room = max_users_per_room
+        self._rooms: OrderedDict[int, OrderedDict[int, None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, room_id: int, user_id: int) -> bool:
+        """记录作者在房间内发言，作者此前不在记录中（需要推送名片）时返回True"""
+        with self._lock:
+            users = self._rooms.get(room_id)
+            if users is None:
+                users = self._rooms[room_id] = OrderedDict()
+                while len(self._rooms) > self.max_rooms:
+                    self._rooms.popitem(last=False)
+            else:
+                self._rooms.move_to_end(room_id)
+
+            is_new = user_id not in users
+            users[user_id] = None
+            users.move_to_end(user_id)
+            while len(users) > self.max_users_per_room:
+                users.popitem(last=False)
+            return is_new
+
+    def get(self, room_id: int) -> List[int]:
+        """房间最近发言的作者ID"""
+        with self._lock:
+            return list(self._rooms.get(room_id, ()))
+
+    def rooms_with(self, user_id: int) -> List[int]:
+        """记录中包含该作者的房间ID"""
+        with self._lock:
+            return [room_id for room_id, users in self._rooms.items() if user_id in users]
@@ -1,35 +1,187 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import contextvars
+import functools
+import logging
 import os
-from pathlib import Path
+import time
+
+from app.config import settings
+from app.core.pool import SLOW_CHECKOUT_SECONDS, TimedQueuePool, get_connection_demand, get_pool_settings
+from app.core.metrics import CounterFunc, GaugeFunc, register_query_metrics
+from app.core.profiler import register_query_profiler
+from app.core.tasks import periodic_task
+
+logger = logging.getLogger(__name__)
 
 # 数据库URL配置
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./instance/chatroom.db")
 
-# 确保instance目录存在（仅对SQLite数据库）
-if "sqlite" in DATABASE_URL and ":///" in DATABASE_URL:
-    # 提取数据库文件路径
-    db_path = DATABASE_URL.split("///", 1)[1]
-    if db_path.startswith("./"):
-        db_path = db_path[2:]  # 移除 "./" 前缀
-    
-    # 获取数据库文件的目录
-    db_dir = Path(db_path).parent
-    
-    # 创建目录（如果不存在）
-    db_dir.mkdir(parents=True, exist_ok=True)
-    print(f"确保数据库目录存在: {db_dir}")
-
-# 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=False  # 设置为True可以看到SQL查询日志
-)
+# 会话标记：当前事务已发生写入，后续查询也走写连接
+WRITE_BOUND_KEY = "write_bound"
+
+
+def is_sqlite_file(url: str) -> bool:
+    """是否为文件型SQLite数据库（内存库无法使用WAL和多连接）"""
+    if not url.startswith("sqlite") or ":///" not in url:
+        return False
+    path = url.split(":///", 1)[1]
+    return bool(path) and path != ":memory:"
+
+
+def configure_sqlite_connection(dbapi_connection) -> None:
+    """新建连接时设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    # WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 下仍保证数据库不损坏
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def begin_immediate(conn) -> None:
+    """写连接以 BEGIN IMMEDIATE 开启事务
+
+    事务开始时即获取写锁，锁冲突只会发生在这里而不是事务中途，因此可以安全重试。
+    """
+    for attempt in range(settings.SQLITE_BUSY_RETRIES + 1):
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            return
+        except OperationalError as e:
+            if "locked" not in str(e) or attempt == settings.SQLITE_BUSY_RETRIES:
+                raise
+            logger.warning("数据库写锁繁忙，第 %d 次重试", attempt + 1)
+            time.sleep(0.05 * (2 ** attempt))
+
+
+def instrument_engine(engine):
+    """为应用创建的引擎注册 SQL 指标和分析，返回该引擎"""
+    register_query_metrics(engine)
+    register_query_profiler(engine)
+    return engine
+
+
+def create_sqlite_engines(url: str):
+    """创建SQLite写引擎（单一连接，串行化所有写入）和读引擎（连接池）
+
+    写连接只有一个，持有者在线程中执行写入时其他写入只能等待，
+    因此写入应在线程中执行（同步路由或 run_db），并使用较短的等待超时。
+    """
+    connect_args = {"check_same_thread": False}
+    write_engine = create_engine(
+        url, connect_args=connect_args, poolclass=TimedQueuePool, pool_size=1, max_overflow=0,
+        pool_timeout=settings.SQLITE_WRITE_POOL_TIMEOUT, echo=False
+    )
+
+    @event.listens_for(write_engine, "connect")
+    def on_write_connect(dbapi_connection, connection_record):
+        configure_sqlite_connection(dbapi_connection)
+        # 关闭驱动自带的隐式事务，由 begin 事件显式开启
+        dbapi_connection.isolation_level = None
+
+    event.listen(write_engine, "begin", begin_immediate)
+    return instrument_engine(write_engine), create_sqlite_read_engine(url)
+
+
+def create_sqlite_read_engine(url: str):
+    """创建SQLite读引擎（连接池）"""
+    read_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=TimedQueuePool,
+        pool_size=settings.SQLITE_READ_POOL_SIZE,
+        max_overflow=settings.SQLITE_READ_POOL_SIZE * 2,
+        echo=False
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def on_read_connect(dbapi_connection, connection_record):
+        configure_sqlite_connection(dbapi_connection)
+
+    return instrument_engine(read_engine)
+
+
+def create_server_engine(url: str):
+    """创建服务端数据库（PostgreSQL等）引擎，连接池参数来自配置"""
+    pool_size, max_overflow = get_pool_settings()
+    connect_args = {}
+    if make_url(url).get_driver_name() == "psycopg":
+        # psycopg 3 对重复执行的语句自动使用服务端预编译；psycopg2 不支持
+        connect_args["prepare_threshold"] = settings.DB_PREPARE_THRESHOLD or None
+    logger.info("数据库连接池: pool_size=%d, max_overflow=%d", pool_size, max_overflow)
+    if pool_size + max_overflow < get_connection_demand():
+        logger.warning(
+            "连接预算不足：最多 %d 个线程同时访问数据库，每进程只有 %d 个连接，高峰时请求将排队等待连接"
+            "（调小 THREADPOOL_SIZE/DB_EXECUTOR_WORKERS 或调大 DB_MAX_CONNECTIONS）",
+            get_connection_demand(), pool_size + max_overflow
+        )
+    return instrument_engine(create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+        echo=False
+    ))
+
 
-# 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class RoutingSession(Session):
+    """读写分离会话：flush 和 DML 语句走写引擎，其余查询走读引擎
+
+    事务中一旦发生写入，后续查询也走写引擎，保证能读到本事务尚未提交的修改。
+    """
+
+    def __init__(self, write_engine, read_engine, **kwargs):
+        super().__init__(**kwargs)
+        self.write_engine = write_engine
+        self.read_engine = read_engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or self.info.get(WRITE_BOUND_KEY) or getattr(clause, "is_dml", False):
+            self.info[WRITE_BOUND_KEY] = True
+            return self.write_engine
+        return self.read_engine
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def reset_write_bound(session, transaction):
+    """事务结束后恢复读写分离"""
+    if transaction.parent is None:
+        session.info.pop(WRITE_BOUND_KEY, None)
+
+
+# 创建数据库引擎（engine 为主库/写引擎，read_engine 用于只读查询）
+if settings.SQLITE_PERFORMANCE_MODE and is_sqlite_file(DATABASE_URL):
+    engine, read_engine = create_sqlite_engines(DATABASE_URL)
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, write_engine=engine, read_engine=read_engine, autocommit=False, autoflush=False
+    )
+else:
+    if "sqlite" in DATABASE_URL:
+        engine = instrument_engine(create_engine(
+            DATABASE_URL,
+            connect_args={"check_same_thread": False},
+            echo=False  # 设置为True可以看到SQL查询日志
+        ))
+    else:
+        engine = create_server_engine(DATABASE_URL)
+    read_engine = engine
+    # 创建会话工厂
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # 创建基础模型类
 Base = declarative_base()
@@ -40,4 +192,99 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def release_connection(db: Session) -> None:
+    """结束当前事务并归还连接，会话之后的查询会重新获取连接
+
+    在 await 耗时操作（如接收请求体）之前调用，避免连接在等待期间一直被占用。
+    """
+    db.commit()
+
+# 数据库线程池：Socket.IO 事件中的同步数据库操作在此执行，避免阻塞事件循环
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """懒加载数据库线程池"""
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+    return _db_executor
+
+# 已提交到数据库线程池、尚未完成的操作数（只在事件循环线程中修改）
+_db_in_flight = 0
+
+async def run_db(func, *args):
+    """在数据库线程池中执行同步函数（复制当前上下文，请求级统计随之传递）"""
+    global _db_in_flight
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    _db_in_flight += 1
+    try:
+        return await loop.run_in_executor(get_db_executor(), functools.partial(context.run, func, *args))
+    finally:
+        _db_in_flight -= 1
+
+def get_db_in_flight() -> int:
+    """数据库线程池中未完成的操作数"""
+    return _db_in_flight
+
+def shutdown_db_executor():
+    """关闭数据库线程池"""
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
+
+def get_pool_status() -> dict:
+    """各引擎的连接池状态（仅统计 TimedQueuePool）"""
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["read"] = read_engine
+    return {
+        name: e.pool.status_dict()
+        for name, e in engines.items()
+        if isinstance(e.pool, TimedQueuePool)
+    }
+
+GaugeFunc(
+    "chatroom_db_pool_connections", "数据库连接池连接数",
+    lambda: [
+        ((name, state), status[key])
+        for name, status in get_pool_status().items()
+        for state, key in (("in_use", "in_use"), ("idle", "idle"), ("size", "size"))
+    ],
+    ("pool", "state")
+)
+CounterFunc(
+    "chatroom_db_pool_checkout_wait_seconds", "获取数据库连接的累计等待时间",
+    lambda: [((name,), status["wait_seconds_total"]) for name, status in get_pool_status().items()],
+    ("pool",)
+)
+CounterFunc(
+    "chatroom_db_pool_timeouts", "获取数据库连接超时次数",
+    lambda: [((name,), status["timeouts"]) for name, status in get_pool_status().items()],
+    ("pool",)
+)
+
+# 上次输出统计时的超时次数
+_reported_timeouts = {}
+
+@periodic_task("db_pool_stats", settings.DB_POOL_STATS_INTERVAL)
+def log_pool_stats():
+    """输出连接池统计；出现超时或连接池占满导致等待时以警告级别输出"""
+    for name, status in get_pool_status().items():
+        new_timeouts = status["timeouts"] - _reported_timeouts.get(name, 0)
+        _reported_timeouts[name] = status["timeouts"]
+        # 占满但无需等待属正常情况（如 SQLite 单一写连接），出现明显等待时才告警
+        saturated = status["peak_saturation"] >= 0.9 and status["wait_seconds_max"] >= SLOW_CHECKOUT_SECONDS
+        level = logging.WARNING if new_timeouts or saturated else logging.DEBUG
+        logger.log(
+            level,
+            "连接池 %s: 使用中 %d/%d，区间峰值占用 %.0f%%，最长等待 %.3fs，新增超时 %d",
+            name, status["in_use"], status["size"] + max(0, status["max_overflow"]),
+            status["peak_saturation"] * 100, status["wait_seconds_max"], new_timeouts
+        )
+    for e in {engine, read_engine}:
+        if isinstance(e.pool, TimedQueuePool):
+            e.pool.stats.reset_peaks()
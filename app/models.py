@@ -2,11 +2,12 @@
 # 数据库模型
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 from app.core.security import get_password_hash, verify_password
+from app.core.ids import generate_id, id_to_datetime
 
 class User(Base):
     """用户模型"""
@@ -76,6 +77,14 @@ class User(Base):
             'website': self.website
         }
     
+    def to_card(self):
+        """用户名片（紧凑消息模式下按用户ID解析作者信息）"""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'avatar_url': self.avatar_url
+        }
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -175,33 +184,221 @@ class Message(Base):
     """消息模型"""
     __tablename__ = "messages"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # 应用生成的时间有序ID，创建对象时即可确定，无需提交后刷新
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=False, default=generate_id)
     content = Column(Text, nullable=False)
     message_type = Column(String(20), default='text')  # text, image, file, system
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
-    timestamp = Column(DateTime, default=func.now(), index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     edited_at = Column(DateTime)
     is_deleted = Column(Boolean, default=False)
     
     # 关系
     author = relationship('User', back_populates='messages')
     room = relationship('Room', back_populates='messages')
+    attachments = relationship(
+        'Attachment', back_populates='message', cascade='all, delete-orphan', lazy='selectin',
+        primaryjoin='Message.id == foreign(Attachment.message_id)'
+    )
     
-    def to_dict(self):
-        """转换为字典"""
-        return {
+    def __init__(self, **kwargs):
+        """创建时分配ID、时间戳及默认值，提交前即可序列化"""
+        kwargs.setdefault('id', generate_id())
+        kwargs.setdefault('timestamp', id_to_datetime(kwargs['id']))
+        kwargs.setdefault('message_type', 'text')
+        kwargs.setdefault('is_deleted', False)
+        super().__init__(**kwargs)
+    
+    # 按房间的游标分页查询
+    __table_args__ = (
+        Index('ix_messages_room_id_id', 'room_id', 'id'),
+    )
+    
+    def to_dict(self, compact=False):
+        """转换为字典（紧凑模式只保留作者ID，不加载作者信息）"""
+        data = {
             'id': self.id,
             'content': self.content,
             'message_type': self.message_type,
             'user_id': self.user_id,
-            'username': self.author.username if self.author else 'Unknown',
-            'avatar_url': self.author.avatar_url if self.author else '',
             'room_id': self.room_id,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'edited_at': self.edited_at.isoformat() if self.edited_at else None,
-            'is_deleted': self.is_deleted
+            'is_deleted': self.is_deleted,
+            'attachments': [a.to_dict() for a in self.attachments] if self.message_type in ('file', 'image') else []
+        }
+        if not compact:
+            data['username'] = self.author.username if self.author else 'Unknown'
+            data['avatar_url'] = self.author.avatar_url if self.author else ''
+        return data
+    
+    def __repr__(self):
+        return f'<Message {self.id}>'
+
+class MessageTombstone(Base):
+    """已删除消息的墓碑：消息行被压缩任务物理删除后，仍可供客户端增量同步删除事件"""
+    __tablename__ = "message_tombstones"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=False)  # 被删除的消息ID
+    room_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        Index('ix_message_tombstones_room_deleted', 'room_id', 'deleted_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'room_id': self.room_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+    
+    def __repr__(self):
+        return f'<MessageTombstone {self.id}>'
+
+class MessageArchiveSegment(Base):
+    """消息归档分段：已移出 messages 表的某房间某月消息，压缩存储在只读文件中"""
+    __tablename__ = "message_archive_segments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
+    month = Column(String(7), nullable=False)  # YYYY-MM
+    min_message_id = Column(BigInteger, nullable=False)
+    max_message_id = Column(BigInteger, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    path = Column(String(255), nullable=False)  # 相对 ARCHIVE_DIR 的路径
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_message_archive_segments_room_max', 'room_id', 'max_message_id'),
+    )
+    
+    def __repr__(self):
+        return f'<MessageArchiveSegment room={self.room_id} {self.month}>'
+
+class Attachment(Base):
+    """消息附件模型"""
+    __tablename__ = "attachments"
+    
+    id = Column(BigInteger, primary_key=True, index=True, autoincrement=False, default=generate_id)
+    # 不设外键：消息归档移出热表后附件行保留，媒体库仍可列出
+    message_id = Column(BigInteger, nullable=False, index=True)
+    room_id = Column(Integer, ForeignKey('rooms.id'), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    kind = Column(String(20), nullable=False)  # image, video, audio, document, file
+    url = Column(String(255), nullable=False)
+    name = Column(String(255), default='')
+    size = Column(Integer, default=0)
+    mime_type = Column(String(100), default='')
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    
+    # 关系
+    message = relationship(
+        'Message', back_populates='attachments',
+        primaryjoin='Message.id == foreign(Attachment.message_id)'
+    )
+    
+    def __init__(self, **kwargs):
+        """创建时分配ID，提交前即可序列化"""
+        kwargs.setdefault('id', generate_id())
+        super().__init__(**kwargs)
+    
+    # 房间媒体库按类型分页查询
+    __table_args__ = (
+        Index('ix_attachments_room_kind_id', 'room_id', 'kind', 'id'),
+    )
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'message_id': self.message_id,
+            'kind': self.kind,
+            'url': self.url,
+            'name': self.name,
+            'size': self.size,
+            'mime_type': self.mime_type,
+            'width': self.width,
+            'height': self.height
+        }
+    
+    def __repr__(self):
+        return f'<Attachment {self.kind} {self.url}>'
+
+class StoredFile(Base):
+    """上传文件模型（内容寻址，按SHA-256去重）"""
+    __tablename__ = "stored_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_key = Column(String(255), unique=True, nullable=False, index=True)  # 相对上传目录的路径
+    sha256 = Column(String(64), nullable=False, index=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    
+    @property
+    def url(self):
+        """文件访问URL"""
+        return f"/uploads/{self.file_key}"
+    
+    def __repr__(self):
+        return f'<StoredFile {self.file_key} refs={self.ref_count}>'
+
+class FileReference(Base):
+    """文件引用索引：记录上传、消息附件、头像对存储文件的引用
+
+    用于孤立文件回收和按用户/房间统计磁盘占用，避免扫描消息内容。
+    """
+    __tablename__ = "file_references"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    stored_file_id = Column(Integer, ForeignKey('stored_files.id', ondelete='CASCADE'), nullable=False, index=True)
+    kind = Column(String(20), nullable=False)  # upload, message, avatar
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    room_id = Column(Integer, ForeignKey('rooms.id'), nullable=True)
+    # 不设外键：消息归档后引用仍指向原消息ID，按消息统计占用不受归档影响
+    message_id = Column(BigInteger, nullable=True, index=True)
+    created_at = Column(DateTime, default=func.now())
+    
+    # 关系（保证与新消息同一事务提交时先插入消息）
+    message = relationship('Message', primaryjoin='Message.id == foreign(FileReference.message_id)')
+    
+    __table_args__ = (
+        Index('ix_file_references_user_kind', 'user_id', 'kind'),
+        Index('ix_file_references_room', 'room_id'),
+    )
+    
+    def __repr__(self):
+        return f'<FileReference {self.kind} file={self.stored_file_id}>'
+
+class UploadSession(Base):
+    """可续传上传会话模型"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String(32), primary_key=True)  # 随机会话ID，同时作为临时文件名
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    file_name = Column(String(255), nullable=False)
+    file_type = Column(String(20), nullable=False)  # 存储子目录：images、documents等
+    extension = Column(String(20), default='')
+    total_size = Column(Integer, nullable=False)
+    received_size = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'session_id': self.id,
+            'file_name': self.file_name,
+            'total_size': self.total_size,
+            'offset': self.received_size,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
     def __repr__(self):
-        return f'<Message {self.id}>'
\ No newline at end of file
+        return f'<UploadSession {self.id} {self.received_size}/{self.total_size}>'
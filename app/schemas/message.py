@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class MessageBase(BaseModel):
@@ -13,21 +13,44 @@ class MessageCreate(MessageBase):
     file_url: Optional[str] = Field(None, description="文件URL")
     file_name: Optional[str] = Field(None, description="文件名")
     file_size: Optional[int] = Field(None, description="文件大小")
+    nonce: Optional[str] = Field(None, max_length=64, description="客户端生成的唯一标识，重试时重复发送同一值不会产生重复消息")
 
-class MessageResponse(MessageBase):
-    """消息响应模式"""
+class AttachmentResponse(BaseModel):
+    """消息附件响应模式"""
+    id: int
+    message_id: int
+    kind: str
+    url: str
+    name: str = ""
+    size: int = 0
+    mime_type: str = ""
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+class CompactMessageResponse(MessageBase):
+    """紧凑消息响应模式（作者信息通过用户名片单独下发）"""
     id: int
     user_id: int
-    username: str
-    avatar_url: Optional[str] = None
     room_id: int
     timestamp: datetime
     edited_at: Optional[datetime] = None
     is_deleted: bool = False
+    attachments: List[AttachmentResponse] = []
     
     class Config:
         from_attributes = True
 
+class MessageResponse(CompactMessageResponse):
+    """消息响应模式"""
+    username: str
+    avatar_url: Optional[str] = None
+
+class UserCard(BaseModel):
+    """用户名片"""
+    id: int
+    username: str
+    avatar_url: Optional[str] = None
+
 class MessageUpdate(BaseModel):
     """消息更新模式"""
     content: str = Field(..., description="新的消息内容")
@@ -39,4 +62,33 @@ class MessageList(BaseModel):
     page: int = 1
     per_page: int = 50
     has_next: bool = False
-    has_prev: bool = False 
\ No newline at end of file
+    has_prev: bool = False
+    next_before_id: Optional[int] = None  # 加载更早消息的游标
+
+class CompactMessageList(BaseModel):
+    """紧凑消息列表模式（每个作者的名片只出现一次）"""
+    messages: List[CompactMessageResponse] = []
+    users: Dict[int, UserCard] = {}
+    total: int = 0
+    page: int = 1
+    per_page: int = 50
+    has_next: bool = False
+    has_prev: bool = False
+    next_before_id: Optional[int] = None  # 加载更早消息的游标
+
+class TombstoneResponse(BaseModel):
+    """已删除消息"""
+    id: int
+    room_id: int
+    deleted_at: datetime
+
+class TombstoneList(BaseModel):
+    """删除事件增量同步（按删除时间升序）"""
+    tombstones: List[TombstoneResponse] = []
+    has_more: bool = False
+    full_resync: bool = False  # since 早于墓碑保留期，客户端需要重新加载消息
+
+class MediaList(BaseModel):
+    """房间媒体列表模式（按附件ID倒序的游标分页）"""
+    items: List[AttachmentResponse] = []
+    next_before_id: Optional[int] = None
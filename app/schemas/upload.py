@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class UploadSessionCreate(BaseModel):
+    """可续传上传会话创建模式"""
+    file_name: str = Field(..., min_length=1, max_length=255, description="文件名")
+    file_size: int = Field(..., gt=0, description="文件总大小（字节）")
+
+class UploadSessionResponse(BaseModel):
+    """可续传上传会话响应模式"""
+    session_id: str
+    file_name: str
+    total_size: int
+    offset: int
+    chunk_size: int
+    expires_at: Optional[str] = None
+
+class PresignedUploadCreate(BaseModel):
+    """直传上传申请模式"""
+    file_name: str = Field(..., min_length=1, max_length=255, description="文件名")
+    file_size: int = Field(..., gt=0, description="文件大小（字节）")
+    sha256: str = Field(..., pattern=r'^[0-9a-f]{64}$', description="文件内容的SHA-256（小写十六进制）")
+
+class PresignedUploadComplete(BaseModel):
+    """直传上传完成确认模式"""
+    token: str = Field(..., description="申请直传时返回的令牌")
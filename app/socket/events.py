@@ -2,73 +2,150 @@
 # Socket.IO事件处理器
 
 import socketio
-import json
 import logging
-from typing import Dict, Set
+import time
+from typing import Dict, Optional, Set, Tuple
 
-from app.database import SessionLocal
+from app.database import SessionLocal, run_db
 from app.models import User, Room, Message, RoomMembership
 from app.core.deps import get_user_from_token
+from app.core.replicas import open_read_session, set_session_owner
+from app.core.attachments import add_attachment
+from app.core.files import FileNotOwnedError, get_uploaded_file
+from app.core.user_cards import RecentAuthors
+from app.core.nonces import reserve_nonce, release_nonce, PENDING_DETAIL, PENDING_RETRY_AFTER
+from app.core.health import SHED_CONNECTIONS, get_overload_reasons
+from app.core.profiler import QueryProfile, current_profile, finish_profile
+from app.config import settings
+from app.core.metrics import (
+    SOCKET_EVENT_DURATION, ROOM_FANOUT, MESSAGES, DbStats, GaugeFunc, current_db_stats, observe_db_stats
+)
 
-# 创建Socket.IO服务器
-sio = socketio.AsyncServer(
+class InstrumentedAsyncServer(socketio.AsyncServer):
+    """记录事件处理耗时和数据库统计的 Socket.IO 服务器"""
+    
+    async def _trigger_event(self, event, namespace, *args):
+        # 只为已注册的事件单独建立标签，客户端发送的任意事件名归入 <unknown>
+        label = event if event in self.handlers.get(namespace, ()) else '<unknown>'
+        start = time.perf_counter()
+        stats = DbStats()
+        token = current_db_stats.set(stats)
+        profile = QueryProfile(f'socket {label}') if settings.SQL_PROFILING else None
+        profile_token = current_profile.set(profile) if profile else None
+        try:
+            return await super()._trigger_event(event, namespace, *args)
+        finally:
+            current_db_stats.reset(token)
+            if profile:
+                current_profile.reset(profile_token)
+                finish_profile(profile)
+            SOCKET_EVENT_DURATION.observe(time.perf_counter() - start, (label,))
+            observe_db_stats('socket', stats)
+
+# 创建Socket.IO服务器（配置了消息代理时经 Redis 向其他进程/实例转发广播，需要 uv sync --extra redis）
+sio = InstrumentedAsyncServer(
     async_mode='asgi',
+    client_manager=socketio.AsyncRedisManager(settings.BROKER_URL) if settings.BROKER_URL else None,
     cors_allowed_origins="*",
-    logger=True,
-    engineio_logger=True
+    logger=settings.SOCKETIO_LOGGER,
+    engineio_logger=settings.ENGINEIO_LOGGER
 )
 
 # 全局变量来跟踪每个房间的输入状态
 typing_users: Dict[int, Set[str]] = {}
 
+# 紧凑模式下每个房间最近推送过名片的作者（容量有限，客户端缺少的名片按需获取）
+room_user_cards = RecentAuthors(settings.ROOM_CARD_CACHE_ROOMS, settings.ROOM_CARD_CACHE_SIZE)
+
+# 单次请求名片的最大用户数
+MAX_USER_CARDS_PER_REQUEST = 100
+
 logger = logging.getLogger(__name__)
 
+def count_room_connections(room) -> int:
+    """房间内的连接数"""
+    return len(sio.manager.rooms.get('/', {}).get(room, ()))
+
+GaugeFunc(
+    'chatroom_socket_connections', '当前进程的 Socket.IO 连接数',
+    lambda: [((), count_room_connections(None))]
+)
+
+def get_broadcast_room(room_id, compact: bool) -> str:
+    """消息广播子房间：紧凑模式与完整模式客户端分开推送"""
+    return f"{room_id}:{'compact' if compact else 'full'}"
+
+def set_online_by_token(token: str) -> Optional[Tuple[int, str]]:
+    """验证令牌并标记用户在线，返回 (用户ID, 用户名)，认证失败返回 None（在数据库线程中执行）"""
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(token, db)
+        if not user:
+            return None
+        # 提交前取出用户信息，提交后访问属性会重新查询
+        user_id, username = user.id, user.username
+        user.is_online = True
+        db.commit()
+        return user_id, username
+    finally:
+        db.close()
+
+def set_offline(user_id: int) -> None:
+    """标记用户离线（在数据库线程中执行）"""
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.id == user_id).update({User.is_online: False}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
 @sio.event
 async def connect(sid, environ, auth):
     """处理客户端连接"""
+    # 过载时在访问数据库前拒绝新连接，客户端稍后重连（负载均衡会把就绪检查失败的节点摘除）
+    overload = get_overload_reasons(count_room_connections(None) - 1)
+    if overload:
+        for reason in overload:
+            SHED_CONNECTIONS.inc(labels=(reason,))
+        logger.warning("负载过高（%s），拒绝连接 %s", ", ".join(overload), sid, extra={"category": "connect"})
+        raise socketio.exceptions.ConnectionRefusedError('服务器繁忙，请稍后重试')
+    
     try:
         # 从认证信息中获取用户
         token = auth.get('token') if auth else None
         if not token:
-            logger.warning(f"连接 {sid} 缺少认证令牌")
+            logger.warning("连接 %s 缺少认证令牌", sid, extra={"category": "connect"})
             await sio.disconnect(sid)
             return False
         
-        # 验证用户
-        db = SessionLocal()
-        try:
-            user = get_user_from_token(token, db)
-            if not user:
-                logger.warning(f"连接 {sid} 认证失败")
-                await sio.disconnect(sid)
-                return False
-            
-            # 更新用户在线状态
-            user.is_online = True
-            db.commit()
-            
-            # 保存用户会话信息
-            await sio.save_session(sid, {
-                'user_id': user.id,
-                'username': user.username,
-                'token': token
-            })
-            
-            # 广播用户上线状态
-            await sio.emit('user_status_update', {
-                'user_id': user.id,
-                'username': user.username,
-                'is_online': True
-            })
-            
-            logger.info(f"用户 {user.username} (ID: {user.id}) 已连接到 Socket.IO")
-            return True
-            
-        finally:
-            db.close()
+        # 验证用户并更新在线状态：写操作在数据库线程中执行，等待写连接时不阻塞事件循环
+        user = await run_db(set_online_by_token, token)
+        if not user:
+            logger.warning("连接 %s 认证失败", sid, extra={"category": "connect"})
+            await sio.disconnect(sid)
+            return False
+        user_id, username = user
+        
+        # 保存用户会话信息（compact: 消息只含作者ID，作者信息通过用户名片下发）
+        await sio.save_session(sid, {
+            'user_id': user_id,
+            'username': username,
+            'token': token,
+            'compact': bool(auth.get('compact'))
+        })
+        
+        # 广播用户上线状态
+        await sio.emit('user_status_update', {
+            'user_id': user_id,
+            'username': username,
+            'is_online': True
+        })
+        
+        logger.info("用户 %s (ID: %s) 已连接到 Socket.IO", username, user_id, extra={"category": "connect", "user_id": user_id})
+        return True
         
     except Exception as e:
-        logger.error(f"连接处理错误: {e}")
+        logger.error("连接处理错误: %s", e, extra={"category": "connect"})
         await sio.disconnect(sid)
         return False
 
@@ -82,40 +159,32 @@ async def disconnect(sid):
         
         if user_id:
             # 更新用户离线状态
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_id).first()
-                if user:
-                    user.is_online = False
-                    db.commit()
-                
-                # 清理用户的输入状态
-                for room_id in list(typing_users.keys()):
-                    if username in typing_users[room_id]:
-                        typing_users[room_id].discard(username)
-                        if not typing_users[room_id]:
-                            del typing_users[room_id]
-                        else:
-                            # 通知房间内其他用户更新输入状态
-                            await sio.emit('typing_update', {
-                                'room_id': room_id,
-                                'typing_users': list(typing_users[room_id])
-                            }, room=str(room_id))
-                
-                # 广播用户离线状态
-                await sio.emit('user_status_update', {
-                    'user_id': user_id,
-                    'username': username,
-                    'is_online': False
-                })
-                
-                logger.info(f"用户 {username} (ID: {user_id}) 已断开连接")
-                
-            finally:
-                db.close()
+            await run_db(set_offline, user_id)
+            
+            # 清理用户的输入状态
+            for room_id in list(typing_users.keys()):
+                if username in typing_users[room_id]:
+                    typing_users[room_id].discard(username)
+                    if not typing_users[room_id]:
+                        del typing_users[room_id]
+                    else:
+                        # 通知房间内其他用户更新输入状态
+                        await sio.emit('typing_update', {
+                            'room_id': room_id,
+                            'typing_users': list(typing_users[room_id])
+                        }, room=str(room_id))
+            
+            # 广播用户离线状态
+            await sio.emit('user_status_update', {
+                'user_id': user_id,
+                'username': username,
+                'is_online': False
+            })
+            
+            logger.info("用户 %s (ID: %s) 已断开连接", username, user_id, extra={"category": "disconnect", "user_id": user_id})
             
     except Exception as e:
-        logger.error(f"断开连接处理错误: {e}")
+        logger.error("断开连接处理错误: %s", e, extra={"category": "disconnect"})
 
 @sio.event
 async def join_room(sid, data):
@@ -129,55 +198,69 @@ async def join_room(sid, data):
             await sio.emit('error', {'message': '无效的请求参数'}, room=sid)
             return
         
+        # 查询在会话关闭后再等待发送，避免等待期间占用数据库连接
+        error = None
+        compact = session.get('compact', False)
         db = SessionLocal()
         try:
             room = db.query(Room).filter(Room.id == room_id).first()
             user = db.query(User).filter(User.id == user_id).first()
             
             if not room or not user:
-                await sio.emit('error', {'message': '房间或用户不存在'}, room=sid)
-                return
-            
+                error = '房间或用户不存在'
             # 检查权限
-            if room.is_private and not room.is_member(user, db):
-                await sio.emit('error', {'message': '无权限加入此房间'}, room=sid)
-                return
-            
-            # 加入Socket.IO房间
-            await sio.enter_room(sid, str(room_id))
-            
-            # 获取房间在线成员
-            online_members = room.get_online_members(db)
-            online_members_data = []
-            for member in online_members:
-                online_members_data.append({
-                    'id': member.id,
-                    'username': member.username,
-                    'avatar_url': member.avatar_url
-                })
-            
-            # 通知用户成功加入房间
-            await sio.emit('room_joined', {
-                'room_id': room.id,
-                'room_name': room.name,
-                'member_count': len(room.get_members(db)),
-                'online_members': online_members_data
-            }, room=sid)
-            
-            # 通知房间内其他用户有新用户加入
-            await sio.emit('user_joined', {
-                'user_id': user_id,
-                'username': user.username,
-                'room_id': room_id
-            }, room=str(room_id), skip_sid=sid)
-            
-            logger.info(f"用户 {user.username} 加入房间 {room.name}")
-            
+            elif room.is_private and not room.is_member(user, db):
+                error = '无权限加入此房间'
+            else:
+                # 获取房间在线成员
+                online_members = room.get_online_members(db)
+                online_members_data = []
+                for member in online_members:
+                    online_members_data.append({
+                        'id': member.id,
+                        'username': member.username,
+                        'avatar_url': member.avatar_url
+                    })
+                
+                joined_data = {
+                    'room_id': room.id,
+                    'room_name': room.name,
+                    'member_count': len(room.get_members(db)),
+                    'online_members': online_members_data
+                }
+                
+                # 紧凑模式：一次性下发在线成员及已推送过名片的作者名片
+                if compact:
+                    card_user_ids = set(room_user_cards.get(room.id)) | {member.id for member in online_members}
+                    card_users = db.query(User).filter(User.id.in_(card_user_ids)).all()
+                    joined_data['user_cards'] = [card_user.to_card() for card_user in card_users]
+                
+                username, room_name = user.username, room.name
         finally:
             db.close()
         
+        if error:
+            await sio.emit('error', {'message': error}, room=sid)
+            return
+        
+        # 加入Socket.IO房间及对应的消息广播子房间
+        await sio.enter_room(sid, str(room_id))
+        await sio.enter_room(sid, get_broadcast_room(room_id, compact))
+        
+        # 通知用户成功加入房间
+        await sio.emit('room_joined', joined_data, room=sid)
+        
+        # 通知房间内其他用户有新用户加入
+        await sio.emit('user_joined', {
+            'user_id': user_id,
+            'username': username,
+            'room_id': room_id
+        }, room=str(room_id), skip_sid=sid)
+        
+        logger.info("用户 %s 加入房间 %s", username, room_name, extra={"category": "join_room", "room_id": room_id})
+        
     except Exception as e:
-        logger.error(f"加入房间错误: {e}")
+        logger.error("加入房间错误: %s", e, extra={"category": "join_room"})
         await sio.emit('error', {'message': '加入房间失败'}, room=sid)
 
 @sio.event
@@ -192,8 +275,9 @@ async def leave_room(sid, data):
         if not user_id or not room_id:
             return
         
-        # 离开Socket.IO房间
+        # 离开Socket.IO房间及消息广播子房间
         await sio.leave_room(sid, str(room_id))
+        await sio.leave_room(sid, get_broadcast_room(room_id, session.get('compact', False)))
         
         # 通知房间内其他用户有用户离开
         await sio.emit('user_left', {
@@ -202,10 +286,77 @@ async def leave_room(sid, data):
             'room_id': room_id
         }, room=str(room_id), skip_sid=sid)
         
-        logger.info(f"用户 {username} 离开房间 {room_id}")
+        logger.info("用户 %s 离开房间 %s", username, room_id, extra={"category": "leave_room", "room_id": room_id})
         
     except Exception as e:
-        logger.error(f"离开房间错误: {e}")
+        logger.error("离开房间错误: %s", e, extra={"category": "leave_room"})
+
+def persist_message(user_id, room_id, content, message_type, file_url, file_name, file_size, nonce, compact):
+    """校验并写入消息（在数据库线程池中执行，不阻塞事件循环）
+
+    返回 {'error': 错误信息}、{'duplicate': 原消息或None}，或写入成功时的消息数据。
+    """
+    db = SessionLocal()
+    try:
+        room = db.query(Room).filter(Room.id == room_id).first()
+        user = db.query(User).filter(User.id == user_id).first()
+        
+        if not room or not user:
+            return {'error': '房间或用户不存在'}
+        set_session_owner(db, user.username)
+        
+        # 检查权限
+        if room.is_private and not room.is_member(user, db):
+            return {'error': '无权限在此房间发送消息'}
+        
+        # 检查消息长度
+        if len(content) > 1000:
+            return {'error': '消息内容不能超过1000个字符'}
+        
+        # 附件只能引用自己上传的文件（登记去重前校验，校验失败不占用nonce）
+        stored_file = None
+        if message_type in ['file', 'image'] and file_url:
+            try:
+                stored_file = get_uploaded_file(db, file_url, user.id)
+            except FileNotOwnedError:
+                return {'error': '附件文件不存在或不属于当前用户'}
+        
+        # 创建消息（文件消息的内容为附件说明，文件信息存入附件表）
+        message = Message(
+            content=content,
+            message_type=message_type,
+            user_id=user.id,
+            author=user,
+            room_id=room.id
+        )
+        
+        # 客户端重试：同一nonce已创建过消息时只返回原消息，不再写入
+        existing_id = reserve_nonce(user_id, nonce, message.id)
+        if existing_id is not None:
+            original = db.query(Message).filter(Message.id == existing_id).first()
+            return {'duplicate': original.to_dict(compact=compact) if original else None}
+        
+        db.add(message)
+        if message_type in ['file', 'image'] and file_url:
+            add_attachment(db, message, file_url, file_name, file_size, stored_file)
+        
+        # ID和时间戳由应用生成，提交前即可序列化，提交后无需再刷新
+        result = {
+            'message': message.to_dict(),
+            'compact': message.to_dict(compact=True),
+            'user_card': user.to_card(),
+            'room_name': room.name
+        }
+        try:
+            db.commit()
+        except Exception:
+            db.rollback()
+            release_nonce(user_id, nonce)
+            raise
+        return result
+        
+    finally:
+        db.close()
 
 @sio.event
 async def send_message(sid, data):
@@ -219,8 +370,9 @@ async def send_message(sid, data):
         file_url = data.get('file_url', '')
         file_name = data.get('file_name', '')
         file_size = data.get('file_size', 0)
+        nonce = data.get('nonce')
         
-        if not user_id or not room_id:
+        if not user_id or not room_id or (nonce is not None and (not isinstance(nonce, str) or len(nonce) > 64)):
             await sio.emit('error', {'message': '无效的请求参数'}, room=sid)
             return
         
@@ -229,59 +381,49 @@ async def send_message(sid, data):
             await sio.emit('error', {'message': '消息内容不能为空'}, room=sid)
             return
         
-        db = SessionLocal()
-        try:
-            room = db.query(Room).filter(Room.id == room_id).first()
-            user = db.query(User).filter(User.id == user_id).first()
-            
-            if not room or not user:
-                await sio.emit('error', {'message': '房间或用户不存在'}, room=sid)
-                return
-            
-            # 检查权限
-            if room.is_private and not room.is_member(user, db):
-                await sio.emit('error', {'message': '无权限在此房间发送消息'}, room=sid)
-                return
-            
-            # 检查消息长度
-            if len(content) > 1000:
-                await sio.emit('error', {'message': '消息内容不能超过1000个字符'}, room=sid)
-                return
-            
-            # 处理文件消息
-            if message_type in ['file', 'image'] and file_url:
-                file_info = {
-                    'url': file_url,
-                    'name': file_name,
-                    'size': file_size,
-                    'description': content
-                }
-                content = json.dumps(file_info, ensure_ascii=False)
-            
-            # 创建消息
-            message = Message(
-                content=content,
-                message_type=message_type,
-                user_id=user_id,
-                room_id=room_id
-            )
-            db.add(message)
-            db.commit()
-            db.refresh(message)
-            
-            # 构建消息数据
-            message_data = message.to_dict()
-            
-            # 广播消息到房间内所有用户
-            await sio.emit('new_message', message_data, room=str(room_id))
-            
-            logger.info(f"用户 {user.username} 在房间 {room.name} 发送消息")
-            
-        finally:
-            db.close()
+        result = await run_db(
+            persist_message, user_id, room_id, content, message_type,
+            file_url, file_name, file_size, nonce, session.get('compact', False)
+        )
+        
+        if 'error' in result:
+            await sio.emit('error', {'message': result['error']}, room=sid)
+            return
+        
+        if 'duplicate' in result:
+            if result['duplicate']:
+                await sio.emit('message_ack', {'nonce': nonce, 'message': result['duplicate']}, room=sid)
+            else:
+                # 原消息仍在写入：与 REST 接口一致，提示客户端稍后重试
+                await sio.emit('message_ack', {
+                    'nonce': nonce, 'pending': True, 'retry_after': PENDING_RETRY_AFTER, 'detail': PENDING_DETAIL
+                }, room=sid)
+            return
+        
+        message_data = result['message']
+        user_card = result['user_card']
+        
+        # 新作者首次发言时先向紧凑客户端推送名片
+        if room_user_cards.touch(room_id, user_id):
+            await sio.emit('user_card', user_card, room=get_broadcast_room(room_id, True))
+        
+        # 广播消息到房间内所有用户
+        MESSAGES.inc(labels=('socket',))
+        ROOM_FANOUT.observe(count_room_connections(str(room_id)))
+        await sio.emit('new_message', message_data, room=get_broadcast_room(room_id, False))
+        await sio.emit('new_message', result['compact'], room=get_broadcast_room(room_id, True))
+        
+        # 携带nonce的消息向发送者确认，客户端据此停止重试
+        if nonce:
+            await sio.emit('message_ack', {'nonce': nonce, 'id': message_data['id']}, room=sid)
+        
+        logger.info(
+            "用户 %s 在房间 %s 发送消息", user_card['username'], result['room_name'],
+            extra={"category": "send_message", "room_id": room_id, "message_id": message_data['id']}
+        )
         
     except Exception as e:
-        logger.error(f"发送消息错误: {e}")
+        logger.error("发送消息错误: %s", e, extra={"category": "send_message"})
         await sio.emit('error', {'message': '发送消息失败'}, room=sid)
 
 @sio.event
@@ -307,7 +449,7 @@ async def typing_start(sid, data):
         }, room=str(room_id), skip_sid=sid)
         
     except Exception as e:
-        logger.error(f"开始输入处理错误: {e}")
+        logger.error("开始输入处理错误: %s", e, extra={"category": "typing"})
 
 @sio.event
 async def typing_stop(sid, data):
@@ -334,7 +476,7 @@ async def typing_stop(sid, data):
         }, room=str(room_id), skip_sid=sid)
         
     except Exception as e:
-        logger.error(f"停止输入处理错误: {e}")
+        logger.error("停止输入处理错误: %s", e, extra={"category": "typing"})
 
 @sio.event
 async def get_online_users(sid, data):
@@ -344,7 +486,8 @@ async def get_online_users(sid, data):
         if not room_id:
             return
         
-        db = SessionLocal()
+        session = await sio.get_session(sid)
+        db = open_read_session(session.get('username'))
         try:
             room = db.query(Room).filter(Room.id == room_id).first()
             if not room:
@@ -358,17 +501,16 @@ async def get_online_users(sid, data):
                     'username': member.username,
                     'avatar_url': member.avatar_url
                 })
-            
-            await sio.emit('online_users_update', {
-                'room_id': room_id,
-                'online_users': online_users_data
-            }, room=sid)
-            
         finally:
             db.close()
         
+        await sio.emit('online_users_update', {
+            'room_id': room_id,
+            'online_users': online_users_data
+        }, room=sid)
+        
     except Exception as e:
-        logger.error(f"获取在线用户错误: {e}")
+        logger.error("获取在线用户错误: %s", e)
 
 @sio.event
 async def ping(sid):
@@ -392,5 +534,30 @@ async def avatar_updated(sid, data):
                 'avatar_url': avatar_url
             })
             
+            # 向持有该用户名片的紧凑客户端推送新名片
+            card = {'id': user_id, 'username': username, 'avatar_url': avatar_url}
+            for room_id in room_user_cards.rooms_with(user_id):
+                await sio.emit('user_card', card, room=get_broadcast_room(room_id, True))
+            
+    except Exception as e:
+        logger.error("头像更新通知错误: %s", e) 
+
+@sio.event
+async def get_user_cards(sid, data):
+    """按用户ID批量获取名片（紧凑模式客户端遇到未知作者时使用）"""
+    try:
+        user_ids = data.get('user_ids') if data else None
+        if not isinstance(user_ids, list) or not user_ids:
+            return
+        
+        user_ids = [user_id for user_id in user_ids if isinstance(user_id, int)][:MAX_USER_CARDS_PER_REQUEST]
+        db = SessionLocal()
+        try:
+            cards = [user.to_card() for user in db.query(User).filter(User.id.in_(user_ids))]
+        finally:
+            db.close()
+        
+        await sio.emit('user_cards', {'users': cards}, room=sid)
+        
     except Exception as e:
-        logger.error(f"头像更新通知错误: {e}") 
\ No newline at end of file
+        logger.error("获取用户名片错误: %s", e)
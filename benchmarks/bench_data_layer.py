@@ -0,0 +1,122 @@
+# benchmarks/bench_data_layer.py
+# 数据层基准：模型序列化、消息分页（不同深度）、房间列表、成员检查和历史消息 JSON 编码
+#
+# 用法：uv run --extra bench pytest benchmarks/bench_data_layer.py --benchmark-autosave
+#       BENCH_DATABASE_URL=sqlite:///instance/bench.db uv run --extra bench pytest benchmarks/bench_data_layer.py
+#       对比两次结果：pytest benchmarks/bench_data_layer.py --benchmark-compare
+# 接口函数直接调用（不经过 HTTP），每次调用使用新的会话，与请求的会话生命周期一致。
+
+import json
+
+import pytest
+from sqlalchemy.orm import joinedload
+
+from app.api.messages import get_messages
+from app.api.rooms import get_rooms
+from app.models import Message, Room, User
+
+PER_PAGE = 50
+
+
+@pytest.fixture(scope="module")
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="module")
+def page_messages(db, samples):
+    """最大房间最新一页消息（已加载作者）"""
+    return db.query(Message).options(joinedload(Message.author)).filter(
+        Message.room_id == samples["big_room_id"]
+    ).order_by(Message.id.desc()).limit(PER_PAGE).all()
+
+
+@pytest.mark.benchmark(group="to_dict")
+@pytest.mark.parametrize("compact", [False, True], ids=["full", "compact"])
+def test_message_to_dict(benchmark, page_messages, compact):
+    benchmark(lambda: [message.to_dict(compact=compact) for message in page_messages])
+
+
+@pytest.mark.benchmark(group="to_dict")
+@pytest.mark.parametrize("room_key", ["big_room_id", "median_room_id"], ids=["big_room", "median_room"])
+def test_room_to_dict(benchmark, db, samples, room_key):
+    room = db.get(Room, samples[room_key])
+
+    def run_to_dict():
+        # 过期实例，使成员关系和在线成员每轮都重新查询（与请求内首次访问一致）
+        db.expire(room)
+        return room.to_dict(db)
+
+    benchmark(run_to_dict)
+
+
+def call_get_messages(session_factory, run, samples, page=1, compact=False, before_id=None):
+    db = session_factory()
+    try:
+        user = db.get(User, samples["big_room_member_id"])
+        return run(get_messages(
+            samples["big_room_id"], page=page, per_page=PER_PAGE, compact=compact,
+            before_id=before_id, current_user=user, db=db
+        ))
+    finally:
+        db.close()
+
+
+@pytest.mark.benchmark(group="get_messages")
+@pytest.mark.parametrize("depth", ["latest", "page_20", "page_200", "page_deep", "cursor_deep"])
+@pytest.mark.parametrize("compact", [False, True], ids=["full", "compact"])
+def test_get_messages(benchmark, session_factory, run, samples, depth, compact):
+    deepest_page = max(1, samples["big_room_messages"] * 9 // 10 // PER_PAGE)
+    kwargs = {
+        "latest": {},
+        "page_20": {"page": 20},
+        "page_200": {"page": 200},
+        # 与 cursor_deep 相同深度的 OFFSET 分页，对比两种分页方式
+        "page_deep": {"page": deepest_page},
+        "cursor_deep": {"before_id": samples["deep_cursor"]},
+    }[depth]
+    page = kwargs.get("page", 1)
+    if (page - 1) * PER_PAGE >= samples["big_room_messages"]:
+        pytest.skip(f"最大房间只有 {samples['big_room_messages']} 条消息，不足第 {page} 页")
+    result = benchmark(call_get_messages, session_factory, run, samples, compact=compact, **kwargs)
+    assert result.messages
+
+
+@pytest.mark.benchmark(group="get_rooms")
+def test_get_rooms(benchmark, session_factory, run, samples):
+    def call():
+        db = session_factory()
+        try:
+            return run(get_rooms(current_user=db.get(User, samples["busiest_user_id"]), db=db))
+        finally:
+            db.close()
+
+    result = benchmark(call)
+    assert result.user_rooms
+
+
+@pytest.mark.benchmark(group="is_member")
+@pytest.mark.parametrize("member", [True, False], ids=["member", "non_member"])
+def test_is_member(benchmark, db, samples, member):
+    room = db.get(Room, samples["big_room_id"])
+    if member:
+        user = db.get(User, samples["big_room_member_id"])
+    else:
+        user = db.query(User).filter(~User.room_memberships.any(room_id=room.id)).first()
+    assert benchmark(room.is_member, user, db) is member
+
+
+@pytest.mark.benchmark(group="json")
+@pytest.mark.parametrize("compact", [False, True], ids=["full", "compact"])
+@pytest.mark.parametrize("encoder", ["model_dump_json", "json_dumps"])
+def test_history_page_json(benchmark, session_factory, run, samples, compact, encoder):
+    page = call_get_messages(session_factory, run, samples, compact=compact)
+    if encoder == "model_dump_json":
+        encode = page.model_dump_json
+    else:
+        # FastAPI 默认路径：先转换为 JSON 兼容的 Python 对象，再由 json.dumps 编码
+        def encode():
+            return json.dumps(page.model_dump(mode="json"), ensure_ascii=False)
+    assert benchmark(encode)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# benchmarks/bench_image_derivatives.py
+# 派生图生成基准：事件循环内联执行 vs 进程池执行
+#
+# 用法：uv run python benchmarks/bench_image_derivatives.py --images 40 --workers 4
+# 输出每种模式的吞吐量（张/秒）以及期间事件循环的最大停顿时间。
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import multiprocessing
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.images import generate_derivatives  # noqa: E402
+
+SIZES = [64, 128, 256, 320, 1280]
+
+
+def make_sources(directory: Path, count: int, width: int, height: int):
+    """生成带噪点的测试图片（纯色图压缩过快，不具代表性）"""
+    from PIL import Image
+
+    sources = []
+    for i in range(count):
+        path = directory / f"src_{i}.jpg"
+        Image.effect_noise((width, height), 64 + i % 32).convert("RGB").save(path, quality=90)
+        sources.append(path)
+    return sources
+
+
+def warmup():
+    """预热工作进程：导入 Pillow"""
+    import PIL.Image  # noqa: F401
+    time.sleep(0.1)
+
+
+def targets_for(source: Path, mode: str):
+    return {size: str(source.with_name(f"{source.stem}_{mode}_{size}.webp")) for size in SIZES}
+
+
+async def measure_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    """采样事件循环延迟"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def run_inline(sources):
+    for source in sources:
+        generate_derivatives(str(source), targets_for(source, "inline"), "webp", 80)
+
+
+async def run_pool(sources, executor):
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[
+        loop.run_in_executor(executor, generate_derivatives, str(source), targets_for(source, "pool"), "webp", 80)
+        for source in sources
+    ])
+
+
+async def bench(name, coro_factory, count):
+    stop = asyncio.Event()
+    lags = []
+    sampler = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await coro_factory()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    max_lag = max(lags) * 1000 if lags else float("nan")
+    print(f"{name:<8} {count / elapsed:8.1f} 张/秒   耗时 {elapsed:6.2f}s   事件循环最大停顿 {max_lag:8.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="派生图生成吞吐量基准")
+    parser.add_argument("--images", type=int, default=24, help="测试图片数量")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="进程池大小")
+    parser.add_argument("--width", type=int, default=2400)
+    parser.add_argument("--height", type=int, default=1600)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = make_sources(Path(tmp), args.images, args.width, args.height)
+        print(f"{args.images} 张 {args.width}x{args.height} 图片，每张生成尺寸 {SIZES}，进程数 {args.workers}")
+
+        await bench("inline", lambda: run_inline(sources), args.images)
+
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            # 预热：进程启动开销不计入
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(executor, warmup) for _ in range(args.workers)])
+            await bench("pool", lambda: run_pool(sources, executor), args.images)
+        finally:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
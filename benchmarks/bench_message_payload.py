@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# benchmarks/bench_message_payload.py
+# 消息负载基准：完整模式（每条消息内嵌作者信息）vs 紧凑模式（用户名片单独下发）
+#
+# 用法：uv run python benchmarks/bench_message_payload.py --messages 50 --authors 5
+# 输出一页历史消息（REST）和同样消息经 Socket.IO 推送时的字节数，以及每页 SQL 查询数。
+
+import argparse
+import gzip
+import json
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, joinedload
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import Base  # noqa: E402
+from app.models import User, Room, Message  # noqa: E402
+from app.schemas.message import (  # noqa: E402
+    MessageResponse, MessageList, CompactMessageResponse, CompactMessageList, UserCard
+)
+
+
+def seed(db, message_count: int, author_count: int) -> int:
+    """生成测试房间和消息，返回房间ID"""
+    authors = []
+    for i in range(author_count):
+        user = User(username=f"user_{i:03d}", email=f"user_{i}@example.com", password_hash="x",
+                    avatar_url=f"/uploads/avatars/{'%064x' % (i + 1)}.png")
+        db.add(user)
+        authors.append(user)
+    db.flush()
+    room = Room(name="bench", created_by=authors[0].id)
+    db.add(room)
+    db.flush()
+    for i in range(message_count):
+        db.add(Message(content=f"第 {i} 条测试消息，长度接近普通聊天内容", message_type="text",
+                       user_id=authors[i % author_count].id, room_id=room.id))
+    db.commit()
+    return room.id
+
+
+def encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def socket_frame(event_name: str, data) -> bytes:
+    """Socket.IO 事件帧（42["event",data]）"""
+    return b"42" + encode([event_name, data])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="消息负载字节数基准")
+    parser.add_argument("--messages", type=int, default=50, help="每页消息数")
+    parser.add_argument("--authors", type=int, default=5, help="作者数量")
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    query_count = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(*_):
+        query_count[0] += 1
+
+    db = Session()
+    room_id = seed(db, args.messages, args.authors)
+    db.close()
+
+    def load_page(options=None):
+        db = Session()
+        query = db.query(Message).filter(Message.room_id == room_id).order_by(Message.id)
+        if options is not None:
+            query = query.options(options)
+        return db, query.limit(args.messages).all()
+
+    # 完整模式（逐条懒加载作者，改进前的行为）
+    query_count[0] = 0
+    db, messages = load_page()
+    full_page = MessageList(messages=[MessageResponse(**m.to_dict()) for m in messages], total=len(messages))
+    full_queries = query_count[0]
+    full_frames = [socket_frame("new_message", m.to_dict()) for m in messages]
+    db.close()
+
+    # 完整模式 + joinedload
+    query_count[0] = 0
+    db, messages = load_page(joinedload(Message.author))
+    [m.to_dict() for m in messages]
+    joined_queries = query_count[0]
+    db.close()
+
+    # 紧凑模式
+    query_count[0] = 0
+    db, messages = load_page()
+    author_ids = {m.user_id for m in messages}
+    authors = db.query(User).filter(User.id.in_(author_ids)).all()
+    compact_page = CompactMessageList(
+        messages=[CompactMessageResponse(**m.to_dict(compact=True)) for m in messages],
+        users={a.id: UserCard(**a.to_card()) for a in authors},
+        total=len(messages)
+    )
+    compact_queries = query_count[0]
+    cards = {a.id: a.to_card() for a in authors}
+    compact_frames = []
+    seen = set()
+    for m in messages:
+        if m.user_id not in seen:
+            seen.add(m.user_id)
+            compact_frames.append(socket_frame("user_card", cards[m.user_id]))
+        compact_frames.append(socket_frame("new_message", m.to_dict(compact=True)))
+    db.close()
+
+    full_rest = full_page.model_dump_json().encode()
+    compact_rest = compact_page.model_dump_json().encode()
+    full_socket = sum(len(f) for f in full_frames)
+    compact_socket = sum(len(f) for f in compact_frames)
+
+    def ratio(after, before):
+        return f"{(1 - after / before) * 100:.1f}%"
+
+    print(f"{args.messages} 条消息 / {args.authors} 位作者")
+    print(f"{'':<18}{'完整模式':>12}{'紧凑模式':>12}{'节省':>10}")
+    print(f"{'REST 页(字节)':<18}{len(full_rest):>12}{len(compact_rest):>12}{ratio(len(compact_rest), len(full_rest)):>10}")
+    print(f"{'REST 页(gzip)':<18}{len(gzip.compress(full_rest)):>12}{len(gzip.compress(compact_rest)):>12}"
+          f"{ratio(len(gzip.compress(compact_rest)), len(gzip.compress(full_rest))):>10}")
+    print(f"{'Socket 推送(字节)':<18}{full_socket:>12}{compact_socket:>12}{ratio(compact_socket, full_socket):>10}")
+    print(f"{'SQL 查询数':<18}{full_queries:>12}{compact_queries:>12}")
+    print(f"完整模式使用 joinedload 后的查询数：{joined_queries}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# benchmarks/bench_sqlite_concurrency.py
+# SQLite 并发发送基准：默认引擎 vs 高并发模式（WAL + PRAGMA + 单一写连接 + 读连接池）
+#
+# 用法：uv run python benchmarks/bench_sqlite_concurrency.py --processes 4 --threads 4 --sends 200
+# 模拟多个工作进程同时发送消息（读用户和房间、写入消息、提交），同时有读线程持续分页查询历史消息，
+# 输出每种模式的发送吞吐量、锁错误数以及发送和读取延迟。
+
+import argparse
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, desc  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base, RoutingSession, create_sqlite_engines  # noqa: E402
+from app.models import User, Room, Message  # noqa: E402
+
+
+def make_session_factory(url: str, mode: str):
+    if mode == "default":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        return sessionmaker(bind=engine, autoflush=False)
+    write_engine, read_engine = create_sqlite_engines(url)
+    return sessionmaker(class_=RoutingSession, write_engine=write_engine, read_engine=read_engine, autoflush=False)
+
+
+def seed(url: str) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    user = User(username="bench", email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    db.add(Room(name="bench", created_by=user.id))
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def sender(Session, sends: int, latencies: list, errors: list) -> None:
+    for i in range(sends):
+        start = time.perf_counter()
+        db = Session()
+        try:
+            user = db.query(User).filter(User.username == "bench").first()
+            room = db.query(Room).filter(Room.name == "bench").first()
+            db.add(Message(content=f"消息 {i}", user_id=user.id, room_id=room.id))
+            db.commit()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            db.rollback()
+            errors.append(1)
+        finally:
+            db.close()
+
+
+def reader(Session, stop: threading.Event, latencies: list, errors: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        db = Session()
+        try:
+            db.query(Message).order_by(desc(Message.id)).limit(50).all()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors.append(1)
+        finally:
+            db.close()
+
+
+def run_worker(args):
+    """单个工作进程：若干发送线程 + 一个读线程"""
+    url, mode, threads, sends = args
+    Session = make_session_factory(url, mode)
+    send_latencies, send_errors, read_latencies, read_errors = [], [], [], []
+    stop = threading.Event()
+    read_thread = threading.Thread(target=reader, args=(Session, stop, read_latencies, read_errors))
+    read_thread.start()
+    workers = [threading.Thread(target=sender, args=(Session, sends, send_latencies, send_errors)) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    stop.set()
+    read_thread.join()
+    return send_latencies, len(send_errors), read_latencies, len(read_errors)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_mode(mode: str, processes: int, threads: int, sends: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/bench.db"
+        seed(url)
+        ctx = multiprocessing.get_context("spawn")
+        start = time.perf_counter()
+        with ctx.Pool(processes) as pool:
+            results = pool.map(run_worker, [(url, mode, threads, sends)] * processes)
+        elapsed = time.perf_counter() - start
+
+    send_latencies = [x for r in results for x in r[0]]
+    read_latencies = [x for r in results for x in r[2]]
+    return {
+        "mode": mode,
+        "sends_per_sec": len(send_latencies) / elapsed,
+        "send_errors": sum(r[1] for r in results),
+        "send_p50_ms": statistics.median(send_latencies) * 1000 if send_latencies else 0.0,
+        "send_p99_ms": percentile(send_latencies, 99) * 1000,
+        "reads": len(read_latencies),
+        "read_errors": sum(r[3] for r in results),
+        "read_p99_ms": percentile(read_latencies, 99) * 1000,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SQLite 并发发送基准")
+    parser.add_argument("--processes", type=int, default=4, help="工作进程数")
+    parser.add_argument("--threads", type=int, default=4, help="每个进程的发送线程数")
+    parser.add_argument("--sends", type=int, default=200, help="每个线程发送的消息数")
+    args = parser.parse_args()
+
+    print(f"{args.processes} 进程 x {args.threads} 线程 x {args.sends} 条消息，每进程 1 个读线程")
+    print(f"{'模式':<12}{'发送/秒':>10}{'锁错误':>8}{'p50(ms)':>10}{'p99(ms)':>10}{'读取次数':>10}{'读错误':>8}{'读p99(ms)':>11}")
+    for mode in ("default", "performance"):
+        r = run_mode(mode, args.processes, args.threads, args.sends)
+        print(f"{r['mode']:<12}{r['sends_per_sec']:>10.0f}{r['send_errors']:>8}{r['send_p50_ms']:>10.1f}"
+              f"{r['send_p99_ms']:>10.1f}{r['reads']:>10}{r['read_errors']:>8}{r['read_p99_ms']:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
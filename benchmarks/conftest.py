@@ -0,0 +1,87 @@
+# benchmarks/conftest.py
+# 数据层基准的公共夹具
+#
+# 数据集：设置 BENCH_DATABASE_URL 时使用已生成的库（见 generate_dataset.py），
+# 否则在临时目录生成 BENCH_SCALE 规模（默认 small）的 SQLite 数据集。
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import RoutingSession, create_server_engine, create_sqlite_engines, is_sqlite_file  # noqa: E402
+from app.models import Message, RoomMembership  # noqa: E402
+from generate_dataset import SCALES, generate  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def dataset_url(tmp_path_factory):
+    url = os.getenv("BENCH_DATABASE_URL")
+    if url:
+        return url
+    users, rooms, messages = SCALES[os.getenv("BENCH_SCALE", "small")]
+    url = f"sqlite:///{tmp_path_factory.mktemp('bench') / 'bench.db'}"
+    generate(url, users=users, rooms=rooms, messages=messages)
+    return url
+
+
+@pytest.fixture(scope="session")
+def session_factory(dataset_url):
+    """与应用相同的引擎配置（SQLite 读写分离 / 服务端数据库连接池）"""
+    if is_sqlite_file(dataset_url):
+        write_engine, read_engine = create_sqlite_engines(dataset_url)
+        factory = sessionmaker(class_=RoutingSession, write_engine=write_engine, read_engine=read_engine, autoflush=False)
+        yield factory
+        write_engine.dispose()
+        read_engine.dispose()
+    else:
+        engine = create_server_engine(dataset_url)
+        yield sessionmaker(bind=engine, autoflush=False)
+        engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def samples(session_factory):
+    """基准使用的样本：最大房间、中位房间、加入房间最多的用户和深分页游标"""
+    db = session_factory()
+    try:
+        room_sizes = db.query(Message.room_id, func.count(Message.id)).group_by(Message.room_id).order_by(
+            func.count(Message.id).desc()
+        ).all()
+        big_room_id, big_room_messages = room_sizes[0]
+        median_room_id, _ = room_sizes[len(room_sizes) // 2]
+        busiest_user_id = db.query(RoomMembership.user_id).group_by(RoomMembership.user_id).order_by(
+            func.count(RoomMembership.id).desc()
+        ).limit(1).scalar()
+        big_room_member_id = db.query(RoomMembership.user_id).filter(
+            RoomMembership.room_id == big_room_id
+        ).limit(1).scalar()
+        # 从最旧的 10% 处取游标，相当于向上翻到 90% 深度
+        deep_cursor = db.query(Message.id).filter(Message.room_id == big_room_id).order_by(Message.id).offset(
+            big_room_messages // 10
+        ).limit(1).scalar()
+        return {
+            "big_room_id": big_room_id,
+            "big_room_messages": big_room_messages,
+            "median_room_id": median_room_id,
+            "busiest_user_id": busiest_user_id,
+            "big_room_member_id": big_room_member_id,
+            "deep_cursor": deep_cursor,
+        }
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="session")
+def run():
+    """在同一个事件循环中执行异步接口函数"""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# benchmarks/generate_dataset.py
+# 合成数据集生成：批量写入用户、房间、成员关系和消息，房间规模按 zipf 分布（少数大房间 + 大量小房间）
+#
+# 用法：uv run python benchmarks/generate_dataset.py --scale large --database-url sqlite:///instance/bench.db
+#       uv run python benchmarks/generate_dataset.py --users 5000 --messages 2000000 --database-url postgresql://...
+# 相同参数和随机种子生成的数据完全一致，便于在同一份数据上对比性能改动。
+# 写入绕过 ORM 和 Core，直接按批调用驱动的 executemany；SQLite 加载期间关闭日志和同步写盘。
+# 所有用户的密码均为 --password（只计算一次哈希）。
+
+import argparse
+import bisect
+import itertools
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, event  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import User, Room, RoomMembership, Message  # noqa: E402
+from app.core.ids import EPOCH_MS, TIMESTAMP_SHIFT, id_to_datetime  # noqa: E402
+from app.core.security import get_password_hash  # noqa: E402
+
+# 预设规模：(用户数, 房间数, 消息数)
+SCALES = {
+    "small": (2_000, 200, 200_000),
+    "medium": (20_000, 2_000, 2_000_000),
+    "large": (100_000, 10_000, 10_000_000),
+}
+
+# 消息内容池大小
+CONTENT_POOL_SIZE = 10_000
+
+WORDS = (
+    "好的 收到 今天 明天 会议 文档 上线 测试 问题 已经 处理 一下 看看 这个 那个 需求 接口 数据库 "
+    "前端 后端 部署 发布 回滚 日志 监控 性能 优化 晚上 中午 吃饭 周末 哈哈 谢谢 辛苦 了 吗 吧 呢"
+).split()
+
+
+def make_engine(url: str):
+    engine = create_engine(url)
+    if url.startswith("sqlite"):
+        @event.listens_for(engine, "connect")
+        def fast_load(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=OFF")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.execute("PRAGMA cache_size=-262144")
+            cursor.close()
+    return engine
+
+
+def insert_batches(engine, table, columns, rows, batch_size: int, label: str) -> int:
+    """按批插入元组行（按 columns 顺序，每批一个事务），返回写入行数
+
+    直接调用驱动的 executemany，只对需要转换的列（如 SQLite 的日期时间）执行类型处理，
+    避免 Core 逐行处理参数字典的开销。
+    """
+    dialect = engine.dialect
+    if dialect.paramstyle == "qmark":
+        values = ", ".join("?" for _ in columns)
+    elif dialect.paramstyle == "numeric":
+        values = ", ".join(f":{i}" for i in range(1, len(columns) + 1))
+    else:
+        values = ", ".join("%s" for _ in columns)
+    statement = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({values})"
+    processors = [
+        (index, processor) for index, processor in (
+            (index, table.columns[name].type.dialect_impl(dialect).bind_processor(dialect))
+            for index, name in enumerate(columns)
+        ) if processor
+    ]
+
+    def to_params(row):
+        if not processors:
+            return row
+        row = list(row)
+        for index, processor in processors:
+            row[index] = processor(row[index])
+        return row
+
+    start = time.perf_counter()
+    total = 0
+    rows = iter(rows)
+    while True:
+        batch = [to_params(row) for row in itertools.islice(rows, batch_size)]
+        if not batch:
+            break
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.executemany(statement, batch)
+            cursor.close()
+            raw.commit()
+        finally:
+            raw.close()
+        total += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"\r{label}: {total:,} 行（{total / elapsed:,.0f} 行/秒）", end="", flush=True)
+    print()
+    return total
+
+
+def zipf_cum_weights(count: int, s: float):
+    weights = [1.0 / (rank ** s) for rank in range(1, count + 1)]
+    return list(itertools.accumulate(weights))
+
+
+def generate(
+    url: str,
+    users: int,
+    rooms: int,
+    messages: int,
+    rooms_per_user: int = 3,
+    zipf_s: float = 1.1,
+    days: int = 365,
+    seed: int = 1,
+    batch_size: int = 10_000,
+    password: str = "password",
+) -> dict:
+    """生成数据集（要求目标库中没有同名表的数据），返回各表写入行数"""
+    rng = random.Random(seed)
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    password_hash = get_password_hash(password)
+    random_value = rng.random
+
+    counts = {}
+    counts["users"] = insert_batches(
+        engine, User.__table__,
+        ("id", "username", "email", "password_hash", "avatar_url", "is_online", "created_at", "last_seen"),
+        (
+            (i, f"user{i}", f"user{i}@example.com", password_hash, "", random_value() < 0.05, start, now)
+            for i in range(1, users + 1)
+        ),
+        batch_size, "用户"
+    )
+
+    counts["rooms"] = insert_batches(
+        engine, Room.__table__,
+        ("id", "name", "description", "is_private", "created_by", "created_at"),
+        ((i, f"room{i}", "", random_value() < 0.1, rng.randint(1, users), start) for i in range(1, rooms + 1)),
+        batch_size, "房间"
+    )
+
+    # 房间按排名分配权重，排名越靠前的房间成员和消息越多
+    room_cum = zipf_cum_weights(rooms, zipf_s)
+    room_total = room_cum[-1]
+    members = [[] for _ in range(rooms + 1)]
+
+    def pick_room() -> int:
+        return bisect.bisect_left(room_cum, random_value() * room_total) + 1
+
+    def memberships():
+        membership_id = 0
+        for user_id in range(1, users + 1):
+            for room_id in {pick_room() for _ in range(min(rooms_per_user, rooms))}:
+                members[room_id].append(user_id)
+                membership_id += 1
+                yield membership_id, user_id, room_id, start, False
+        # 没有成员的房间由一个随机用户占位，保证每个房间都有人发言
+        for room_id in range(1, rooms + 1):
+            if not members[room_id]:
+                user_id = rng.randint(1, users)
+                members[room_id].append(user_id)
+                membership_id += 1
+                yield membership_id, user_id, room_id, start, True
+
+    counts["room_memberships"] = insert_batches(
+        engine, RoomMembership.__table__, ("id", "user_id", "room_id", "joined_at", "is_admin"),
+        memberships(), batch_size, "成员关系"
+    )
+
+    # 消息按时间均匀分布，ID 与生产环境一样由毫秒时间戳构成且单调递增；内容从预生成的语句池中抽取
+    contents = ["".join(rng.choices(WORDS, k=rng.randint(2, 24))) for _ in range(CONTENT_POOL_SIZE)]
+    start_ms = int(start.timestamp() * 1000) - EPOCH_MS
+    step_ms = days * 86_400_000 / max(messages, 1)
+
+    def message_rows():
+        last_id = 0
+        for i in range(messages):
+            room_id = pick_room()
+            room_members = members[room_id]
+            message_id = max((start_ms + int(i * step_ms)) << TIMESTAMP_SHIFT, last_id + 1)
+            last_id = message_id
+            yield (
+                message_id,
+                contents[int(random_value() * CONTENT_POOL_SIZE)],
+                "text",
+                room_members[int(random_value() * len(room_members))],
+                room_id,
+                id_to_datetime(message_id),
+                random_value() < 0.01,
+            )
+
+    counts["messages"] = insert_batches(
+        engine, Message.__table__,
+        ("id", "content", "message_type", "user_id", "room_id", "timestamp", "is_deleted"),
+        message_rows(), batch_size, "消息"
+    )
+
+    if url.startswith("postgresql"):
+        # 显式写入了自增主键，同步序列
+        with engine.begin() as conn:
+            for table in ("users", "rooms", "room_memberships"):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                )
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="生成基准测试数据集")
+    parser.add_argument("--database-url", default="sqlite:///instance/bench.db", help="目标数据库（需为空库）")
+    parser.add_argument("--scale", choices=SCALES, default="small", help="预设规模，可被下面的参数覆盖")
+    parser.add_argument("--users", type=int, help="用户数")
+    parser.add_argument("--rooms", type=int, help="房间数")
+    parser.add_argument("--messages", type=int, help="消息数")
+    parser.add_argument("--rooms-per-user", type=int, default=3, help="每个用户加入的房间数（上限）")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="房间规模的 zipf 指数，越大越集中")
+    parser.add_argument("--days", type=int, default=365, help="消息时间跨度（天）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="每批插入行数")
+    args = parser.parse_args()
+
+    users, rooms, messages = SCALES[args.scale]
+    start = time.perf_counter()
+    counts = generate(
+        args.database_url,
+        users=args.users or users,
+        rooms=args.rooms or rooms,
+        messages=args.messages if args.messages is not None else messages,
+        rooms_per_user=args.rooms_per_user,
+        zipf_s=args.zipf_s,
+        days=args.days,
+        seed=args.seed,
+        batch_size=args.batch_size,
+    )
+    print(f"完成，耗时 {time.perf_counter() - start:.1f}s: {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# benchmarks/loadtest_socketio.py
+# Socket.IO 压测：模拟大量用户连接、加入房间并按目标速率发送消息，统计端到端投递延迟
+#
+# 用法：先启动服务（SQLite 或 PostgreSQL 均可），再运行
+#   uv run --extra loadtest python benchmarks/loadtest_socketio.py --url http://127.0.0.1:8000 \
+#       --users 1000 --rooms 20 --distribution zipf --rate 200 --duration 60 --report loadtest.json
+#
+# 流程：通过 /api/auth 注册并登录合成用户（已存在则直接登录）→ 创建房间并按分布分配成员 →
+# 建立 Socket.IO 连接并 join_room → 在持续时间内按总速率随机选择用户发送 send_message →
+# 等待剩余消息送达后输出报告。
+# 延迟按 send_message 发出到各接收端收到 new_message 计算（发送端和接收端在同一进程，共用时钟），
+# 报告包含连接耗时、确认延迟、投递延迟分位数，以及连接/发送错误数和未送达数。
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+try:
+    import aiohttp
+    import socketio
+except ImportError:
+    sys.exit("压测依赖未安装，请运行: uv sync --extra loadtest")
+
+
+def percentiles(values: List[float]) -> dict:
+    """毫秒分位数"""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(pct):
+        return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values) * 1000, 2),
+        "p50": pick(50),
+        "p90": pick(90),
+        "p99": pick(99),
+        "max": round(values[-1] * 1000, 2),
+    }
+
+
+def room_weights(rooms: int, distribution: str, zipf_s: float) -> List[float]:
+    """房间规模分布：uniform 为均匀分配，zipf 为少数大房间加大量小房间"""
+    if distribution == "uniform":
+        return [1.0] * rooms
+    return [1.0 / (rank ** zipf_s) for rank in range(1, rooms + 1)]
+
+
+class SyntheticUser:
+    """一个合成用户及其 Socket.IO 连接"""
+
+    def __init__(self, index: int, username: str):
+        self.index = index
+        self.username = username
+        self.token: Optional[str] = None
+        self.rooms: List[int] = []
+        self.joined: set = set()
+        self.client: Optional[socketio.AsyncClient] = None
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base_url = args.url.rstrip("/")
+        self.users = [SyntheticUser(i, f"{args.prefix}{i:05d}") for i in range(args.users)]
+        self.room_ids: List[int] = []
+        self.room_members: Dict[int, List[SyntheticUser]] = {}
+
+        self.setup_errors: Counter = Counter()
+        self.connect_times: List[float] = []
+        self.connect_errors: Counter = Counter()
+        self.server_errors: Counter = Counter()
+
+        # 消息序号 -> (发出时间, 预期接收连接数)
+        self.sent: Dict[int, tuple] = {}
+        self.ack_latencies: List[float] = []
+        self.delivery_latencies: List[float] = []
+        self.deliveries = 0
+        self.send_errors = 0
+        self.content_prefix = f"loadtest:{random.getrandbits(32):08x}:"
+
+    # ---------- 准备阶段 ----------
+
+    async def authenticate(self, http: aiohttp.ClientSession, user: SyntheticUser) -> None:
+        """注册（已存在时忽略）并登录"""
+        async with http.post(f"{self.base_url}/api/auth/register", json={
+            "username": user.username,
+            "email": f"{user.username}@example.com",
+            "password": self.args.password,
+        }) as response:
+            # 409 表示用户已存在（重复运行）
+            if response.status not in (200, 409):
+                self.setup_errors[f"register:{response.status}"] += 1
+        async with http.post(f"{self.base_url}/api/auth/login", data={
+            "username": user.username,
+            "password": self.args.password,
+        }) as response:
+            if response.status != 200:
+                self.setup_errors[f"login:{response.status}"] += 1
+                return
+            user.token = (await response.json())["access_token"]
+
+    async def ensure_room(self, http: aiohttp.ClientSession, name: str, owner: SyntheticUser) -> Optional[int]:
+        headers = {"Authorization": f"Bearer {owner.token}"}
+        async with http.post(f"{self.base_url}/api/rooms/", json={"name": name}, headers=headers) as response:
+            if response.status == 200:
+                return (await response.json())["id"]
+        # 房间已存在（重复运行）：从房间列表中查找
+        async with http.get(f"{self.base_url}/api/rooms/", headers=headers) as response:
+            data = await response.json()
+        for room in data.get("user_rooms", []) + data.get("available_rooms", []):
+            if room["name"] == name:
+                return room["id"]
+        self.setup_errors["create_room"] += 1
+        return None
+
+    async def join_membership(self, http: aiohttp.ClientSession, user: SyntheticUser, room_id: int) -> None:
+        async with http.post(
+            f"{self.base_url}/api/rooms/{room_id}/join", json={},
+            headers={"Authorization": f"Bearer {user.token}"}
+        ) as response:
+            # 400 表示已经是成员
+            if response.status not in (200, 400):
+                self.setup_errors[f"join:{response.status}"] += 1
+
+    async def setup(self) -> None:
+        args = self.args
+        semaphore = asyncio.Semaphore(args.setup_concurrency)
+
+        async def limited(coro):
+            async with semaphore:
+                try:
+                    await coro
+                except aiohttp.ClientError as e:
+                    self.setup_errors[type(e).__name__] += 1
+
+        # 准备阶段耗时较长，不复用连接，避免服务端关闭空闲的 keep-alive 连接导致请求失败
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True)) as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(limited(self.authenticate(http, user)) for user in self.users))
+            ready = [user for user in self.users if user.token]
+            print(f"登录完成: {len(ready)}/{len(self.users)} 个用户，耗时 {time.perf_counter() - start:.1f}s")
+            if not ready:
+                raise SystemExit("没有可用的用户，请检查服务地址")
+
+            for i in range(args.rooms):
+                room_id = await self.ensure_room(http, f"{args.prefix}-room-{i}", ready[i % len(ready)])
+                if room_id is not None:
+                    self.room_ids.append(room_id)
+                    self.room_members[room_id] = []
+
+            rng = random.Random(args.seed)
+            weights = room_weights(len(self.room_ids), args.distribution, args.zipf_s)
+            for user in ready:
+                count = min(args.rooms_per_user, len(self.room_ids))
+                rooms = set()
+                while len(rooms) < count:
+                    rooms.add(rng.choices(self.room_ids, weights)[0])
+                user.rooms = sorted(rooms)
+                for room_id in user.rooms:
+                    self.room_members[room_id].append(user)
+
+            await asyncio.gather(*(
+                limited(self.join_membership(http, user, room_id))
+                for user in ready for room_id in user.rooms
+            ))
+
+        sizes = sorted((len(members) for members in self.room_members.values()), reverse=True)
+        print(f"房间: {len(self.room_ids)} 个，成员数（前10）: {sizes[:10]}")
+
+    # ---------- 连接阶段 ----------
+
+    def on_new_message(self, data) -> None:
+        content = data.get("content") or ""
+        if not content.startswith(self.content_prefix):
+            return
+        sent = self.sent.get(int(content[len(self.content_prefix):].split(":", 1)[0]))
+        if sent is not None:
+            self.deliveries += 1
+            self.delivery_latencies.append(time.perf_counter() - sent[0])
+
+    def on_ack(self, data) -> None:
+        if data.get("pending"):
+            return
+        nonce = data.get("nonce") or ""
+        if nonce.startswith(self.content_prefix):
+            sent = self.sent.get(int(nonce[len(self.content_prefix):]))
+            if sent is not None:
+                self.ack_latencies.append(time.perf_counter() - sent[0])
+
+    async def connect_user(self, user: SyntheticUser) -> None:
+        client = socketio.AsyncClient(reconnection=False)
+        joined = asyncio.Event()
+
+        client.on("new_message", self.on_new_message)
+        client.on("message_ack", self.on_ack)
+
+        @client.on("room_joined")
+        def on_room_joined(data):
+            user.joined.add(data.get("room_id"))
+            if len(user.joined) >= len(user.rooms):
+                joined.set()
+
+        @client.on("error")
+        def on_error(data):
+            self.server_errors[(data or {}).get("message", "<unknown>")] += 1
+
+        start = time.perf_counter()
+        try:
+            await client.connect(
+                self.base_url, auth={"token": user.token, "compact": self.args.compact},
+                transports=["websocket"], wait_timeout=self.args.timeout
+            )
+        except Exception as e:
+            self.connect_errors[type(e).__name__] += 1
+            return
+        self.connect_times.append(time.perf_counter() - start)
+        user.client = client
+
+        for room_id in user.rooms:
+            await client.emit("join_room", {"room_id": room_id})
+        try:
+            await asyncio.wait_for(joined.wait(), self.args.timeout)
+        except asyncio.TimeoutError:
+            self.connect_errors["join_timeout"] += 1
+
+    async def connect_all(self) -> None:
+        semaphore = asyncio.Semaphore(self.args.connect_concurrency)
+
+        async def limited(user):
+            async with semaphore:
+                await self.connect_user(user)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(user) for user in self.users if user.token))
+        connected = sum(1 for user in self.users if user.client)
+        print(f"连接完成: {connected} 个连接，耗时 {time.perf_counter() - start:.1f}s")
+
+    # ---------- 发送阶段 ----------
+
+    def expected_receivers(self, room_id: int) -> int:
+        return sum(1 for member in self.room_members[room_id] if member.client and room_id in member.joined)
+
+    async def send_one(self, sequence: int, user: SyntheticUser, room_id: int) -> None:
+        self.sent[sequence] = (time.perf_counter(), self.expected_receivers(room_id))
+        try:
+            await user.client.emit("send_message", {
+                "room_id": room_id,
+                "content": f"{self.content_prefix}{sequence}:{'x' * self.args.message_size}",
+                "nonce": f"{self.content_prefix}{sequence}",
+            })
+        except Exception:
+            self.send_errors += 1
+            del self.sent[sequence]
+
+    async def run_senders(self) -> float:
+        """按总速率匀速调度发送，返回实际发送阶段耗时"""
+        senders = [user for user in self.users if user.client and user.joined]
+        if not senders:
+            print("没有已加入房间的连接，跳过发送阶段")
+            return 0.0
+        rng = random.Random(self.args.seed)
+        interval = 1.0 / self.args.rate
+        tasks = set()
+        start = time.perf_counter()
+        sequence = 0
+        while time.perf_counter() - start < self.args.duration:
+            user = rng.choice(senders)
+            task = asyncio.create_task(self.send_one(sequence, user, rng.choice(sorted(user.joined))))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sequence += 1
+            # 按计划时间而非上次发送时间推进，事件循环繁忙时不会累积偏差
+            delay = start + sequence * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elapsed = time.perf_counter() - start
+        if tasks:
+            await asyncio.gather(*tasks)
+        return elapsed
+
+    async def drain(self) -> None:
+        """等待剩余消息送达（全部送达或超时）"""
+        expected = sum(receivers for _, receivers in self.sent.values())
+        deadline = time.perf_counter() + self.args.drain
+        while self.deliveries < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+
+    async def disconnect_all(self) -> None:
+        await asyncio.gather(
+            *(user.client.disconnect() for user in self.users if user.client),
+            return_exceptions=True
+        )
+
+    # ---------- 报告 ----------
+
+    def report(self, send_seconds: float) -> dict:
+        expected = sum(receivers for _, receivers in self.sent.values())
+        sent = len(self.sent)
+        return {
+            "config": {
+                "url": self.base_url,
+                "users": self.args.users,
+                "rooms": self.args.rooms,
+                "rooms_per_user": self.args.rooms_per_user,
+                "distribution": self.args.distribution,
+                "target_rate": self.args.rate,
+                "duration": self.args.duration,
+                "message_size": self.args.message_size,
+                "compact": self.args.compact,
+            },
+            "setup": {
+                "authenticated": sum(1 for user in self.users if user.token),
+                "room_sizes": sorted((len(members) for members in self.room_members.values()), reverse=True),
+                "errors": dict(self.setup_errors),
+            },
+            "connect": {
+                "connected": sum(1 for user in self.users if user.client),
+                "latency_ms": percentiles(self.connect_times),
+                "errors": dict(self.connect_errors),
+            },
+            "messages": {
+                "sent": sent,
+                "send_errors": self.send_errors,
+                "achieved_rate": round(sent / send_seconds, 2) if send_seconds else 0,
+                "acked": len(self.ack_latencies),
+                "ack_latency_ms": percentiles(self.ack_latencies),
+                "deliveries_expected": expected,
+                "deliveries": self.deliveries,
+                "delivery_loss_ratio": round(1 - self.deliveries / expected, 6) if expected else 0,
+                "delivery_latency_ms": percentiles(self.delivery_latencies),
+            },
+            "server_errors": dict(self.server_errors),
+        }
+
+    async def run(self) -> dict:
+        await self.setup()
+        await self.connect_all()
+        try:
+            print(f"发送中: 目标 {self.args.rate} 条/秒，持续 {self.args.duration}s")
+            send_seconds = await self.run_senders()
+            await self.drain()
+        finally:
+            await self.disconnect_all()
+        return self.report(send_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO 压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="服务地址")
+    parser.add_argument("--users", type=int, default=100, help="合成用户数（每个用户一个连接）")
+    parser.add_argument("--rooms", type=int, default=10, help="房间数")
+    parser.add_argument("--rooms-per-user", type=int, default=1, help="每个用户加入的房间数")
+    parser.add_argument("--distribution", choices=("uniform", "zipf"), default="zipf", help="房间规模分布")
+    parser.add_argument("--zipf-s", type=float, default=1.0, help="zipf 分布指数，越大房间规模越集中")
+    parser.add_argument("--rate", type=float, default=50, help="总发送速率（条/秒）")
+    parser.add_argument("--duration", type=float, default=30, help="发送阶段持续时间（秒）")
+    parser.add_argument("--message-size", type=int, default=64, help="消息填充字符数")
+    parser.add_argument("--compact", action="store_true", help="使用紧凑模式连接")
+    parser.add_argument("--prefix", default="lt", help="合成用户名和房间名前缀（用户名不超过20个字符）")
+    parser.add_argument("--password", default="loadtest", help="合成用户密码")
+    parser.add_argument("--setup-concurrency", type=int, default=20, help="注册/登录并发数")
+    parser.add_argument("--connect-concurrency", type=int, default=50, help="建立连接并发数")
+    parser.add_argument("--timeout", type=float, default=10, help="连接和加入房间超时（秒）")
+    parser.add_argument("--drain", type=float, default=10, help="发送结束后等待消息送达的最长时间（秒）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--report", help="报告输出路径（JSON），默认输出到标准输出")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"报告已写入 {args.report}")
+    else:
+        print(text)
+
+    messages = report["messages"]
+    print(
+        f"连接 {report['connect']['connected']}，发送 {messages['sent']} 条（{messages['achieved_rate']} 条/秒），"
+        f"送达 {messages['deliveries']}/{messages['deliveries_expected']}，"
+        f"投递延迟 p50 {messages['delivery_latency_ms'].get('p50')}ms p99 {messages['delivery_latency_ms'].get('p99')}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
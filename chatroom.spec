@@ -18,6 +18,9 @@ a = Analysis(
         'uvicorn.config',
         'uvicorn.lifespan',
         'uvicorn.lifespan.on',
+        'uvicorn.loops.auto',
+        'uvicorn.protocols.http.auto',
+        'uvicorn.protocols.websockets.auto',
         'uvicorn.protocols',
         'uvicorn.protocols.http',
         'uvicorn.protocols.websockets',
@@ -28,13 +31,12 @@ a = Analysis(
         'starlette.responses',
         'starlette.staticfiles',
         
-        # Socket.IO 相关
+        # Socket.IO 相关（异步驱动按 async_mode 动态导入）
         'socketio',
         'python_socketio',
         'engineio',
         'engineio.async_drivers',
-        'engineio.async_drivers.threading',
-        'engineio.async_drivers.eventlet',
+        'engineio.async_drivers.asgi',
         
         # SQLAlchemy 相关
         'sqlalchemy',
@@ -45,12 +47,13 @@ a = Analysis(
         'alembic.runtime',
         'alembic.script',
         
-        # 认证相关
+        # 认证相关（app.core.security 首次使用时才导入；passlib 按名称动态加载 bcrypt 处理器）
         'jose',
         'jose.jwt',
         'passlib',
         'passlib.hash',
         'passlib.context',
+        'passlib.handlers.bcrypt',
         'bcrypt',
         
         # 其他依赖
@@ -78,6 +81,7 @@ a = Analysis(
         'app.socket.events',
         'app.schemas',
         'app.core',
+        'app.core.bootstrap',
         'app.utils',
         'main'
     ],
@@ -90,19 +94,17 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
+# 以目录形式打包且不使用UPX：单文件模式每次启动都要先把全部依赖解压到临时目录，UPX 压缩的库加载时也要解压，冷启动慢
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='chatroom',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=True,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -110,3 +112,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='chatroom',
+)
@@ -52,7 +52,11 @@ const MessageList: React.FC<MessageListProps> = ({ messages, typingUsers }) => {
   const renderMessageContent = (message: Message, isOwnMessage: boolean) => {
     if (message.message_type === 'image' || message.message_type === 'file') {
       try {
-        const fileInfo = JSON.parse(message.content);
+        // 优先使用附件表数据，旧消息的文件信息以JSON形式存放在内容中
+        const attachment = message.attachments?.[0];
+        const fileInfo = attachment
+          ? { ...attachment, description: message.content }
+          : JSON.parse(message.content);
         const fileUrl = fileInfo.url.startsWith('http') ? fileInfo.url : `${getAPIBaseURL()}${fileInfo.url}`;
         
         if (message.message_type === 'image') {
@@ -69,6 +73,8 @@ const MessageList: React.FC<MessageListProps> = ({ messages, typingUsers }) => {
                 <img 
                   src={fileUrl} 
                   alt={fileInfo.name}
+                  width={fileInfo.width || undefined}
+                  height={fileInfo.height || undefined}
                   className="rounded-lg max-w-full h-auto cursor-pointer hover:opacity-90 transition-opacity"
                   onClick={() => window.open(fileUrl, '_blank')}
                   onError={(e) => {
@@ -1,7 +1,8 @@
 import React, { createContext, useContext, useReducer, useEffect, useCallback, ReactNode, useRef } from 'react';
-import { ChatRoom, Message } from '../types';
+import { ChatRoom, Message, UserCard } from '../types';
 import { chatAPI } from '../services/api';
 import { socketService } from '../services/socket';
+import { userCards } from '../services/userCards';
 import { useAuth } from './AuthContext';
 import toast from 'react-hot-toast';
 
@@ -42,7 +43,8 @@ type ChatAction =
   | { type: 'SET_TYPING_USERS'; payload: string[] }
   | { type: 'ADD_TYPING_USER'; payload: string }
   | { type: 'REMOVE_TYPING_USER'; payload: string }
-  | { type: 'UPDATE_USER_AVATAR'; payload: { user_id: number; avatar_url: string } };
+  | { type: 'UPDATE_USER_AVATAR'; payload: { user_id: number; avatar_url: string } }
+  | { type: 'UPDATE_USER_CARD'; payload: UserCard };
 
 const chatReducer = (state: ChatState, action: ChatAction): ChatState => {
   switch (action.type) {
@@ -95,6 +97,15 @@ const chatReducer = (state: ChatState, action: ChatAction): ChatState => {
             : message
         ),
       };
+    case 'UPDATE_USER_CARD':
+      return {
+        ...state,
+        messages: state.messages.map(message =>
+          message.user_id === action.payload.id
+            ? { ...message, username: action.payload.username, avatar_url: action.payload.avatar_url }
+            : message
+        ),
+      };
     default:
       return state;
   }
@@ -136,7 +147,12 @@ export const ChatProvider: React.FC<ChatProviderProps> = ({ children }) => {
 
   const setupSocketListeners = useCallback(() => {
     // 新消息
-    socketService.onNewMessage((message: Message) => {
+    socketService.onNewMessage((rawMessage: Message) => {
+      // 未知作者时请求名片，收到后再补全
+      if (!rawMessage.username && !userCards.has(rawMessage.user_id)) {
+        socketService.requestUserCards([rawMessage.user_id]);
+      }
+      const message = userCards.hydrate(rawMessage);
       dispatch({ type: 'ADD_MESSAGE', payload: message });
       
       // 如果不是当前用户发送的消息，显示通知
@@ -178,6 +194,7 @@ export const ChatProvider: React.FC<ChatProviderProps> = ({ children }) => {
 
     // 房间加入成功
     socketService.onRoomJoined((data) => {
+      userCards.setMany(data.user_cards);
       // 更新在线用户列表
       const onlineUsernames = data.online_members.map(member => member.username);
       dispatch({ type: 'SET_ONLINE_USERS', payload: onlineUsernames });
@@ -189,6 +206,14 @@ export const ChatProvider: React.FC<ChatProviderProps> = ({ children }) => {
       dispatch({ type: 'SET_ONLINE_USERS', payload: onlineUsernames });
     });
 
+    // 用户名片
+    const applyUserCard = (card: UserCard) => {
+      userCards.set(card);
+      dispatch({ type: 'UPDATE_USER_CARD', payload: card });
+    };
+    socketService.onUserCard(applyUserCard);
+    socketService.onUserCards((data) => data.users.forEach(applyUserCard));
+
     // 用户头像更新
     socketService.onUserAvatarUpdated((data) => {
       dispatch({ 
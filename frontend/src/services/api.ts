@@ -1,5 +1,6 @@
 import axios from 'axios';
 import { LoginData, RegisterData, User, ChatRoom, Message } from '../types';
+import { userCards } from './userCards';
 
 // 获取API基础URL
 const getBaseURL = (): string => {
@@ -203,10 +204,13 @@ export const chatAPI = {
   },
 
   getMessages: async (roomId: number, page: number = 1, limit: number = 50): Promise<Message[]> => {
+    // 紧凑模式：作者名片在 users 中只返回一次
     const response = await api.get(`/api/messages/${roomId}`, {
-      params: { page, limit }
+      params: { page, limit, compact: true }
     });
-    return response.data.messages || response.data;
+    userCards.setMany(Object.values(response.data.users || {}));
+    const messages: Message[] = response.data.messages || [];
+    return messages.map(message => userCards.hydrate(message));
   },
 
   // 添加文件上传方法
@@ -1,5 +1,5 @@
 import { io, Socket } from 'socket.io-client';
-import { Message } from '../types';
+import { Message, UserCard } from '../types';
 
 // 获取Socket服务器URL
 const getSocketURL = (): string => {
@@ -20,9 +20,17 @@ const getSocketURL = (): string => {
   return 'http://localhost:8000';
 };
 
+// 排空重连被拒绝（新节点尚未就绪或仍路由到排空中的节点）时的重试间隔上限
+const DRAIN_RETRY_MAX_MS = 30000;
+
 class SocketService {
   private socket: Socket | null = null;
   private readonly url: string;
+  // 当前所在房间，重连后重新加入
+  private currentRoomId: number | null = null;
+  // 服务端排空时下发的重连等待时间，断开后据此延迟重连
+  private drainReconnectMs: number | null = null;
+  private drainRetryMs = 0;
 
   constructor() {
     this.url = getSocketURL();
@@ -37,7 +45,9 @@ class SocketService {
       this.socket = io(this.url, {
         // 移除withCredentials，使用JWT认证
         auth: {
-          token: token
+          token: token,
+          // 紧凑模式：消息只含作者ID，作者信息通过用户名片下发
+          compact: true
         },
         transports: ['polling', 'websocket'],
         timeout: 20000,
@@ -47,22 +57,54 @@ class SocketService {
       this.socket.on('connect', () => {
         console.log('Socket connected:', this.socket?.id);
         console.log('Socket transport:', this.socket?.io.engine.transport.name);
+        this.drainRetryMs = 0;
+        // 重连后服务端不保留房间订阅，重新加入当前房间
+        if (this.currentRoomId !== null) {
+          this.socket?.emit('join_room', { room_id: this.currentRoomId });
+        }
         resolve(this.socket!);
       });
 
       this.socket.on('connect_error', (error) => {
         console.error('Socket connection error:', error);
         console.error('Error details:', error.message);
+        if (this.drainRetryMs > 0) {
+          this.scheduleDrainReconnect(this.drainRetryMs);
+        }
         reject(error);
       });
 
+      this.socket.on('server_draining', (data: { reconnect_after_ms: number }) => {
+        this.drainReconnectMs = data.reconnect_after_ms;
+      });
+
       this.socket.on('disconnect', (reason) => {
         console.log('Socket disconnected:', reason);
+        // 服务端主动断开时客户端不会自动重连；排空断开按提示的随机延迟重连，避免所有客户端同时重连
+        if (reason === 'io server disconnect' && this.drainReconnectMs !== null) {
+          const delay = this.drainReconnectMs;
+          this.drainReconnectMs = null;
+          this.scheduleDrainReconnect(delay);
+        }
       });
     });
   }
 
+  private scheduleDrainReconnect(delay: number) {
+    // 重连被拒绝时按指数退避（加随机抖动）继续重试
+    this.drainRetryMs = Math.min(DRAIN_RETRY_MAX_MS, Math.max(1000, this.drainRetryMs * 2));
+    const socket = this.socket;
+    setTimeout(() => {
+      if (socket && this.socket === socket && !socket.connected) {
+        socket.connect();
+      }
+    }, delay + Math.random() * 1000);
+  }
+
   disconnect() {
+    this.currentRoomId = null;
+    this.drainReconnectMs = null;
+    this.drainRetryMs = 0;
     if (this.socket) {
       this.socket.disconnect();
       this.socket = null;
@@ -77,6 +119,7 @@ class SocketService {
   joinRoom(roomId: number) {
     if (this.socket) {
       console.log('Emitting join_room event for room:', roomId);
+      this.currentRoomId = roomId;
       this.socket.emit('join_room', { room_id: roomId });
     } else {
       console.error('Socket not connected when trying to join room:', roomId);
@@ -84,6 +127,9 @@ class SocketService {
   }
 
   leaveRoom(roomId: number) {
+    if (this.currentRoomId === roomId) {
+      this.currentRoomId = null;
+    }
     if (this.socket) {
       this.socket.emit('leave_room', { room_id: roomId });
     }
@@ -96,6 +142,8 @@ class SocketService {
       const messageData: any = {
         room_id: roomId,
         content: message,
+        // 客户端唯一标识：断线重发时服务端据此去重
+        nonce: `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`,
       };
       
       if (messageType) {
@@ -164,7 +212,7 @@ class SocketService {
     }
   }
 
-  onRoomJoined(callback: (data: { room_id: number; room_name: string; member_count: number; online_members: any[] }) => void) {
+  onRoomJoined(callback: (data: { room_id: number; room_name: string; member_count: number; online_members: any[]; user_cards?: UserCard[] }) => void) {
     if (this.socket) {
       this.socket.on('room_joined', callback);
     }
@@ -182,6 +230,24 @@ class SocketService {
     }
   }
 
+  onUserCard(callback: (card: UserCard) => void) {
+    if (this.socket) {
+      this.socket.on('user_card', callback);
+    }
+  }
+
+  onUserCards(callback: (data: { users: UserCard[] }) => void) {
+    if (this.socket) {
+      this.socket.on('user_cards', callback);
+    }
+  }
+
+  requestUserCards(userIds: number[]) {
+    if (this.socket) {
+      this.socket.emit('get_user_cards', { user_ids: userIds });
+    }
+  }
+
   emitAvatarUpdated(avatarUrl: string) {
     if (this.socket) {
       this.socket.emit('avatar_updated', { avatar_url: avatarUrl });
@@ -0,0 +1,30 @@
+import { Message, UserCard } from '../types';
+
+// 用户名片缓存：紧凑模式下消息只含 user_id，作者信息从这里补全
+class UserCardStore {
+  private cards = new Map<number, UserCard>();
+
+  has(userId: number): boolean {
+    return this.cards.has(userId);
+  }
+
+  set(card: UserCard) {
+    this.cards.set(card.id, card);
+  }
+
+  setMany(cards: UserCard[] = []) {
+    cards.forEach(card => this.set(card));
+  }
+
+  // 为消息补全作者用户名和头像
+  hydrate(message: Message): Message {
+    const card = this.cards.get(message.user_id);
+    return {
+      ...message,
+      username: card?.username ?? message.username ?? '未知用户',
+      avatar_url: card?.avatar_url ?? message.avatar_url ?? '',
+    };
+  }
+}
+
+export const userCards = new UserCardStore();
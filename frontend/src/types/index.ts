@@ -29,6 +29,24 @@ export interface ChatRoom {
   users?: User[];
 }
 
+export interface UserCard {
+  id: number;
+  username: string;
+  avatar_url: string;
+}
+
+export interface Attachment {
+  id: number;
+  message_id: number;
+  kind: string;
+  url: string;
+  name: string;
+  size: number;
+  mime_type: string;
+  width?: number | null;
+  height?: number | null;
+}
+
 export interface Message {
   id: number;
   content: string;
@@ -40,6 +58,7 @@ export interface Message {
   timestamp: string;
   edited_at?: string;
   is_deleted: boolean;
+  attachments?: Attachment[];
 }
 
 export interface AuthState {
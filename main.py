@@ -3,16 +3,29 @@
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, RedirectResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 import os
 import sys
 from pathlib import Path
 
 from app.config import settings
-from app.database import engine, Base
-from app.api import auth, rooms, messages, upload
+from app.core.logs import setup_logging, AccessLogMiddleware
+from app.database import shutdown_db_executor
+from app.api import auth, rooms, messages, upload, metrics, debug, health
 from app.socket.events import sio
+from app.core.tasks import start_background_tasks, stop_background_tasks
+from app.core import file_gc  # noqa: F401 注册孤立文件回收任务
+from app.core.images import shutdown_executor
+from app.core.bootstrap import initialize
+from app.core.metrics import MetricsMiddleware
+from app.core.profiler import SqlProfilerMiddleware
+from app.core.loop_monitor import loop_monitor
+from app.core.drain import install_drain_signal_handler
+from app.core.static import UploadStaticFiles, AssetManifest
+from app.core.storage import get_storage
+from app.core.ids import get_generator, release_worker_id
+from app.core.pool import configure_threadpool
 import socketio
 
 def get_resource_path(relative_path):
@@ -26,9 +39,6 @@ def get_resource_path(relative_path):
     
     return os.path.join(base_path, relative_path)
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
-
 # 创建FastAPI应用
 app = FastAPI(
     title="聊天室API",
@@ -47,63 +57,104 @@ app.add_middleware(
     allow_methods=["*"],
 )
 
+# SQL 分析（全局开启或管理员按请求开启）
+app.add_middleware(SqlProfilerMiddleware)
+
+# 请求耗时和数据库统计
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# 访问日志（替代 uvicorn 的同步访问日志）
+if settings.ACCESS_LOG:
+    app.add_middleware(AccessLogMiddleware)
+
+# 等待数据库连接超时（如SQLite写连接被长时间占用）时返回503，客户端稍后重试
+@app.exception_handler(PoolTimeoutError)
+async def on_pool_timeout(request: Request, exc: PoolTimeoutError):
+    return JSONResponse({"detail": "数据库繁忙，请稍后重试"}, status_code=503, headers={"Retry-After": "1"})
+
+# 后台周期任务（过期上传会话清理等）
+@app.on_event("startup")
+async def on_startup():
+    # 日志经队列由后台线程写出；在启动阶段配置，导入应用时不创建日志文件、不启动线程
+    setup_logging()
+    # 同步接口线程数与连接池大小按同一配置计算
+    configure_threadpool()
+    # 创建数据库表和上传目录（不在导入时执行；多进程部署或 run.py --init 已完成时跳过）
+    if not settings.SKIP_INIT:
+        initialize()
+    # 启动时确定工作节点ID（需要租用时立即占用），配置错误时启动失败而不是在首次发送消息时报错
+    get_generator()
+    frontend_assets.load()
+    start_background_tasks()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    install_drain_signal_handler()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await loop_monitor.stop()
+    await stop_background_tasks()
+    shutdown_executor()
+    shutdown_db_executor()
+    release_worker_id()
+
 # 注册API路由
 app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(rooms.router, prefix="/api/rooms", tags=["房间"])
 app.include_router(messages.router, prefix="/api/messages", tags=["消息"])
 app.include_router(upload.router, prefix="/api/upload", tags=["上传"])
+app.include_router(debug.router, prefix="/api/debug", tags=["调试"])
+app.include_router(health.router, prefix="/api/health", tags=["健康检查"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router, tags=["监控"])
 
 # 创建Socket.IO ASGI应用
 socket_app = socketio.ASGIApp(sio, app)
 
-# 确保上传目录存在
 upload_dir = Path(settings.UPLOAD_DIR)
-upload_dir.mkdir(exist_ok=True)
-(upload_dir / "avatars").mkdir(exist_ok=True)
-(upload_dir / "images").mkdir(exist_ok=True)
-(upload_dir / "documents").mkdir(exist_ok=True)
-(upload_dir / "audio").mkdir(exist_ok=True)
-(upload_dir / "video").mkdir(exist_ok=True)
-(upload_dir / "files").mkdir(exist_ok=True)
-
-# 静态文件服务
-if upload_dir.exists():
-    app.mount("/uploads", StaticFiles(directory=str(upload_dir)), name="uploads")
-
-# 前端静态文件服务 - 使用资源路径
+
+# 上传文件服务：本地存储由应用直接提供，对象存储重定向到预签名下载地址
+if settings.STORAGE_BACKEND == "local":
+    # 目录在启动阶段创建，挂载时不检查
+    app.mount("/uploads", UploadStaticFiles(directory=str(upload_dir), check_dir=False), name="uploads")
+else:
+    @app.get("/uploads/{key:path}")
+    async def redirect_upload(key: str):
+        """重定向到对象存储，文件字节不经过应用进程"""
+        return RedirectResponse(
+            get_storage().presign_download(key),
+            status_code=307,
+            headers={"Cache-Control": f"private, max-age={settings.PRESIGNED_URL_EXPIRE_SECONDS // 2}"}
+        )
+
+# 前端静态文件服务 - 使用资源路径，启动时构建内存清单
 frontend_build_dir = Path(get_resource_path("frontend/build"))
-if frontend_build_dir.exists():
-    # Vite 使用 assets 目录而不是 static 目录
-    assets_dir = frontend_build_dir / "assets"
-    if assets_dir.exists():
-        app.mount("/assets", StaticFiles(directory=str(assets_dir)), name="assets")
+frontend_assets = AssetManifest(frontend_build_dir)
 
 # 前端路由处理
 @app.get("/{path:path}")
-async def serve_frontend(path: str):
+async def serve_frontend(path: str, request: Request):
     """服务前端静态文件"""
     # 如果请求的是API路径、Socket.IO路径或uploads路径，跳过前端路由
     if path.startswith("api/") or path.startswith("uploads/") or path.startswith("socket.io/"):
-        return {"error": "Not found"}, 404
+        return JSONResponse({"error": "Not found"}, status_code=404)
     
-    # 处理静态文件请求（CSS、JS、图片等）- Vite 使用 assets 目录
-    if path.startswith("assets/"):
-        file_path = frontend_build_dir / path
-        if file_path.exists() and file_path.is_file():
-            return FileResponse(str(file_path))
-        else:
-            return {"error": "File not found"}, 404
+    # 处理静态文件请求（CSS、JS、图片、favicon.ico、manifest.json等）
+    asset = frontend_assets.get(path) if path else None
+    if asset:
+        return frontend_assets.response(asset, request.headers)
     
-    # 处理其他静态资源（favicon.ico、manifest.json等）
-    if path and (frontend_build_dir / path).exists():
-        return FileResponse(str(frontend_build_dir / path))
+    # Vite 的 assets 目录下不存在的文件直接返回404，不回退到index.html
+    if path.startswith("assets/"):
+        return JSONResponse({"error": "File not found"}, status_code=404)
     
     # 对于所有其他路径，返回index.html（支持React Router）
-    index_path = frontend_build_dir / "index.html"
-    if index_path.exists():
-        return FileResponse(str(index_path))
+    index_asset = frontend_assets.get("index.html")
+    if index_asset:
+        return frontend_assets.response(index_asset, request.headers)
     else:
-        return {"error": "Frontend not found"}, 404
+        return JSONResponse({"error": "Frontend not found"}, status_code=404)
 
 if __name__ == "__main__":
     import uvicorn
@@ -111,5 +162,9 @@ if __name__ == "__main__":
         "main:socket_app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=settings.DEBUG
+        reload=settings.DEBUG,
+        access_log=False,
+        # 只采信可信代理的转发头，未配置时不解析（uvicorn 默认信任 127.0.0.1）
+        proxy_headers=bool(settings.FORWARDED_ALLOW_IPS),
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS
     ) 
\ No newline at end of file
@@ -1,30 +1,290 @@
 #!/usr/bin/env python3
 # run.py
 # FastAPI应用启动文件
+#
+# python run.py               单进程运行（开发模式下自动重载）
+# python run.py --production  多进程运行：启动器创建数据库表和目录后启动 N 个工作进程并监管（异常退出自动重启），
+#                             工作进程 i 监听 PORT+i，由 nginx 按客户端IP（ip_hash）分配，
+#                             保证 Engine.IO 轮询请求总是到达同一工作进程；
+#                             进程间通过 BROKER_URL（Redis）转发 Socket.IO 广播
+# python run.py --nginx-upstream  按工作进程数输出 nginx upstream 配置（与 --workers 一起使用）
+# python run.py --init        创建数据库表和目录后退出；实例以 SKIP_INIT=true 启动时跳过这一步，启动更快
+# python run.py --import-report  输出导入 main 模块的耗时分析（python -X importtime）
 
+import argparse
+import asyncio
+import multiprocessing
 import os
+import signal
+import subprocess
 import sys
+import time
+from collections import defaultdict
+from typing import List, Optional
+
 import uvicorn
 from app.config import settings
 
+# 消息ID中工作节点号的位数决定了最多可用的工作进程数
+MAX_WORKERS = 32
+
+# 工作进程启动后存活不足该时间（秒）即退出视为启动失败，重启前逐次加倍等待
+MIN_WORKER_UPTIME = 10
+MAX_RESTART_DELAY = 30
+
+# 停止时等待工作进程优雅退出的时间（秒）
+SHUTDOWN_TIMEOUT = 30
+
+
+def run_worker(port: int, host: str, cpu: Optional[int]):
+    """工作进程入口（环境变量已由启动器设置）"""
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    uvicorn.run(
+        "main:socket_app",
+        host=host,
+        port=port,
+        log_level="info" if not settings.DEBUG else "debug",
+        access_log=False,  # 访问日志由应用的 AccessLogMiddleware 记录
+        # 显式指定可信代理（nginx），未配置时不解析转发头（uvicorn 默认信任 127.0.0.1）
+        proxy_headers=bool(settings.FORWARDED_ALLOW_IPS),
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS
+    )
+
+
+class Worker:
+    """一个工作进程及其重启状态"""
+
+    def __init__(self, index: int, port: int, cpu: Optional[int]):
+        self.index = index
+        self.port = port
+        self.cpu = cpu
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+    def start(self, context, host: str, worker_id_base: Optional[int], workers: int):
+        # spawn 方式启动的子进程继承当前环境变量，子进程导入配置时即得到各自的值
+        # 未指定 WORKER_ID 起始值时各工作进程从 Redis 租用ID，多个实例之间同样不会重复
+        os.environ.update({
+            "WORKER_INDEX": str(self.index),
+            "WORKER_ID": str(worker_id_base + self.index) if worker_id_base is not None else "-1",
+            "WORKERS": str(workers),
+            "SKIP_INIT": "true",
+        })
+        self.process = context.Process(
+            target=run_worker, args=(self.port, host, self.cpu), name=f"chatroom-worker-{self.index}", daemon=False
+        )
+        self.process.start()
+        self.started_at = time.monotonic()
+        print(f"工作进程 {self.index} 已启动 (PID {self.process.pid}, 端口 {self.port}"
+              f"{f', CPU {self.cpu}' if self.cpu is not None else ''})")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+    """启动并监管工作进程"""
+
+    def __init__(self, workers: List[Worker], worker_host: str, worker_id_base: Optional[int]):
+        self.workers = workers
+        self.worker_host = worker_host
+        self.worker_id_base = worker_id_base
+        self.context = multiprocessing.get_context("spawn")
+        self.stopping = asyncio.Event()
+
+    def start_worker(self, worker: Worker):
+        worker.start(self.context, self.worker_host, self.worker_id_base, len(self.workers))
+
+    def check_workers(self):
+        """重启异常退出的工作进程；刚启动就退出时逐次加倍等待，避免反复崩溃占满CPU"""
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.is_alive():
+                continue
+            if worker.restart_at == 0.0:
+                exitcode = worker.process.exitcode if worker.process else None
+                if now - worker.started_at < MIN_WORKER_UPTIME:
+                    worker.failures += 1
+                else:
+                    worker.failures = 0
+                delay = min(MAX_RESTART_DELAY, 2 ** worker.failures - 1)
+                print(f"工作进程 {worker.index} 已退出 (退出码 {exitcode})，{delay}s 后重启")
+                worker.restart_at = now + delay
+            if now >= worker.restart_at:
+                worker.restart_at = 0.0
+                self.start_worker(worker)
+
+    def forward_signal(self, signum: int):
+        for worker in self.workers:
+            if worker.is_alive():
+                os.kill(worker.process.pid, signum)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stopping.set)
+        # 排空信号转发给所有工作进程
+        if hasattr(signal, "SIGUSR1"):
+            loop.add_signal_handler(signal.SIGUSR1, self.forward_signal, signal.SIGUSR1)
+
+        for worker in self.workers:
+            self.start_worker(worker)
+
+        while not self.stopping.is_set():
+            self.check_workers()
+            try:
+                await asyncio.wait_for(self.stopping.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+
+        print("正在停止工作进程...")
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.process.kill()
+
+
+def get_worker_ports(workers: int) -> List[int]:
+    """各工作进程的监听端口：0号进程使用 PORT，单进程部署的健康检查等配置无需修改"""
+    return [settings.PORT + index for index in range(workers)]
+
+
+def nginx_upstream(workers: int, host: str = "127.0.0.1") -> str:
+    """nginx upstream 配置：按客户端IP固定分配工作进程，Engine.IO 轮询请求总能到达持有会话的进程"""
+    servers = "".join(f"    server {host}:{port};\n" for port in get_worker_ports(workers))
+    return f"upstream chatroom {{\n    ip_hash;\n{servers}}}\n"
+
+
+def run_production(workers: int, pin_cpus: bool) -> int:
+    """多进程运行"""
+    if workers > 1 and not settings.BROKER_URL:
+        print("多进程运行需要配置 BROKER_URL（Redis），用于在工作进程间转发 Socket.IO 广播")
+        return 1
+    worker_id_base = settings.WORKER_ID if settings.WORKER_ID >= 0 else None
+    if (worker_id_base or 0) + workers > MAX_WORKERS:
+        print(f"工作进程数过多：WORKER_ID 起始值 {worker_id_base} 加进程数不能超过 {MAX_WORKERS}")
+        return 1
+    if pin_cpus and not hasattr(os, "sched_setaffinity"):
+        print("当前平台不支持绑定CPU，忽略 --pin-cpus")
+        pin_cpus = False
+
+    # 只在启动器中创建一次数据库表和目录，避免多个工作进程同时执行
+    from app.core.bootstrap import initialize
+    from app.database import engine
+    initialize()
+    engine.dispose()
+
+    cpus = sorted(os.sched_getaffinity(0)) if pin_cpus else []
+    # 工作进程各自监听端口，由 nginx 按客户端IP分配（见 nginx.conf 或 --nginx-upstream）
+    ports = get_worker_ports(workers)
+    pool = [
+        Worker(index, port, cpus[index % len(cpus)] if cpus else None)
+        for index, port in enumerate(ports)
+    ]
+    print(f"启动FastAPI聊天室应用（{workers} 个工作进程）...")
+    print(f"工作进程端口: {ports[0]}-{ports[-1]}，需由 nginx 按客户端IP（ip_hash）分配")
+    asyncio.run(Supervisor(pool, settings.HOST, worker_id_base).run())
+    print("\n应用已停止")
+    return 0
+
+
+def import_report(limit: int) -> int:
+    """在子进程中以 -X importtime 导入 main，按顶层包汇总导入耗时"""
+    if getattr(sys, "frozen", False):
+        print("打包后的可执行文件不支持导入耗时分析，请在源码环境中运行")
+        return 1
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(
+            filter(None, [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")])
+        )},
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if result.returncode != 0:
+        print(f"导入 main 失败:\n{result.stderr[-2000:]}")
+        return 1
+
+    # 每行格式：import time: 自身耗时(us) | 累计耗时(us) | 缩进的模块名
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    total = next((cumulative for name, _, cumulative in modules if name == "main"), 0)
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+
+    print(f"导入 main 共 {total / 1000:.1f} ms，加载 {len(modules)} 个模块\n")
+    print("按顶层包汇总（自身耗时）:")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+        print(f"  {self_us / 1000:8.1f} ms  {package}")
+    print("\n自身耗时最多的模块:")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda item: -item[1])[:limit]:
+        print(f"  {self_us / 1000:8.1f} ms  (累计 {cumulative_us / 1000:8.1f} ms)  {name}")
+    return 0
+
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="启动FastAPI聊天室应用")
+    parser.add_argument("--production", action="store_true", help="多进程运行")
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数，默认为CPU核数")
+    parser.add_argument("--pin-cpus", action="store_true", help="将每个工作进程绑定到一个CPU（仅Linux）")
+    parser.add_argument("--nginx-upstream", action="store_true", help="按工作进程数输出 nginx upstream 配置后退出")
+    parser.add_argument("--init", action="store_true", help="创建数据库表和目录后退出")
+    parser.add_argument("--import-report", nargs="?", type=int, const=20, metavar="N",
+                        help="输出导入耗时最多的 N 个包和模块（默认20）后退出")
+    args = parser.parse_args()
+
+    if args.nginx_upstream:
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        print(nginx_upstream(args.workers or cpu_count or 1), end="")
+        sys.exit(0)
+    if args.import_report is not None:
+        sys.exit(import_report(args.import_report))
+    if args.init:
+        from app.core.bootstrap import initialize
+        initialize()
+        print("数据库表和目录已创建")
+        sys.exit(0)
+
     try:
+        if args.production:
+            cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+            workers = args.workers or cpu_count or 1
+            sys.exit(run_production(workers, args.pin_cpus))
+
         print(f"启动FastAPI聊天室应用...")
         print(f"环境: {'开发' if settings.DEBUG else '生产'}")
         print(f"地址: http://{settings.HOST}:{settings.PORT}")
         print(f"调试模式: {'开启' if settings.DEBUG else '关闭'}")
         print(f"API文档: http://{settings.HOST}:{settings.PORT}/api/docs")
-        
+
         # 使用uvicorn运行应用
         uvicorn.run(
             "main:socket_app",
             host=settings.HOST,
             port=settings.PORT,
             reload=settings.DEBUG,
-            log_level="info" if not settings.DEBUG else "debug"
+            log_level="info" if not settings.DEBUG else "debug",
+            access_log=False,  # 访问日志由应用的 AccessLogMiddleware 记录
+            proxy_headers=bool(settings.FORWARDED_ALLOW_IPS),
+            forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS
         )
-        
+
     except KeyboardInterrupt:
         print("\n应用已停止")
         sys.exit(0)
@@ -33,4 +293,5 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    multiprocessing.freeze_support()
+    main()
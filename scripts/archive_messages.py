@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# scripts/archive_messages.py
+# 立即归档超过保留期的消息（与后台归档任务相同，可重复执行）
+#
+# 用法：python scripts/archive_messages.py --retention-days 180
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.database import engine, Base  # noqa: E402
+from app.core.archive import archive_messages  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="归档超过保留期的消息")
+    parser.add_argument("--retention-days", type=int, default=settings.MESSAGE_HOT_RETENTION_DAYS,
+                        help="热表保留天数（默认取 MESSAGE_HOT_RETENTION_DAYS）")
+    args = parser.parse_args()
+    if args.retention_days <= 0:
+        print("保留天数必须大于0")
+        return 1
+
+    Base.metadata.create_all(bind=engine)
+    removed = archive_messages(args.retention_days)
+    print(f"归档完成，移出热表 {removed} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
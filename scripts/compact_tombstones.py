@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# scripts/compact_tombstones.py
+# 立即压缩已删除的消息（可重复执行）
+#
+# 用法：python scripts/compact_tombstones.py [--backfill] [--delay 秒数]
+#
+# 从旧版本升级时先加 --backfill 运行一次，为已软删除的消息补建墓碑，之后它们才会被压缩。
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.database import engine, Base  # noqa: E402
+from app.core.tombstones import backfill_tombstones, compact_tombstones  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="压缩已删除的消息")
+    parser.add_argument("--backfill", action="store_true", help="为没有墓碑的已删除消息补建墓碑")
+    parser.add_argument("--delay", type=int, default=settings.TOMBSTONE_COMPACTION_DELAY,
+                        help="只压缩删除时间早于该秒数的消息（默认取 TOMBSTONE_COMPACTION_DELAY）")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    if args.backfill:
+        print(f"补建墓碑 {backfill_tombstones()} 条")
+    print(f"已压缩 {compact_tombstones(args.delay)} 条已删除消息")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,20 @@
 #!/bin/bash
 
 # 健康检查脚本
-# 检查应用是否正常运行
+# 默认检查存活（进程可响应），传入 ready 检查就绪状态（数据库、连接池、事件循环、消息代理和连接数容量）
+# 用法: healthcheck.sh [live|ready]
 
 set -e
 
 HOST=${HOST:-localhost}
 PORT=${PORT:-8000}
+CHECK=${1:-live}
 
-# 检查 API 端点
-if curl -f -s "http://${HOST}:${PORT}/api/docs" > /dev/null; then
-    echo "✅ 应用健康检查通过"
+# 检查健康端点
+if curl -f -s "http://${HOST}:${PORT}/api/health/${CHECK}" > /dev/null; then
+    echo "✅ 应用健康检查通过 (${CHECK})"
     exit 0
 else
-    echo "❌ 应用健康检查失败"
+    echo "❌ 应用健康检查失败 (${CHECK})"
     exit 1
-fi 
\ No newline at end of file
+fi
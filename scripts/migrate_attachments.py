@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# scripts/migrate_attachments.py
+# 将旧版本以JSON写入消息内容的文件信息迁移到附件表（分批提交，可重复执行）
+#
+# 用法：python scripts/migrate_attachments.py [--batch-size 500]
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import SessionLocal, engine, Base  # noqa: E402
+from app.core.attachments import migrate_legacy_attachments  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="迁移旧文件消息到附件表")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批处理的消息数")
+    args = parser.parse_args()
+
+    # 确保附件表已创建
+    Base.metadata.create_all(bind=engine)
+
+    total = 0
+    after_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            migrated, after_id = migrate_legacy_attachments(db, args.batch_size, after_id)
+            if after_id == 0:
+                break
+            total += migrated
+            print(f"已扫描至消息 {after_id}，累计迁移 {total} 条")
+    finally:
+        db.close()
+
+    print(f"迁移完成，共迁移 {total} 条文件消息")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
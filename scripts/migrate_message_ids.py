@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# scripts/migrate_message_ids.py
+# 升级已有数据库以使用应用生成的64位消息ID（可重复执行）
+#
+# 用法：python scripts/migrate_message_ids.py
+#
+# SQLite 的 INTEGER 列本身可存储64位整数，只需补建索引；
+# PostgreSQL/MySQL 需要把消息ID及引用它的列改为 BIGINT。
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import inspect, text  # noqa: E402
+
+from app.database import engine, Base  # noqa: E402
+from app.models import Message  # noqa: E402
+
+# 需要改为 BIGINT 的列
+BIGINT_COLUMNS = [
+    ("messages", "id"),
+    ("attachments", "id"),
+    ("attachments", "message_id"),
+    ("file_references", "message_id"),
+]
+
+
+def main() -> int:
+    Base.metadata.create_all(bind=engine)
+    dialect = engine.dialect.name
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if dialect in ("postgresql", "mysql"):
+            for table, column in BIGINT_COLUMNS:
+                columns = {c["name"]: c for c in inspector.get_columns(table)}
+                if column not in columns or "BIGINT" in str(columns[column]["type"]).upper():
+                    continue
+                if dialect == "postgresql":
+                    conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT"))
+                else:
+                    conn.execute(text(f"ALTER TABLE {table} MODIFY {column} BIGINT"))
+                print(f"{table}.{column} 已改为 BIGINT")
+
+        # create_all 不会为已存在的表补建新索引
+        for index in Message.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+    print("迁移完成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# scripts/precompress.py
+# 为前端构建产物生成预压缩变体（.gz，安装了 brotli 时同时生成 .br）
+#
+# 用法：python scripts/precompress.py [frontend/build]
+
+import gzip
+import sys
+from pathlib import Path
+
+# 值得压缩的文本类资源
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml", ".webmanifest"}
+
+# 太小的文件压缩收益不足以抵消额外的文件
+MIN_SIZE = 1024
+
+
+def compress_directory(directory: Path) -> int:
+    """压缩目录下的文本资源，返回生成的变体数量"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("未安装 brotli，仅生成 .gz 变体")
+
+    count = 0
+    for path in directory.rglob("*"):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if len(data) < MIN_SIZE:
+            continue
+
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+
+        for suffix, compressed in variants:
+            # 压缩后反而更大时不生成变体
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    target = Path(sys.argv[1] if len(sys.argv) > 1 else "frontend/build")
+    if not target.is_dir():
+        print(f"目录不存在: {target}")
+        sys.exit(1)
+    print(f"已生成 {compress_directory(target)} 个预压缩文件")
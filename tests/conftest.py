@@ -0,0 +1,74 @@
+# tests/conftest.py
+# 测试公共夹具：使用临时目录中的 SQLite 数据库和归档目录（需要 pytest：uv sync --extra bench）
+#
+# 配置在导入应用模块时读取，因此环境变量须在导入前设置。
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_tmp_dir = Path(tempfile.mkdtemp(prefix="chatroom-test-"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir / 'test.db'}")
+os.environ.setdefault("ARCHIVE_DIR", str(_tmp_dir / "archive"))
+os.environ.setdefault("UPLOAD_DIR", str(_tmp_dir / "uploads"))
+os.environ.setdefault("LOG_FILE", "")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+import app.models  # noqa: E402,F401 注册所有模型
+
+
+@pytest.fixture
+def db():
+    """每个测试使用空数据库"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """创建用户"""
+    def make(username: str):
+        user = app.models.User(username=username, email=f"{username}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_room(db):
+    """创建房间"""
+    def make(name: str, owner):
+        room = app.models.Room(name=name, created_by=owner.id)
+        db.add(room)
+        db.commit()
+        return room
+    return make
+
+
+@pytest.fixture
+def client(db):
+    """应用的测试客户端（不执行启动钩子）"""
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.socket_app)
+
+
+@pytest.fixture
+def auth_headers():
+    """为用户生成认证请求头"""
+    from app.core.security import create_access_token
+
+    def make(user):
+        return {"Authorization": f"Bearer {create_access_token({'sub': user.username})}"}
+    return make
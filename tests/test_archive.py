@@ -0,0 +1,150 @@
+# tests/test_archive.py
+# 消息冷归档：旧版本自增ID与 Snowflake ID 混合时按月分段
+
+from datetime import datetime, timedelta
+
+from app.core.archive import archive_messages, get_archive_cutoff, load_segment, month_start
+from app.core.attachments import add_attachment
+from app.core.files import build_file_key, register_file
+from app.core.ids import LEGACY_ID_LIMIT, datetime_to_id
+from app.models import FileReference, Message, MessageArchiveSegment, Room, User
+
+RETENTION_DAYS = 30
+
+
+def add_message(db, message_id: int, timestamp: datetime, room: Room, user: User) -> None:
+    db.add(Message(
+        id=message_id, content=f"m{message_id}", user_id=user.id, room_id=room.id, timestamp=timestamp
+    ))
+
+
+def test_legacy_and_snowflake_messages_are_archived_by_month(db):
+    user = User(username="alice", email="alice@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    room = Room(name="r1", created_by=user.id)
+    db.add(room)
+    db.flush()
+
+    now = datetime.utcnow()
+    cutoff = get_archive_cutoff(RETENTION_DAYS, now)
+    # 旧版本消息：自增ID很小，分布在两个已过期的月份以及保留期内
+    legacy_old = [cutoff - timedelta(days=400), cutoff - timedelta(days=399)]
+    legacy_mid = [cutoff - timedelta(days=200)]
+    legacy_recent = [now - timedelta(hours=2)]
+    for message_id, timestamp in enumerate(legacy_old + legacy_mid + legacy_recent, start=1):
+        add_message(db, message_id, timestamp, room, user)
+    # 升级后的消息：Snowflake ID，一条已过期、一条在保留期内
+    snowflake_old = cutoff - timedelta(days=100)
+    snowflake_recent = now - timedelta(hours=1)
+    add_message(db, datetime_to_id(snowflake_old) + 1, snowflake_old, room, user)
+    add_message(db, datetime_to_id(snowflake_recent) + 1, snowflake_recent, room, user)
+    db.commit()
+
+    assert archive_messages(RETENTION_DAYS) == 4
+
+    segments = db.query(MessageArchiveSegment).order_by(MessageArchiveSegment.id).all()
+    assert [segment.month for segment in segments] == [
+        f"{month_start(legacy_old[0]):%Y-%m}",
+        f"{month_start(legacy_mid[0]):%Y-%m}",
+        f"{month_start(snowflake_old):%Y-%m}",
+    ]
+    assert [segment.message_count for segment in segments] == [2, 1, 1]
+    # 每个分段只包含所属月份的消息
+    for segment in segments:
+        for message in load_segment(segment.path):
+            assert f"{datetime.fromisoformat(message['timestamp']):%Y-%m}" == segment.month
+
+    hot = db.query(Message).order_by(Message.id).all()
+    assert [message.timestamp for message in hot] == legacy_recent + [snowflake_recent]
+    assert hot[0].id < LEGACY_ID_LIMIT <= hot[1].id
+
+
+def test_archive_is_idempotent_for_mixed_ids(db):
+    user = User(username="bob", email="bob@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    room = Room(name="r2", created_by=user.id)
+    db.add(room)
+    db.flush()
+
+    cutoff = get_archive_cutoff(RETENTION_DAYS)
+    add_message(db, 1, cutoff - timedelta(days=60), room, user)
+    db.commit()
+
+    assert archive_messages(RETENTION_DAYS) == 1
+    assert archive_messages(RETENTION_DAYS) == 0
+
+
+def test_archived_attachments_stay_in_room_media(client, db, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    digest = "ef" * 32
+    stored = register_file(db, build_file_key("documents", digest, "txt"), digest, 5, alice.id)
+    timestamp = get_archive_cutoff(RETENTION_DAYS) - timedelta(days=60)
+    message = Message(
+        id=datetime_to_id(timestamp) + 1, content="see", message_type="file",
+        user_id=alice.id, room_id=room.id, timestamp=timestamp
+    )
+    db.add(message)
+    attachment = add_attachment(db, message, f"/uploads/{stored.file_key}", "a.txt", 5, stored)
+    db.commit()
+    kind, attachment_id, message_id = attachment.kind, attachment.id, message.id
+
+    assert archive_messages(RETENTION_DAYS) == 1
+    assert db.query(Message).count() == 0
+
+    # 媒体库仍列出归档消息的附件，分段中也保留附件元数据
+    response = client.get(f"/api/rooms/{room.id}/media", params={"kind": kind}, headers=auth_headers(alice))
+    assert response.status_code == 200
+    assert [(item["id"], item["message_id"]) for item in response.json()["items"]] == [(attachment_id, message_id)]
+    segment = db.query(MessageArchiveSegment).one()
+    assert load_segment(segment.path)[0]["attachments"][0]["id"] == attachment_id
+    # 附件引用仍关联到原消息，文件不会被回收
+    reference = db.query(FileReference).filter(FileReference.kind == "message").one()
+    assert reference.message_id == message_id
+
+
+def test_pagination_walks_from_hot_messages_into_archived_segments(client, db, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    headers = auth_headers(alice)
+    now = datetime.utcnow()
+    cutoff = get_archive_cutoff(RETENTION_DAYS, now)
+    # 两个已过期月份各4条、保留期内3条；每段各有一条已删除的消息
+    timestamps = (
+        [cutoff - timedelta(days=70, minutes=i) for i in range(4)]
+        + [cutoff - timedelta(days=20, minutes=i) for i in range(4)]
+        + [now - timedelta(minutes=10 + i) for i in range(3)]
+    )
+    ids = []
+    for timestamp in sorted(timestamps):
+        message_id = datetime_to_id(timestamp) + 1
+        add_message(db, message_id, timestamp, room, alice)
+        ids.append(message_id)
+    db.commit()
+    deleted = {ids[1], ids[5], ids[9]}
+    db.query(Message).filter(Message.id.in_(deleted)).update({Message.is_deleted: True}, synchronize_session=False)
+    db.commit()
+    assert archive_messages(RETENTION_DAYS) == 8
+    expected = [message_id for message_id in reversed(ids) if message_id not in deleted]
+
+    # 游标分页：每页3条，从热表一直读到最早的归档分段
+    seen, before_id = [], None
+    while True:
+        params = {"per_page": 3, **({"before_id": before_id} if before_id else {})}
+        page = client.get(f"/api/messages/{room.id}", params=params, headers=headers).json()
+        assert all(message["username"] == "alice" for message in page["messages"])
+        seen.extend(message["id"] for message in reversed(page["messages"]))
+        if not page["has_next"]:
+            break
+        before_id = page["next_before_id"]
+    assert seen == expected
+
+    # 页码分页与游标分页结果一致，总数包含归档消息
+    paged = []
+    for number in range(1, 4):
+        page = client.get(f"/api/messages/{room.id}", params={"per_page": 3, "page": number}, headers=headers).json()
+        assert page["total"] == len(expected)
+        paged.extend(message["id"] for message in reversed(page["messages"]))
+    assert paged == expected
@@ -0,0 +1,56 @@
+# tests/test_attachments.py
+# 消息附件：只能引用发送者自己上传的文件，大小以存储记录为准
+
+from app.core.files import build_file_key, register_file
+from app.models import Attachment, FileReference
+from app.socket.events import persist_message
+
+DIGEST = "cd" * 32
+
+
+def upload(db, user) -> str:
+    key = build_file_key("documents", DIGEST, "txt")
+    register_file(db, key, DIGEST, 5, user.id)
+    return f"/uploads/{key}"
+
+
+def file_message(room, url: str, size: int) -> dict:
+    return {
+        "room_id": room.id, "content": "see", "message_type": "file",
+        "file_url": url, "file_name": "a.txt", "file_size": size
+    }
+
+
+def test_attachment_size_comes_from_the_stored_file(client, db, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    url = upload(db, alice)
+
+    response = client.post("/api/messages/", json=file_message(room, url, 10 ** 9), headers=auth_headers(alice))
+    assert response.status_code == 200
+    assert response.json()["attachments"][0]["size"] == 5
+    assert db.query(FileReference).filter(FileReference.kind == "message").count() == 1
+
+
+def test_cannot_attach_another_users_upload(client, db, make_user, make_room, auth_headers):
+    alice, bob = make_user("alice"), make_user("bob")
+    room = make_room("r1", alice)
+    url = upload(db, alice)
+
+    response = client.post("/api/messages/", json=file_message(room, url, 5), headers=auth_headers(bob))
+    assert response.status_code == 400
+
+    result = persist_message(bob.id, room.id, "see", "file", url, "a.txt", 5, None, False)
+    assert "error" in result
+
+    assert db.query(Attachment).count() == 0
+    assert db.query(FileReference).filter(FileReference.kind == "message").count() == 0
+
+
+def test_unknown_upload_url_is_rejected(client, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    response = client.post(
+        "/api/messages/", json=file_message(room, "/uploads/documents/missing.txt", 5), headers=auth_headers(alice)
+    )
+    assert response.status_code == 400
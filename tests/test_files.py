@@ -0,0 +1,205 @@
+# tests/test_files.py
+# 内容寻址文件存储：流式接收表单文件、去重登记、引用计数、释放与暂存对象回收
+
+import asyncio
+import os
+import time
+
+import pytest
+from sqlalchemy import false
+from starlette.requests import Request
+
+from app.config import settings
+from app.core.file_gc import STAGING_GC_MARGIN, collect_stale_staging
+from app.core.files import (
+    FileNotOwnedError, MultipartFileReader, UploadFormError, build_file_key, build_staging_key, get_temp_dir,
+    register_file, release_file
+)
+from app.core.storage import get_storage
+from app.database import SessionLocal
+from app.models import FileReference, Room, StoredFile
+
+DIGEST = "ab" * 32
+
+
+def store_blob(key: str, content: bytes = b"hello") -> None:
+    path = get_storage().local_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+BOUNDARY = "----chatroom-test"
+
+
+def multipart_body(*parts) -> bytes:
+    """parts: (字段名, 文件名或None, 内容)"""
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(body: bytes, chunk_size: int = 7, content_type: str = f"multipart/form-data; boundary={BOUNDARY}") -> Request:
+    """按小块发送请求体，覆盖边界和头部被拆分到多个块的情况"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        chunk = chunks.pop(0) if chunks else b""
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    scope = {"type": "http", "method": "POST", "headers": [(b"content-type", content_type.encode())]}
+    return Request(scope, receive)
+
+
+def read_file_field(reader: MultipartFileReader) -> bytes:
+    async def read():
+        return b"".join([chunk async for chunk in reader.iter_file()])
+    return asyncio.run(read())
+
+
+def test_multipart_reader_streams_only_the_file_field():
+    content = bytes(range(256)) * 8 + b"\r\n--not-a-boundary"
+    body = multipart_body(
+        ("note", None, b"hello"),
+        ("file", "a.bin", content),
+        ("file", "second.bin", b"ignored"),
+    )
+    reader = MultipartFileReader(make_request(body), "file")
+    assert read_file_field(reader) == content
+    assert reader.filename == "a.bin"
+
+
+def test_multipart_reader_checks_the_filename_before_the_content():
+    received = []
+
+    def reject(filename: str) -> None:
+        raise ValueError(filename)
+
+    reader = MultipartFileReader(make_request(multipart_body(("file", "a.exe", b"x" * 4096))), "file", reject)
+
+    async def read():
+        async for chunk in reader.iter_file():
+            received.append(chunk)
+
+    with pytest.raises(ValueError):
+        asyncio.run(read())
+    assert received == []
+
+
+def test_multipart_reader_requires_a_file_field():
+    with pytest.raises(UploadFormError):
+        read_file_field(MultipartFileReader(make_request(multipart_body(("note", None, b"hi"))), "file"))
+    with pytest.raises(UploadFormError):
+        read_file_field(MultipartFileReader(make_request(b"{}", content_type="application/json"), "file"))
+    with pytest.raises(UploadFormError):
+        read_file_field(MultipartFileReader(make_request(multipart_body(("file", "a.txt", b"cut"))[:-20]), "file"))
+
+
+def test_identical_uploads_are_stored_once(client, db, make_user, auth_headers):
+    alice, bob = make_user("alice"), make_user("bob")
+    urls = []
+    for user in (alice, bob):
+        response = client.post(
+            "/api/upload/file", files={"file": ("notes.txt", b"same content", "text/plain")}, headers=auth_headers(user)
+        )
+        assert response.status_code == 200
+        urls.append(response.json()["file_url"])
+
+    assert urls[0] == urls[1]
+    record = db.query(StoredFile).one()
+    assert record.ref_count == 2
+    assert db.query(FileReference).filter(FileReference.kind == "upload").count() == 2
+    assert get_storage().exists(record.file_key)
+    assert list(get_temp_dir().glob("*.part")) == []
+
+
+def test_register_file_recovers_from_a_concurrent_insert(db, make_user, monkeypatch):
+    alice, bob = make_user("alice"), make_user("bob")
+    key = build_file_key("documents", DIGEST, "txt")
+    real_query = db.query
+    raced = []
+
+    def racing_query(*entities):
+        if entities == (StoredFile,) and not raced:
+            raced.append(True)
+            # 另一请求在本请求查询之后、插入之前登记了同一文件
+            other = SessionLocal()
+            try:
+                register_file(other, key, DIGEST, 5, bob.id)
+            finally:
+                other.close()
+            return real_query(StoredFile).filter(false())
+        return real_query(*entities)
+
+    monkeypatch.setattr(db, "query", racing_query)
+    # 调用方事务中尚未提交的修改不受保存点回滚影响
+    db.add(Room(name="pending", created_by=alice.id))
+    record = register_file(db, key, DIGEST, 5, alice.id)
+    monkeypatch.undo()
+
+    db.expire_all()
+    assert raced
+    assert db.query(StoredFile).one().id == record.id
+    assert record.ref_count == 2
+    assert db.query(FileReference).filter(FileReference.kind == "upload").count() == 2
+    assert db.query(Room).filter(Room.name == "pending").count() == 1
+
+
+def test_release_requires_own_upload_reference(db, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    key = build_file_key("documents", DIGEST, "txt")
+    store_blob(key)
+    register_file(db, key, DIGEST, 5, alice.id)
+
+    with pytest.raises(FileNotOwnedError):
+        release_file(db, f"/uploads/{key}", bob.id)
+    db.rollback()
+
+    record = db.query(StoredFile).filter(StoredFile.file_key == key).one()
+    assert record.ref_count == 1
+    assert get_storage().exists(key)
+
+
+def test_shared_file_survives_until_last_uploader_releases(db, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    key = build_file_key("documents", DIGEST, "txt")
+    store_blob(key)
+    register_file(db, key, DIGEST, 5, alice.id)
+    register_file(db, key, DIGEST, 5, bob.id)
+
+    assert release_file(db, f"/uploads/{key}", alice.id) is False
+    # 同一用户不能重复释放来把共享文件的计数减到零
+    with pytest.raises(FileNotOwnedError):
+        release_file(db, f"/uploads/{key}", alice.id)
+    db.rollback()
+    assert get_storage().exists(key)
+
+    assert release_file(db, f"/uploads/{key}", bob.id) is True
+    assert not get_storage().exists(key)
+    assert db.query(StoredFile).count() == 0
+    assert db.query(FileReference).count() == 0
+
+
+def test_release_ignores_urls_outside_the_store(db, make_user):
+    alice = make_user("alice")
+    assert release_file(db, "/uploads/legacy/a.txt", alice.id) is None
+    assert release_file(db, "/static/a.txt", alice.id) is None
+
+
+def test_abandoned_direct_uploads_are_swept_after_token_expiry(db):
+    storage = get_storage()
+    stale, fresh = build_staging_key("png"), build_staging_key("png")
+    store_blob(stale)
+    store_blob(fresh)
+    expired = time.time() - settings.PRESIGNED_URL_EXPIRE_SECONDS - STAGING_GC_MARGIN - 60
+    os.utime(storage.local_path(stale), (expired, expired))
+    # 普通上传的临时文件不是直传暂存对象，不由该任务清理
+    temp_file = get_temp_dir() / "upload-tmp"
+    temp_file.write_bytes(b"x")
+    os.utime(temp_file, (expired, expired))
+
+    assert collect_stale_staging() == 1
+    assert not storage.exists(stale)
+    assert storage.exists(fresh)
+    assert temp_file.exists()
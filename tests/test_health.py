@@ -0,0 +1,129 @@
+# tests/test_health.py
+# 健康检查：存活与就绪、过载时就绪检查失败并拒绝新连接、排空模式
+
+import asyncio
+import copy
+import time
+
+import pytest
+import socketio
+
+from app.config import settings
+from app.core import drain, health
+from app.core.drain import drain_state, start_drain
+from app.core.health import SHED_CONNECTIONS, get_overload_reasons
+from app.core.loop_monitor import loop_monitor
+from app.socket import events
+
+
+def get_ready(client):
+    response = client.get("/api/health/ready")
+    return response.status_code, response.json()
+
+
+def test_ready_when_every_check_passes(client):
+    assert client.get("/api/health/live").json() == {"status": "ok"}
+    status_code, body = get_ready(client)
+    assert status_code == 200
+    assert body["status"] == "ready"
+    assert {"drain", "sockets", "event_loop", "database"} <= set(body["checks"])
+
+
+def test_socket_capacity_and_loop_lag_fail_readiness(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_SOCKET_CONNECTIONS", 2)
+    assert get_overload_reasons(1) == []
+    assert get_overload_reasons(2) == ["sockets"]
+
+    monkeypatch.setattr(loop_monitor, "recent_lag", lambda seconds=1.0: 2.0)
+    assert get_overload_reasons(0) == ["event_loop"]
+    status_code, body = get_ready(client)
+    assert status_code == 503
+    assert body["checks"]["event_loop"] == {"ok": False, "lag_ms": 2000.0}
+
+
+def test_database_failure_and_timeout_fail_readiness(client, monkeypatch):
+    def broken():
+        raise RuntimeError("connection refused")
+
+    monkeypatch.setattr(health, "ping_database", broken)
+    status_code, body = get_ready(client)
+    assert status_code == 503
+    assert body["checks"]["database"] == {"ok": False, "error": "connection refused"}
+
+    monkeypatch.setattr(settings, "HEALTH_CHECK_TIMEOUT", 0.05)
+    monkeypatch.setattr(health, "ping_database", lambda: time.sleep(0.5))
+    assert get_ready(client)[1]["checks"]["database"] == {"ok": False, "error": "timeout"}
+
+
+def test_overloaded_process_refuses_new_sockets(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_SOCKET_CONNECTIONS", 1)
+    # 新连接在调用 connect 时已计入连接数
+    monkeypatch.setattr(events, "count_room_connections", lambda room: 2)
+    before = dict(SHED_CONNECTIONS._values)
+
+    with pytest.raises(socketio.exceptions.ConnectionRefusedError):
+        asyncio.run(events.connect("sid-1", {}, {"token": "unused"}))
+    assert SHED_CONNECTIONS._values[("sockets",)] == before.get(("sockets",), 0) + 1
+
+
+@pytest.fixture
+def drain_reset():
+    """排空状态是进程级的，测试后恢复"""
+    saved = copy.copy(vars(drain_state))
+    yield drain_state
+    vars(drain_state).clear()
+    vars(drain_state).update(saved)
+
+
+def test_drain_disconnects_everyone_across_the_window(drain_reset, monkeypatch):
+    sids = [f"sid-{i}" for i in range(6)]
+    emitted, disconnected = [], []
+
+    async def emit(event, data, to):
+        emitted.append((event, data, to))
+
+    async def disconnect(sid):
+        disconnected.append((sid, time.monotonic()))
+
+    monkeypatch.setattr(events.sio.manager, "get_participants", lambda namespace, room: [(sid, None) for sid in sids])
+    monkeypatch.setattr(events.sio, "emit", emit)
+    monkeypatch.setattr(events.sio, "disconnect", disconnect)
+    monkeypatch.setattr(settings, "DRAIN_RECONNECT_JITTER_SECONDS", 2)
+    # 断开后仍有一次数据库写入未完成，排空等待其结束
+    in_flight = iter([1, 1, 0, 0])
+    monkeypatch.setattr(drain, "get_db_in_flight", lambda: next(in_flight, 0))
+
+    async def scenario():
+        assert start_drain(0.3) is True
+        assert start_drain(0.3) is False
+        # 排空开始后就绪检查失败，新连接被拒绝
+        assert "drain" in get_overload_reasons(0)
+        assert drain_state.finished_at is None
+        await drain_state.task
+
+    started = time.monotonic()
+    asyncio.run(scenario())
+
+    assert sorted(sid for sid, _ in disconnected) == sids
+    assert (drain_state.total, drain_state.disconnected) == (6, 6)
+    assert drain_state.finished_at is not None
+    assert all(event == "server_draining" and 0 <= data["reconnect_after_ms"] <= 2000 for event, data, _ in emitted)
+    # 断开分布在整个时间窗口内，而不是同时断开
+    assert disconnected[-1][1] - disconnected[0][1] >= 0.15
+    assert time.monotonic() - started >= 0.3
+
+
+def test_drain_endpoint_is_admin_only(client, make_user, auth_headers, drain_reset, monkeypatch):
+    alice, root = make_user("alice"), make_user("root")
+    monkeypatch.setattr(settings, "ADMIN_USERNAMES", "root")
+
+    assert client.post("/api/health/drain", params={"window": 0}, headers=auth_headers(alice)).status_code == 403
+    assert get_ready(client)[0] == 200
+
+    response = client.post("/api/health/drain", params={"window": 0}, headers=auth_headers(root))
+    assert response.status_code == 200
+    assert response.json()["draining"] is True
+    status_code, body = get_ready(client)
+    assert status_code == 503
+    assert body["checks"]["drain"] == {"ok": False}
+    assert client.get("/api/health/drain", headers=auth_headers(root)).json()["draining"] is True
@@ -0,0 +1,66 @@
+# tests/test_ids.py
+# 时间有序ID：生成顺序、与时间互相换算、旧版本ID边界、工作节点号分配
+
+from datetime import datetime
+
+import pytest
+
+from app.config import settings
+from app.core.ids import (
+    LEGACY_ID_LIMIT, MAX_SEQUENCE, MAX_WORKER_ID, TIMESTAMP_SHIFT, WORKER_SHIFT, SnowflakeGenerator,
+    datetime_to_id, generate_id, get_worker_id, id_to_datetime, is_legacy_id
+)
+
+
+def test_pid_fallback_is_refused_for_a_server_database(monkeypatch):
+    monkeypatch.setattr(settings, "WORKER_ID", -1)
+    monkeypatch.setattr(settings, "BROKER_URL", "")
+    monkeypatch.setattr(settings, "WORKERS", 1)
+    monkeypatch.setattr(settings, "DATABASE_URL", "postgresql://chatroom@db/chatroom")
+    with pytest.raises(RuntimeError):
+        get_worker_id()
+
+    monkeypatch.setattr(settings, "DATABASE_URL", "sqlite:///./instance/chatroom.db")
+    assert 0 <= get_worker_id() <= 31
+
+    monkeypatch.setattr(settings, "DATABASE_URL", "postgresql://chatroom@db/chatroom")
+    monkeypatch.setattr(settings, "WORKER_ID", 7)
+    assert get_worker_id() == 7
+
+
+def test_ids_increase_within_and_across_milliseconds(monkeypatch):
+    generator = SnowflakeGenerator(3)
+    ticks = iter([1000] * (MAX_SEQUENCE + 2) + [1001] * 5)
+    monkeypatch.setattr(generator, "_current_ms", lambda: next(ticks))
+
+    ids = [generator.next_id() for _ in range(MAX_SEQUENCE + 2)]
+    assert ids == sorted(set(ids))
+    # 同一毫秒内序列号用尽后等到下一毫秒
+    assert (ids[-2] >> TIMESTAMP_SHIFT, ids[-1] >> TIMESTAMP_SHIFT) == (1000, 1001)
+    assert {(value >> WORKER_SHIFT) & MAX_WORKER_ID for value in ids} == {3}
+
+
+def test_ids_stay_monotonic_when_the_clock_goes_back(monkeypatch):
+    generator = SnowflakeGenerator(0)
+    ticks = iter([5000, 4000, 4000, 5001])
+    monkeypatch.setattr(generator, "_current_ms", lambda: next(ticks))
+    ids = [generator.next_id() for _ in range(4)]
+    assert ids == sorted(set(ids))
+
+
+def test_datetime_round_trips_through_ids():
+    moment = datetime(2026, 3, 1, 12, 30, 15, 123000)
+    boundary = datetime_to_id(moment)
+    assert id_to_datetime(boundary) == moment
+    # datetime_to_id 是该时间的最小ID：之前生成的ID都更小
+    assert id_to_datetime(boundary - 1) < moment
+    assert datetime_to_id(datetime(2020, 1, 1)) == 0
+    assert id_to_datetime(generate_id()) <= datetime.utcnow()
+
+
+def test_legacy_ids_are_below_every_snowflake_id():
+    assert is_legacy_id(LEGACY_ID_LIMIT - 1)
+    assert not is_legacy_id(LEGACY_ID_LIMIT)
+    # 纪元后约17分钟起生成的ID都不小于旧版本自增ID的上限
+    assert datetime_to_id(datetime(2024, 1, 1, 0, 18)) >= LEGACY_ID_LIMIT
+    assert not is_legacy_id(generate_id())
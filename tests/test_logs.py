@@ -0,0 +1,76 @@
+# tests/test_logs.py
+# 日志管道：按类别采样、关闭时写出队列中的记录、访问日志
+
+import json
+import logging
+
+from app.config import settings
+from app.core import logs
+from app.core.logs import SamplingFilter, setup_logging, stop_logging
+
+
+def make_record(level: int, category=None) -> logging.LogRecord:
+    record = logging.LogRecord("chatroom.test", level, __file__, 1, "msg", None, None)
+    if category is not None:
+        record.category = category
+    return record
+
+
+def test_sampling_only_drops_info_records_of_sampled_categories(monkeypatch):
+    sampler = SamplingFilter({"send_message": 0.25, "noisy": 0.0})
+
+    monkeypatch.setattr(logs.random, "random", lambda: 0.2)
+    assert sampler.filter(make_record(logging.INFO, "send_message"))
+    monkeypatch.setattr(logs.random, "random", lambda: 0.3)
+    assert not sampler.filter(make_record(logging.INFO, "send_message"))
+    assert not sampler.filter(make_record(logging.DEBUG, "send_message"))
+
+    # 警告和错误总是记录；未配置比例的类别全部记录
+    assert sampler.filter(make_record(logging.WARNING, "noisy"))
+    assert sampler.filter(make_record(logging.ERROR, "send_message"))
+    assert sampler.filter(make_record(logging.INFO, "access"))
+    assert sampler.filter(make_record(logging.INFO))
+
+
+def test_sample_rates_setting_is_parsed(monkeypatch):
+    monkeypatch.setattr(settings, "LOG_SAMPLE_RATES", " send_message=0.01, access = 0.5 ,broken,")
+    assert settings.log_sample_rates == {"send_message": 0.01, "access": 0.5}
+
+
+def test_stop_logging_drains_the_queue(monkeypatch, tmp_path):
+    log_file = tmp_path / "app.log"
+    monkeypatch.setattr(settings, "LOG_FILE", str(log_file))
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    monkeypatch.setattr(settings, "LOG_SAMPLE_RATES", "")
+    root = logging.getLogger()
+    level = root.level
+
+    setup_logging()
+    try:
+        logger = logging.getLogger("chatroom.test")
+        for i in range(500):
+            logger.info("record %d", i, extra={"category": "test", "seq": i})
+    finally:
+        stop_logging()
+        root.setLevel(level)
+
+    records = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    records = [record for record in records if record.get("category") == "test"]
+    assert [record["seq"] for record in records] == list(range(500))
+    assert records[0]["msg"] == "record 0"
+    # 停止后队列处理器已移除，之后的记录不会再入队
+    assert not any(isinstance(handler, logs.AsyncQueueHandler) for handler in root.handlers)
+
+
+def test_access_log_records_request_fields(client, caplog):
+    with caplog.at_level(logging.INFO, logger="chatroom.access"):
+        response = client.get("/api/health/live")
+    assert response.status_code == 200
+
+    records = [record for record in caplog.records if record.name == "chatroom.access"]
+    assert len(records) == 1
+    record = records[0]
+    assert record.category == "access"
+    assert (record.method, record.path, record.status) == ("GET", "/api/health/live", 200)
+    assert record.duration_ms >= 0
+    assert record.client_ip
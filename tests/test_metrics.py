@@ -0,0 +1,64 @@
+# tests/test_metrics.py
+# Prometheus 指标导出：直方图分桶累计，SQL 统计只挂在应用的引擎上
+
+import re
+
+from sqlalchemy import create_engine, text
+
+from app.core.metrics import ROOM_FANOUT
+
+SAMPLE = re.compile(r'^(\w+?)(_bucket|_sum|_count)(?:\{(.*)\})? (\S+)$')
+
+
+def read_histogram(client, name: str) -> dict:
+    """解析 /metrics 中无标签直方图的样本：{'buckets': [(le, 值)], 'sum': 值, 'count': 值}"""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert f"# TYPE {name} histogram" in response.text
+    result = {"buckets": []}
+    for line in response.text.splitlines():
+        match = SAMPLE.match(line)
+        if not match or match.group(1) != name:
+            continue
+        _, suffix, labels, value = match.groups()
+        if suffix == "_bucket":
+            result["buckets"].append((re.search(r'le="([^"]+)"', labels).group(1), float(value)))
+        else:
+            result[suffix[1:]] = float(value)
+    return result
+
+
+def test_histogram_buckets_are_cumulative(client):
+    before = read_histogram(client, "chatroom_room_fanout_size")
+    for size in (1, 3, 3, 40, 10000):
+        ROOM_FANOUT.observe(size)
+    after = read_histogram(client, "chatroom_room_fanout_size")
+
+    bounds = [le for le, _ in after["buckets"]]
+    assert bounds[-1] == "+Inf"
+    counts = [value for _, value in after["buckets"]]
+    assert counts == sorted(counts)
+    assert counts[-1] == after["count"]
+
+    previous = dict(before.get("buckets", []))
+    delta = {le: value - previous.get(le, 0) for le, value in after["buckets"]}
+    assert delta["1"] == 1
+    assert delta["2"] == 1
+    assert delta["5"] == 3
+    assert delta["50"] == 4
+    assert delta["5000"] == 4
+    assert delta["+Inf"] == 5
+    assert after["sum"] - before.get("sum", 0) == 10047
+
+
+def test_query_metrics_only_count_the_app_engines(client, db):
+    before = read_histogram(client, "chatroom_db_query_duration_seconds")["count"]
+    db.execute(text("SELECT 1"))
+    after_app = read_histogram(client, "chatroom_db_query_duration_seconds")["count"]
+    assert after_app == before + 1
+
+    other = create_engine("sqlite://")
+    with other.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    other.dispose()
+    assert read_histogram(client, "chatroom_db_query_duration_seconds")["count"] == after_app
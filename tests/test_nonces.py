@@ -0,0 +1,111 @@
+# tests/test_nonces.py
+# 消息发送去重：登记、重复发送、原消息写入中（409 + Retry-After）、写入失败后撤销
+#
+# Redis 索引的测试需要设置 TEST_BROKER_URL（如 redis://localhost:6379/15），否则跳过。
+
+import os
+import uuid
+
+import pytest
+
+from app.core import nonces
+from app.core.nonces import PENDING_RETRY_AFTER, MemoryNonceStore, RedisNonceStore
+from app.models import Message
+from app.socket.events import persist_message
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    store = MemoryNonceStore(ttl=60, max_entries=100)
+    monkeypatch.setattr(nonces, "_store", store)
+    return store
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return MemoryNonceStore(ttl=60, max_entries=100)
+    url = os.environ.get("TEST_BROKER_URL")
+    if not url:
+        pytest.skip("未设置 TEST_BROKER_URL")
+    return RedisNonceStore(url, ttl=60)
+
+
+def test_reserve_returns_original_id_until_released(store):
+    nonce = uuid.uuid4().hex
+    assert store.reserve(1, nonce, 100) is None
+    assert store.reserve(1, nonce, 200) == 100
+    # nonce 按用户区分
+    assert store.reserve(2, nonce, 300) is None
+    store.release(1, nonce)
+    assert store.reserve(1, nonce, 400) is None
+
+
+def test_memory_store_evicts_expired_and_overflowing_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(nonces.time, "monotonic", lambda: now[0])
+    store = MemoryNonceStore(ttl=10, max_entries=2)
+    store.reserve(1, "a", 1)
+    store.reserve(1, "b", 2)
+    store.reserve(1, "c", 3)
+    assert len(store) == 2
+    assert store.reserve(1, "a", 4) is None
+
+    now[0] += 11
+    assert store.reserve(1, "b", 5) is None
+    assert len(store) == 1
+
+
+def test_rest_retry_returns_the_original_message(client, make_user, make_room, auth_headers, memory_store):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    body = {"room_id": room.id, "content": "hi", "message_type": "text", "nonce": "n1"}
+
+    first = client.post("/api/messages/", json=body, headers=auth_headers(alice))
+    again = client.post("/api/messages/", json=body, headers=auth_headers(alice))
+    assert first.status_code == again.status_code == 200
+    assert first.json()["id"] == again.json()["id"]
+
+
+def test_rest_retry_while_original_is_pending(client, make_user, make_room, auth_headers, memory_store):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    # 原请求已登记 nonce，消息尚未提交
+    memory_store.reserve(alice.id, "n1", 12345)
+
+    response = client.post(
+        "/api/messages/", json={"room_id": room.id, "content": "hi", "message_type": "text", "nonce": "n1"},
+        headers=auth_headers(alice)
+    )
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == str(PENDING_RETRY_AFTER)
+
+
+def test_socket_retry_while_original_is_pending(db, make_user, make_room, memory_store):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    memory_store.reserve(alice.id, "n1", 12345)
+
+    result = persist_message(alice.id, room.id, "hi", "text", "", "", 0, "n1", False)
+    assert result == {"duplicate": None}
+
+
+def test_failed_commit_releases_nonce(db, make_user, make_room, memory_store, monkeypatch):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    session_class = type(db)
+    commit = session_class.commit
+
+    def failing_commit(self):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(session_class, "commit", failing_commit)
+    with pytest.raises(RuntimeError):
+        persist_message(alice.id, room.id, "hi", "text", "", "", 0, "n1", False)
+    monkeypatch.setattr(session_class, "commit", commit)
+
+    # 撤销登记后重试正常写入
+    result = persist_message(alice.id, room.id, "hi", "text", "", "", 0, "n1", False)
+    assert "message" in result
+    db.expire_all()
+    assert db.query(Message).count() == 1
@@ -0,0 +1,37 @@
+# tests/test_pool.py
+# 连接池大小：覆盖所有可能同时访问数据库的线程，并受每进程连接预算限制
+
+import asyncio
+
+import anyio.to_thread
+
+from app.config import settings
+from app.core.pool import EVENT_LOOP_CONNECTIONS, configure_threadpool, get_pool_settings
+
+
+def test_pool_covers_executor_and_threadpool(monkeypatch):
+    monkeypatch.setattr(settings, "WORKERS", 1)
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 200)
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 0)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 10)
+    monkeypatch.setattr(settings, "DB_EXECUTOR_WORKERS", 8)
+    monkeypatch.setattr(settings, "THREADPOOL_SIZE", 40)
+    assert get_pool_settings() == (8 + 40 + EVENT_LOOP_CONNECTIONS, 10)
+
+
+def test_pool_is_capped_by_the_per_process_budget(monkeypatch):
+    monkeypatch.setattr(settings, "WORKERS", 4)
+    monkeypatch.setattr(settings, "DB_MAX_CONNECTIONS", 90)
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 0)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 10)
+    assert get_pool_settings() == (22, 0)
+
+
+def test_configure_threadpool_sets_anyio_limit(monkeypatch):
+    monkeypatch.setattr(settings, "THREADPOOL_SIZE", 12)
+
+    async def check():
+        configure_threadpool()
+        return anyio.to_thread.current_default_thread_limiter().total_tokens
+
+    assert asyncio.run(check()) == 12
@@ -0,0 +1,97 @@
+# tests/test_presign.py
+# 客户端直传：申请令牌、上传时校验 SHA-256、确认完成后登记文件
+
+import base64
+import hashlib
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.config import settings
+from app.core.files import url_to_key
+from app.core.storage import get_storage
+from app.models import FileReference, StoredFile
+
+CONTENT = b"direct upload body"
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+def presign(client, headers, content: bytes = CONTENT, digest: str = DIGEST) -> dict:
+    response = client.post(
+        "/api/upload/presign",
+        json={"file_name": "notes.txt", "file_size": len(content), "sha256": digest},
+        headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def complete(client, headers, token: str):
+    return client.post("/api/upload/presign/complete", json={"token": token}, headers=headers)
+
+
+def test_direct_upload_is_verified_and_registered(client, db, make_user, auth_headers):
+    alice, bob = make_user("alice"), make_user("bob")
+    staged = set(get_storage().list_objects(".partial/direct-"))
+    urls = []
+    for user in (alice, bob):
+        headers = auth_headers(user)
+        grant = presign(client, headers)
+        # 相同内容已存在时仍须上传，只凭哈希值不能获得文件
+        assert grant["uploaded"] is False
+        assert client.put(grant["upload"]["url"], content=CONTENT).status_code == 200
+        response = complete(client, headers, grant["token"])
+        assert response.status_code == 200
+        urls.append(response.json()["file_url"])
+
+    assert urls[0] == urls[1]
+    key = url_to_key(urls[0])
+    assert get_storage().local_path(key).read_bytes() == CONTENT
+    assert db.query(StoredFile).one().ref_count == 2
+    assert db.query(FileReference).filter(FileReference.kind == "upload").count() == 2
+    # 暂存对象已移动或删除
+    assert set(get_storage().list_objects(".partial/direct-")) == staged
+
+
+def test_direct_upload_rejects_content_that_does_not_match_the_checksum(client, db, make_user, auth_headers):
+    headers = auth_headers(make_user("alice"))
+    grant = presign(client, headers)
+
+    tampered = client.put(grant["upload"]["url"], content=CONTENT.upper())
+    assert tampered.status_code == 400
+    assert tampered.json()["detail"] == "文件内容校验失败"
+    assert client.put(grant["upload"]["url"], content=CONTENT + b"!").status_code == 400
+
+    # 没有通过校验的上传，确认完成失败且不登记文件
+    assert complete(client, headers, grant["token"]).status_code == 400
+    assert db.query(StoredFile).count() == 0
+
+
+def test_tokens_are_bound_to_the_requesting_user(client, db, make_user, auth_headers):
+    alice, bob = make_user("alice"), make_user("bob")
+    grant = presign(client, auth_headers(alice))
+    assert client.put(grant["upload"]["url"], content=CONTENT).status_code == 200
+
+    assert complete(client, auth_headers(bob), grant["token"]).status_code == 403
+    assert client.put("/api/upload/direct/not-a-token", content=CONTENT).status_code == 403
+    assert db.query(StoredFile).count() == 0
+
+
+def test_s3_presigned_put_carries_the_checksum(monkeypatch):
+    pytest.importorskip("boto3")
+    from app.core.storage import S3Storage
+
+    monkeypatch.setattr(settings, "S3_BUCKET", "chatroom-test")
+    monkeypatch.setattr(settings, "S3_REGION", "us-east-1")
+    monkeypatch.setattr(settings, "S3_ACCESS_KEY_ID", "test")
+    monkeypatch.setattr(settings, "S3_SECRET_ACCESS_KEY", "test")
+    upload = S3Storage().presign_upload(".partial/direct-abc.txt", len(CONTENT), DIGEST, "/unused")
+
+    checksum = base64.b64encode(bytes.fromhex(DIGEST)).decode()
+    assert upload["method"] == "PUT"
+    assert upload["headers"]["x-amz-checksum-sha256"] == checksum
+    query = parse_qs(urlparse(upload["url"]).query)
+    # 校验和与长度在签名范围内，客户端不能换成其他内容
+    signed_headers = query["X-Amz-SignedHeaders"][0].split(";")
+    assert {"x-amz-checksum-sha256", "content-length"} <= set(signed_headers)
+    assert int(query["X-Amz-Expires"][0]) == settings.PRESIGNED_URL_EXPIRE_SECONDS
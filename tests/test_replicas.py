@@ -0,0 +1,143 @@
+# tests/test_replicas.py
+# 只读副本路由：写入后粘滞主库、粘滞窗口过期、副本故障回退
+#
+# Redis 粘滞存储的测试需要设置 TEST_BROKER_URL（如 redis://localhost:6379/15），否则跳过。
+
+import os
+import uuid
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core import replicas
+from app.core.replicas import (
+    SESSION_LISTENERS, SESSION_OWNER_KEY, MemoryStickyStore, RedisStickyStore, ReplicaRouter, open_read_session,
+    set_session_owner
+)
+from app.database import DATABASE_URL, SessionLocal
+from app.models import User
+
+
+def make_router(count: int = 1, sticky_seconds: float = 5, store=None) -> ReplicaRouter:
+    # 测试数据库本身作为副本：数据与主库一致，只验证路由
+    router = ReplicaRouter([DATABASE_URL] * count, sticky_seconds)
+    router._sticky_store = store or MemoryStickyStore()
+    return router
+
+
+@pytest.fixture
+def redis_url():
+    url = os.environ.get("TEST_BROKER_URL")
+    if not url:
+        pytest.skip("未设置 TEST_BROKER_URL")
+    return url
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    """启用副本路由：替换全局路由器并注册会话事件"""
+    router = make_router()
+    monkeypatch.setattr(replicas, "router", router)
+    for identifier, listener in SESSION_LISTENERS:
+        event.listen(Session, identifier, listener)
+    yield router
+    for identifier, listener in SESSION_LISTENERS:
+        event.remove(Session, identifier, listener)
+
+
+def test_writer_reads_from_primary_during_the_sticky_window(monkeypatch):
+    router = make_router()
+    now = [1000.0]
+    monkeypatch.setattr(replicas.time, "monotonic", lambda: now[0])
+
+    assert router.choose("alice") is router.replicas[0]
+    router.mark_write("alice")
+    assert router.choose("alice") is None
+    # 其他用户和匿名读取不受影响
+    assert router.choose("bob") is router.replicas[0]
+    assert router.choose(None) is router.replicas[0]
+
+    now[0] += 4.9
+    assert router.choose("alice") is None
+    now[0] += 0.2
+    assert router.choose("alice") is router.replicas[0]
+
+
+def test_sticky_window_is_shared_through_redis(redis_url):
+    import time
+
+    user = f"user-{uuid.uuid4().hex}"
+    writer = make_router(sticky_seconds=0.2, store=RedisStickyStore(redis_url))
+    # 另一进程中的路由器
+    reader = make_router(sticky_seconds=0.2, store=RedisStickyStore(redis_url))
+
+    writer.mark_write(user)
+    assert reader.choose(user) is None
+    time.sleep(0.3)
+    assert reader.choose(user) is reader.replicas[0]
+
+
+def test_unreachable_redis_reads_from_primary():
+    pytest.importorskip("redis")
+    store = RedisStickyStore("redis://127.0.0.1:1/0")
+    assert store.is_sticky("alice") is True
+    store.mark("alice", 1)
+
+
+def test_unhealthy_replicas_fall_back_to_primary():
+    router = make_router(count=2)
+    first, second = router.replicas
+    assert {router.choose(None) for _ in range(4)} == {first, second}
+
+    first.mark_unhealthy("连接断开")
+    assert {router.choose(None) for _ in range(4)} == {second}
+    second.mark_unhealthy("复制延迟 30.0s")
+    assert router.choose(None) is None
+
+    # 健康检查通过后恢复使用
+    router.check()
+    assert first.healthy and second.healthy and first.last_error is None
+
+
+def test_committed_writes_make_the_owner_sticky(routed, db, make_user):
+    make_user("alice")
+
+    session = SessionLocal()
+    set_session_owner(session, "writer")
+    session.add(User(username="bob", email="bob@example.com", password_hash="x"))
+    session.commit()
+    session.close()
+    assert routed.is_sticky("writer")
+
+    # 批量更新同样视为写入
+    session = SessionLocal()
+    set_session_owner(session, "bulk")
+    session.query(User).filter(User.username == "bob").update({User.bio: "hi"}, synchronize_session=False)
+    session.commit()
+    session.close()
+    assert routed.is_sticky("bulk")
+
+    # 回滚的写入和只读事务不开启粘滞窗口
+    session = SessionLocal()
+    set_session_owner(session, "rolled-back")
+    session.add(User(username="carol", email="carol@example.com", password_hash="x"))
+    session.flush()
+    session.rollback()
+    session.query(User).all()
+    session.commit()
+    session.close()
+    assert not routed.is_sticky("rolled-back")
+
+
+def test_sticky_reader_gets_a_primary_session(routed, db):
+    replica_session = open_read_session("alice")
+    assert SESSION_OWNER_KEY not in replica_session.info
+    assert replica_session.get_bind() is routed.replicas[0].engine
+    replica_session.close()
+
+    routed.mark_write("alice")
+    primary_session = open_read_session("alice")
+    assert primary_session.info[SESSION_OWNER_KEY] == "alice"
+    assert primary_session.get_bind() is not routed.replicas[0].engine
+    primary_session.close()
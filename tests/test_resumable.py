@@ -0,0 +1,88 @@
+# tests/test_resumable.py
+# 可续传分块上传：偏移量推进、冲突、中断后续传与完成登记
+
+from app.core.files import get_temp_dir, url_to_key
+from app.core.resumable import claim_offset, get_partial_path
+from app.core.storage import get_storage
+from app.models import StoredFile, UploadSession
+
+CONTENT = b"0123456789abcdef"
+
+
+def create_session(client, headers, size: int = len(CONTENT)) -> str:
+    response = client.post("/api/upload/sessions", json={"file_name": "a.txt", "file_size": size}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["offset"] == 0
+    return response.json()["session_id"]
+
+
+def send_chunk(client, headers, session_id: str, offset: int, data: bytes):
+    return client.patch(
+        f"/api/upload/sessions/{session_id}", content=data, headers={**headers, "Upload-Offset": str(offset)}
+    )
+
+
+def test_chunks_resume_from_the_server_offset(client, db, make_user, auth_headers):
+    headers = auth_headers(make_user("alice"))
+    session_id = create_session(client, headers)
+
+    assert send_chunk(client, headers, session_id, 0, CONTENT[:6]).json()["offset"] == 6
+    # 客户端断线后按服务器记录的偏移量续传，重发旧偏移量返回 409
+    stale = send_chunk(client, headers, session_id, 0, CONTENT[:6])
+    assert stale.status_code == 409
+    assert stale.headers["Upload-Offset"] == "6"
+    assert client.get(f"/api/upload/sessions/{session_id}", headers=headers).json()["offset"] == 6
+
+    early = client.post(f"/api/upload/sessions/{session_id}/complete", headers=headers)
+    assert early.status_code == 400
+    assert early.headers["Upload-Offset"] == "6"
+
+    # 超出声明大小的分块被拒绝，进度不变
+    assert send_chunk(client, headers, session_id, 6, CONTENT[6:] + b"!").status_code == 400
+    assert send_chunk(client, headers, session_id, 6, CONTENT[6:]).json()["offset"] == len(CONTENT)
+
+    response = client.post(f"/api/upload/sessions/{session_id}/complete", headers=headers)
+    assert response.status_code == 200
+    key = url_to_key(response.json()["file_url"])
+    assert get_storage().local_path(key).read_bytes() == CONTENT
+    assert db.query(StoredFile).one().size == len(CONTENT)
+    assert db.query(UploadSession).count() == 0
+    assert not get_partial_path(session_id).exists()
+    assert list(get_temp_dir().glob(f"{session_id}.*")) == []
+
+
+def test_only_one_claim_wins_an_offset(client, db, make_user, auth_headers):
+    headers = auth_headers(make_user("alice"))
+    session_id = create_session(client, headers)
+
+    assert claim_offset(db, session_id, 0, 4) is True
+    # 并发请求以同一偏移量提交时，后到者失败，进度保持先到者的值
+    assert claim_offset(db, session_id, 0, 8) is False
+    db.expire_all()
+    assert db.query(UploadSession).one().received_size == 4
+
+
+def test_complete_rewinds_when_the_partial_file_is_short(client, db, make_user, auth_headers):
+    headers = auth_headers(make_user("alice"))
+    session_id = create_session(client, headers)
+    assert send_chunk(client, headers, session_id, 0, CONTENT[:10]).status_code == 200
+    # 模拟进度已推进但写入中途失败：记录为完整，临时文件只有 10 字节
+    claim_offset(db, session_id, 10, len(CONTENT))
+
+    response = client.post(f"/api/upload/sessions/{session_id}/complete", headers=headers)
+    assert response.status_code == 400
+    assert response.headers["Upload-Offset"] == "10"
+    assert send_chunk(client, headers, session_id, 10, CONTENT[10:]).json()["offset"] == len(CONTENT)
+    assert client.post(f"/api/upload/sessions/{session_id}/complete", headers=headers).status_code == 200
+
+
+def test_sessions_are_private_to_their_owner(client, make_user, auth_headers):
+    alice, bob = make_user("alice"), make_user("bob")
+    session_id = create_session(client, auth_headers(alice))
+
+    assert client.get(f"/api/upload/sessions/{session_id}", headers=auth_headers(bob)).status_code == 404
+    assert send_chunk(client, auth_headers(bob), session_id, 0, CONTENT).status_code == 404
+    assert client.delete(f"/api/upload/sessions/{session_id}", headers=auth_headers(bob)).status_code == 404
+
+    assert client.delete(f"/api/upload/sessions/{session_id}", headers=auth_headers(alice)).status_code == 200
+    assert not get_partial_path(session_id).exists()
@@ -0,0 +1,21 @@
+# tests/test_run.py
+# 多进程启动器：工作进程端口与 nginx upstream 配置一致
+
+from app.config import settings
+from run import get_worker_ports, nginx_upstream
+
+
+def test_worker_ports_start_at_port(monkeypatch):
+    monkeypatch.setattr(settings, "PORT", 9000)
+    assert get_worker_ports(3) == [9000, 9001, 9002]
+
+
+def test_nginx_upstream_uses_ip_hash_over_worker_ports(monkeypatch):
+    monkeypatch.setattr(settings, "PORT", 9000)
+    assert nginx_upstream(2, "chatroom") == (
+        "upstream chatroom {\n"
+        "    ip_hash;\n"
+        "    server chatroom:9000;\n"
+        "    server chatroom:9001;\n"
+        "}\n"
+    )
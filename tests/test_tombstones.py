@@ -0,0 +1,97 @@
+# tests/test_tombstones.py
+# 删除消息的增量同步：墓碑压缩、保留期外全量刷新、分页
+
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.core.tombstones import compact_tombstones
+from app.models import Message, MessageTombstone
+
+
+def add_message(db, room, user, content: str = "hello") -> int:
+    message = Message(content=content, user_id=user.id, room_id=room.id)
+    db.add(message)
+    db.commit()
+    return message.id
+
+
+def fetch_tombstones(client, room, headers, since: datetime, **params):
+    response = client.get(
+        f"/api/messages/{room.id}/tombstones", params={"since": since.isoformat(), **params}, headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_deleted_message_survives_compaction_as_a_tombstone(client, db, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    headers = auth_headers(alice)
+    kept, deleted = add_message(db, room, alice), add_message(db, room, alice)
+    since = datetime.utcnow() - timedelta(minutes=1)
+
+    assert client.delete(f"/api/messages/{deleted}", headers=headers).status_code == 200
+
+    # 延迟期内只软删除，压缩任务不处理
+    assert compact_tombstones(delay=3600) == 0
+    assert compact_tombstones(delay=0) == 1
+    db.expire_all()
+    assert [row.id for row in db.query(Message)] == [kept]
+
+    result = fetch_tombstones(client, room, headers, since)
+    assert [item["id"] for item in result["tombstones"]] == [deleted]
+    assert result["has_more"] is False
+    assert result["full_resync"] is False
+
+
+def test_since_before_the_horizon_requires_full_resync(client, db, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    headers = auth_headers(alice)
+    horizon = datetime.utcnow() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+
+    result = fetch_tombstones(client, room, headers, horizon - timedelta(hours=1))
+    assert result == {"tombstones": [], "has_more": False, "full_resync": True}
+    assert fetch_tombstones(client, room, headers, horizon + timedelta(hours=1))["full_resync"] is False
+
+    # 带时区的时间换算为 UTC 后比较；不带时区的时间按 UTC 处理
+    local = (horizon - timedelta(hours=1)).replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=8)))
+    assert fetch_tombstones(client, room, headers, local)["full_resync"] is True
+
+
+def test_expired_tombstones_are_pruned(db, make_user, make_room):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    now = datetime.utcnow()
+    db.add_all([
+        MessageTombstone(id=1, room_id=room.id, deleted_at=now - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS + 1)),
+        MessageTombstone(id=2, room_id=room.id, deleted_at=now),
+    ])
+    db.commit()
+
+    compact_tombstones(delay=0)
+    db.expire_all()
+    assert [row.id for row in db.query(MessageTombstone)] == [2]
+
+
+def test_tombstones_page_in_deletion_order(client, db, make_user, make_room, auth_headers):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    other = make_room("r2", alice)
+    headers = auth_headers(alice)
+    start = datetime.utcnow() - timedelta(hours=1)
+    db.add_all([
+        MessageTombstone(id=100 - i, room_id=room.id, deleted_at=start + timedelta(seconds=i)) for i in range(5)
+    ])
+    db.add(MessageTombstone(id=200, room_id=other.id, deleted_at=start))
+    db.commit()
+
+    seen = []
+    since = start - timedelta(seconds=1)
+    while True:
+        result = fetch_tombstones(client, room, headers, since, limit=2)
+        seen.extend(item["id"] for item in result["tombstones"])
+        if not result["has_more"]:
+            break
+        since = datetime.fromisoformat(result["tombstones"][-1]["deleted_at"])
+    assert seen == [100, 99, 98, 97, 96]
@@ -0,0 +1,98 @@
+# tests/test_user_cards.py
+# 紧凑消息模式：消息只含作者ID，作者名片按需下发
+
+import asyncio
+
+from app.core.user_cards import RecentAuthors
+from app.models import Message
+from app.socket import events
+
+
+def test_recent_authors_are_bounded_per_room_and_by_room_count():
+    authors = RecentAuthors(max_rooms=2, max_users_per_room=2)
+    assert authors.touch(1, 10) is True
+    assert authors.touch(1, 10) is False
+    authors.touch(1, 11)
+    # 超出每个房间的容量时淘汰最久未发言的作者，再次发言需要重新推送名片
+    authors.touch(1, 10)
+    authors.touch(1, 12)
+    assert authors.get(1) == [10, 12]
+    assert authors.touch(1, 11) is True
+
+    authors.touch(2, 10)
+    authors.touch(1, 13)
+    # 房间数超出上限时淘汰最久未活跃的房间
+    authors.touch(3, 10)
+    assert authors.get(2) == []
+    assert authors.rooms_with(10) == [3]
+    assert authors.get(1) == [11, 13]
+
+
+def test_compact_history_returns_each_author_card_once(client, db, make_user, make_room, auth_headers):
+    alice, bob, carol = make_user("alice"), make_user("bob"), make_user("carol")
+    room = make_room("r1", alice)
+    for author in (alice, bob, alice, bob):
+        db.add(Message(content=f"from {author.username}", user_id=author.id, room_id=room.id))
+    db.commit()
+
+    page = client.get(f"/api/messages/{room.id}", params={"compact": True}, headers=auth_headers(carol)).json()
+    assert [message["user_id"] for message in page["messages"]] == [alice.id, bob.id, alice.id, bob.id]
+    assert all("username" not in message for message in page["messages"])
+    assert page["users"] == {
+        str(alice.id): {"id": alice.id, "username": "alice", "avatar_url": alice.avatar_url},
+        str(bob.id): {"id": bob.id, "username": "bob", "avatar_url": bob.avatar_url},
+    }
+
+    full = client.get(f"/api/messages/{room.id}", headers=auth_headers(carol)).json()
+    assert "users" not in full
+    assert [message["username"] for message in full["messages"]] == ["alice", "bob", "alice", "bob"]
+
+
+def test_card_is_pushed_before_an_authors_first_socket_message(db, make_user, make_room, monkeypatch):
+    alice = make_user("alice")
+    room = make_room("r1", alice)
+    emitted = []
+
+    async def get_session(sid):
+        return {"user_id": alice.id, "username": "alice", "compact": False}
+
+    async def emit(event, data, room=None, **kwargs):
+        emitted.append((event, data, room))
+
+    monkeypatch.setattr(events, "room_user_cards", RecentAuthors(10, 10))
+    monkeypatch.setattr(events.sio, "get_session", get_session)
+    monkeypatch.setattr(events.sio, "emit", emit)
+
+    async def send_twice():
+        for content in ("one", "two"):
+            await events.send_message("sid-1", {"room_id": room.id, "content": content})
+
+    asyncio.run(send_twice())
+
+    compact_room, full_room = events.get_broadcast_room(room.id, True), events.get_broadcast_room(room.id, False)
+    assert [(event, target) for event, _, target in emitted] == [
+        ("user_card", compact_room),
+        ("new_message", full_room),
+        ("new_message", compact_room),
+        ("new_message", full_room),
+        ("new_message", compact_room),
+    ]
+    assert emitted[0][1] == alice.to_card()
+    full_message, compact_message = emitted[1][1], emitted[2][1]
+    assert full_message["username"] == "alice"
+    assert "username" not in compact_message and compact_message["user_id"] == alice.id
+
+
+def test_card_requests_are_filtered_and_capped(db, make_user, monkeypatch):
+    users = [make_user(f"user{i}") for i in range(3)]
+    emitted = []
+
+    async def emit(event, data, room=None, **kwargs):
+        emitted.append((event, data, room))
+
+    monkeypatch.setattr(events.sio, "emit", emit)
+    monkeypatch.setattr(events, "MAX_USER_CARDS_PER_REQUEST", 2)
+    ids = [users[0].id, "1; DROP TABLE users", users[1].id, users[2].id]
+    asyncio.run(events.get_user_cards("sid-1", {"user_ids": ids}))
+
+    assert emitted == [("user_cards", {"users": [users[0].to_card(), users[1].to_card()]}, "sid-1")]